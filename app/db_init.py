@@ -1,16 +1,36 @@
 from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
 from app.db import Base, engine, get_session
+from app.logging_config import get_logger
 from app.models import User, Restaurant, Category, Dish, OptionGroup, Option, RestaurantAdmin, Review, Cart
 
 
+logger = get_logger("db_init")
+
+
 def init_db_and_seed() -> None:
     Base.metadata.create_all(bind=engine)
+    _ensure_indexes()
     with get_session() as db:  # type: Session
         _seed_restaurants(db)
         _seed_menu(db)
         _seed_carts(db)
 
 
+def _ensure_indexes() -> None:
+    # create_all не добавляет новые индексы в уже существующие таблицы;
+    # checkfirst не видит индексы по выражениям, поэтому IF NOT EXISTS.
+    # Каждый индекс в своей транзакции: сбой одного (например, дубли под уникальным) не откатывает
+    # остальные и не останавливает запуск — без индекса приложение работает, только медленнее
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(CreateIndex(index, if_not_exists=True))
+            except Exception as exc:
+                logger.error("create index failed: %s", repr(exc), extra={"index": index.name, "table": table.name})
+
+
 def _seed_restaurants(db: Session) -> None:
     if db.query(Restaurant).limit(1).first() is not None:
         return
@@ -1,9 +1,14 @@
 import os
+import time
+import hashlib
+import json
 from typing import Set
+from urllib.parse import parse_qsl
 from fastapi import Header, HTTPException, Request
 import hmac
 import base64
 from dotenv import load_dotenv
+from app.cache import TTLCache
 from app.logging_config import get_logger
 
 
@@ -25,6 +30,94 @@ load_dotenv()
 SUPER_ADMINS = _load_super_admin_ids()
 logger = get_logger("auth")
 
+BOT_TOKEN = os.getenv("BOT_TOKEN", "")
+# Сколько живёт initData Telegram WebApp с момента auth_date
+INIT_DATA_MAX_AGE_SECONDS = int(os.getenv("TG_INIT_DATA_MAX_AGE_SECONDS", "86400"))
+# Время жизни сессионного токена, выдаваемого в обмен на initData
+WEBAPP_SESSION_TTL_SECONDS = int(os.getenv("WEBAPP_SESSION_TTL_SECONDS", "3600"))
+# Ключ подписи сессий; по умолчанию выводится из токена бота
+WEBAPP_SESSION_SECRET = os.getenv("WEBAPP_SESSION_SECRET") or hashlib.sha256(f"session:{BOT_TOKEN}".encode()).hexdigest()
+# Принимать ли неподписанные X-Telegram-User-Id / ?uid= без сессионного токена. Страницы мини-приложения
+# получают токен сами (static/session.js); включать только для локальной отладки и нагрузочных инструментов
+WEBAPP_ALLOW_UNSIGNED = os.getenv("WEBAPP_ALLOW_UNSIGNED", "false").lower() in ("1", "true", "yes")
+# Токен внутренних вызовов (бот -> API, заголовок X-Internal-Token); по умолчанию выводится из токена бота,
+# который есть у обоих процессов
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN") or hashlib.sha256(f"internal:{BOT_TOKEN}".encode()).hexdigest()
+
+# Проверенные сессионные токены: token -> user_id, живут до истечения токена
+_SESSION_CACHE: TTLCache[int] = TTLCache(maxsize=int(os.getenv("WEBAPP_SESSION_CACHE_SIZE", "50000")), ttl=WEBAPP_SESSION_TTL_SECONDS)
+
+
+def verify_init_data(init_data: str, max_age: int | None = None) -> dict:
+    """Проверяет подпись initData Telegram WebApp и auth_date; возвращает поля с распарсенным user"""
+    if not BOT_TOKEN:
+        raise ValueError("bot token is not configured")
+    fields = dict(parse_qsl(init_data, keep_blank_values=True))
+    received = fields.pop("hash", "")
+    check_string = "\n".join(f"{k}={fields[k]}" for k in sorted(fields))
+    secret_key = hmac.new(b"WebAppData", BOT_TOKEN.encode(), hashlib.sha256).digest()
+    expected = hmac.new(secret_key, check_string.encode(), hashlib.sha256).hexdigest()
+    if not received or not hmac.compare_digest(expected, received):
+        raise ValueError("bad signature")
+    auth_date = int(fields.get("auth_date", "0"))
+    max_age = INIT_DATA_MAX_AGE_SECONDS if max_age is None else max_age
+    if auth_date <= 0 or time.time() - auth_date > max_age:
+        raise ValueError("init data expired")
+    user = json.loads(fields.get("user") or "{}")
+    if not isinstance(user, dict) or "id" not in user:
+        raise ValueError("no user in init data")
+    fields["user"] = user
+    return fields
+
+
+def _session_sig(payload: str) -> str:
+    return hmac.new(WEBAPP_SESSION_SECRET.encode(), payload.encode(), hashlib.sha256).hexdigest()
+
+
+def issue_session_token(user_id: int, ttl: int | None = None) -> tuple[str, int]:
+    """Выдаёт подписанный токен вида <uid>.<exp>.<sig>; возвращает (token, exp)"""
+    exp = int(time.time()) + (WEBAPP_SESSION_TTL_SECONDS if ttl is None else ttl)
+    payload = f"{user_id}.{exp}"
+    token = f"{payload}.{_session_sig(payload)}"
+    _SESSION_CACHE.set(token, user_id, ttl=exp - time.time())
+    return token, exp
+
+
+def verify_session_token(token: str) -> int | None:
+    """user_id по сессионному токену; повторные проверки — один поиск в кэше"""
+    hit, user_id = _SESSION_CACHE.get(token)
+    if hit:
+        return user_id
+    try:
+        uid_s, exp_s, sig = token.split(".")
+        user_id, exp = int(uid_s), int(exp_s)
+    except ValueError:
+        return None
+    remaining = exp - time.time()
+    if remaining <= 0 or not hmac.compare_digest(_session_sig(f"{uid_s}.{exp_s}"), sig):
+        return None
+    # кэшируем только валидные токены и ровно до их истечения
+    _SESSION_CACHE.set(token, user_id, ttl=remaining)
+    return user_id
+
+
+def _session_token_from_request(request: Request) -> str | None:
+    auth = request.headers.get("authorization", "")
+    if auth[:7].lower() == "bearer ":
+        return auth[7:].strip() or None
+    return request.headers.get("x-session-token")
+
+
+def is_internal_request(request: Request) -> bool:
+    """Запрос пришёл от нашего бота (или другого внутреннего сервиса) с X-Internal-Token"""
+    token = request.headers.get("x-internal-token", "")
+    return bool(token) and hmac.compare_digest(token, INTERNAL_API_TOKEN)
+
+
+def require_internal_service(request: Request) -> None:
+    if not is_internal_request(request):
+        raise HTTPException(status_code=403, detail="forbidden")
+
 
 def require_super_admin(
     request: Request,
@@ -51,6 +144,16 @@ def require_user_id(
     request: Request,
     x_telegram_user_id: int | None = Header(default=None, alias="X-Telegram-User-Id"),
 ) -> int:
+    token = _session_token_from_request(request)
+    if token:
+        user_id = verify_session_token(token)
+        if user_id is None:
+            raise HTTPException(status_code=401, detail="invalid_session")
+        return user_id
+    # бот действует от имени пользователя, чьё обновление обрабатывает: id в заголовке заверен токеном сервиса
+    internal = is_internal_request(request)
+    if not internal and not WEBAPP_ALLOW_UNSIGNED:
+        raise HTTPException(status_code=401, detail="session_required")
     user_id: int | None = x_telegram_user_id
     if user_id is None:
         uid_param = request.query_params.get("uid")
@@ -61,6 +164,10 @@ def require_user_id(
     if user_id is None:
         logger.warning("missing user id for request %s", request.url.path)
         raise HTTPException(status_code=401, detail="user_id_required")
+    if internal:
+        return user_id
+    # id никем не подписан: любой клиент может выдать себя за другого пользователя
+    logger.warning("unsigned user id accepted", extra={"path": request.url.path, "user_id": user_id})
     return user_id
 
 
@@ -4,6 +4,7 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import List, Dict, Any
 import logging
+from app.metrics import SMTP_SENDS, SMTP_LATENCY
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +23,7 @@ class EmailService:
         """
         if not restaurant_email or not self.smtp_username or not self.smtp_password:
             logger.warning("Email notification skipped: missing email or SMTP credentials")
+            SMTP_SENDS.labels("skipped").inc()
             return False
             
         try:
@@ -128,15 +130,18 @@ class EmailService:
             msg.attach(html_part)
             
             # Отправляем email
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_username, self.smtp_password)
-                server.send_message(msg)
+            with SMTP_LATENCY.time():
+                with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
+                    server.starttls()
+                    server.login(self.smtp_username, self.smtp_password)
+                    server.send_message(msg)
             
+            SMTP_SENDS.labels("ok").inc()
             logger.info(f"Order notification email sent to {restaurant_email} for order #{order_data['id']}")
             return True
             
         except Exception as e:
+            SMTP_SENDS.labels("error").inc()
             logger.error(f"Failed to send order notification email: {e}")
             return False
 
@@ -1,31 +1,145 @@
+import atexit
+import json
 import logging
-from logging.config import dictConfig
-
-
-def setup_logging(level: str = "INFO") -> None:
-    dictConfig(
-        {
-            "version": 1,
-            "disable_existing_loggers": False,
-            "formatters": {
-                "default": {
-                    "format": "%(asctime)s | %(levelname)s | %(name)s | %(message)s",
-                }
-            },
-            "handlers": {
-                "console": {
-                    "class": "logging.StreamHandler",
-                    "formatter": "default",
-                }
-            },
-            "root": {
-                "level": level,
-                "handlers": ["console"],
-            },
+import os
+import queue
+import random
+import sys
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+
+# Идентификатор текущего запроса (выставляется middleware в app/main.py)
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+# Стандартные атрибуты LogRecord — всё остальное считаем полями из extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+_listener: QueueListener | None = None
+
+
+class RequestContextFilter(logging.Filter):
+    """Добавляет request_id из contextvar; работает в потоке-источнике, до постановки в очередь"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = request_id_var.get()
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Пропускает долю DEBUG-записей; решение принимается на весь запрос целиком по request_id"""
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = max(0.0, min(1.0, rate))
+        self._threshold = int(self.rate * 0xFFFFFFFF)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        rid = getattr(record, "request_id", None)
+        if rid:
+            return zlib.crc32(rid.encode()) <= self._threshold
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
         }
-    )
+        rid = getattr(record, "request_id", None)
+        if rid:
+            data["request_id"] = rid
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class _PreparedQueueHandler(QueueHandler):
+    """QueueHandler, сохраняющий extra-поля; при переполнении очереди запись отбрасывается"""
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # traceback форматируем в потоке-источнике, дальше передаём строкой
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _PreparedQueueHandler.dropped += 1
+
+
+def _parse_levels(raw: str) -> dict:
+    """LOG_LEVELS="app.cart=DEBUG,uvicorn.access=WARNING" -> {logger: level}"""
+    levels = {}
+    for part in raw.split(","):
+        name, _, level = part.strip().partition("=")
+        if name and level:
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(level: str | None = None) -> None:
+    """Логи пишутся через очередь: обработчики запросов не ждут stdout"""
+    global _listener
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = os.getenv("LOG_FORMAT", "json").lower()
+    sample_rate = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+
+    stream = logging.StreamHandler(sys.stdout)
+    if fmt == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(name)s | %(request_id)s | %(message)s"))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+    handler = _PreparedQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+    handler.addFilter(DebugSamplingFilter(sample_rate))
+
+    if _listener is not None:
+        _listener.stop()
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+    for name, lvl in _parse_levels(os.getenv("LOG_LEVELS", "")).items():
+        logging.getLogger(name).setLevel(lvl)
+
+    _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """Дописывает очередь и останавливает поток логирования"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
 
 
 def get_logger(name: str) -> logging.Logger:
     return logging.getLogger(f"app.{name}")
-
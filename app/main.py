@@ -1,14 +1,16 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.staticfiles import StaticFiles
-from starlette.responses import HTMLResponse
+from starlette.responses import HTMLResponse, Response
 import asyncio
 from datetime import datetime, timedelta
 import json
+import time
+import uuid
 
 from app.routers import restaurants, menu, cart, orders
 from app.routers import config as config_router
-from app.logging_config import setup_logging, get_logger
+from app.logging_config import setup_logging, get_logger, request_id_var
 from app.routers import admin as admin_router
 from app.routers import users as users_router
 from app.routers import reviews as reviews_router
@@ -18,7 +20,23 @@ from app.routers import auth as auth_router
 from app.routers import selections as selections_router
 from app.routers import collections as collections_router
 from app.routers import public as public_router
+from app.routers import search as search_router
+from app.routers import internal as internal_router
 from app.db_init import init_db_and_seed
+from app.services.telegram_transport import transport
+from app.services.telegram import flush_admin_messages
+from app.activity import activity_tracker, activity_flush_loop, cart_activity
+from app.services.cart_cleanup import cart_cleanup_loop
+from app.services.menu_changes import menu_changelog_cleanup_loop
+from app.db import engine
+from app import metrics
+from app.traffic_capture import TRAFFIC_CAPTURE_ENABLED, build_entry, read_json_body, traffic_capture
+from app.query_stats import (
+    SQL_STATS_ENABLED,
+    instrument_engine,
+    start_request_stats,
+    stop_request_stats,
+)
 
 
 setup_logging()
@@ -34,6 +52,98 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if SQL_STATS_ENABLED:
+    instrument_engine(engine)
+metrics.instrument_pool(engine)
+
+
+@app.middleware("http")
+async def _query_stats_middleware(request: Request, call_next):
+    # число SQL и время БД на запрос: заголовок Server-Timing, лог и предупреждение о N+1
+    if not SQL_STATS_ENABLED:
+        return await call_next(request)
+    started = time.perf_counter()
+    stats, token = start_request_stats()
+    try:
+        response = await call_next(request)
+    finally:
+        stop_request_stats(token)
+    total_ms = (time.perf_counter() - started) * 1000
+    db_ms = stats.db_time * 1000
+    response.headers.append(
+        "Server-Timing",
+        f'db;dur={db_ms:.1f};desc="{stats.count} queries", app;dur={total_ms:.1f}',
+    )
+    if stats.count:
+        logger.debug("request sql", extra={
+            "method": request.method,
+            "path": request.url.path,
+            "status": response.status_code,
+            "duration_ms": round(total_ms, 1),
+            "db_queries": stats.count,
+            "db_ms": round(db_ms, 1),
+        })
+    for shape, repeats in stats.repeated():
+        logger.warning("possible N+1 query", extra={
+            "method": request.method,
+            "path": request.url.path,
+            "repeats": repeats,
+            "statement": shape[:500],
+        })
+    return response
+
+
+@app.middleware("http")
+async def _request_id_middleware(request: Request, call_next):
+    # X-Request-ID от прокси сохраняем, иначе генерируем; попадает во все логи запроса
+    rid = request.headers.get("x-request-id") or uuid.uuid4().hex[:16]
+    token = request_id_var.set(rid)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = rid
+    return response
+
+
+@app.middleware("http")
+async def _metrics_middleware(request: Request, call_next):
+    # метка — шаблон маршрута (/api/orders/{order_id}), а не сырой путь: кардинальность ограничена
+    started = time.perf_counter()
+    metrics.HTTP_IN_PROGRESS.inc()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.HTTP_IN_PROGRESS.dec()
+        route = request.scope.get("route")
+        template = getattr(route, "path", None) or ("unmatched" if status == 404 else "other")
+        metrics.HTTP_REQUESTS.labels(request.method, template, str(status)).inc()
+        metrics.HTTP_LATENCY.labels(request.method, template).observe(time.perf_counter() - started)
+
+
+@app.middleware("http")
+async def _traffic_capture_middleware(request: Request, call_next):
+    # обезличенные трассы запросов для tools/replay.py (TRAFFIC_CAPTURE_ENABLED)
+    if not TRAFFIC_CAPTURE_ENABLED or not traffic_capture.should_capture(request):
+        return await call_next(request)
+    started_at = time.time()
+    started = time.perf_counter()
+    body = await read_json_body(request)
+    response = await call_next(request)
+    try:
+        traffic_capture.record(build_entry(request, response, body, started_at, time.perf_counter() - started))
+    except Exception as exc:
+        logger.warning("traffic capture failed: %s", repr(exc))
+    return response
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics() -> Response:
+    body, content_type = metrics.render_metrics()
+    return Response(content=body, media_type=content_type)
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -56,6 +166,8 @@ app.include_router(selections_router.router, prefix="/api", tags=["selections"])
 app.include_router(auth_router.router, prefix="/api", tags=["auth"])
 app.include_router(collections_router.router, prefix="/api/collections", tags=["collections"])
 app.include_router(public_router.router, prefix="/api/public", tags=["public"])
+app.include_router(search_router.router, prefix="/api", tags=["search"])
+app.include_router(internal_router.router, prefix="/api/internal", tags=["internal"])
 
 # static for mini app prototype (built later)
 app.mount("/static", StaticFiles(directory="webapp/static"), name="static")
@@ -71,7 +183,7 @@ async def _delivery_watchdog():
     while True:
         now = datetime.utcnow()
         try:
-            with get_session() as db:
+            with metrics.track_task("delivery_watchdog"), get_session() as db:
                 rows = db.query(DBOrder).filter(DBOrder.status == "accepted").all()
                 changed = False
                 for o in rows:
@@ -94,4 +206,34 @@ async def _start_watchdog():
     except Exception as exc:
         logger.exception("db init failed: %s", repr(exc))
     asyncio.create_task(_delivery_watchdog())
+    asyncio.create_task(activity_flush_loop())
+    asyncio.create_task(cart_cleanup_loop())
+    asyncio.create_task(menu_changelog_cleanup_loop())
+    if TRAFFIC_CAPTURE_ENABLED:
+        traffic_capture.start()
+
+
+@app.on_event("shutdown")
+async def _close_telegram_transport():
+    await flush_admin_messages()
+    await transport.aclose()
+
+
+@app.on_event("shutdown")
+async def _flush_activity():
+    try:
+        await asyncio.to_thread(activity_tracker.flush)
+        await asyncio.to_thread(cart_activity.flush)
+    except Exception as exc:
+        logger.exception("activity flush failed: %s", repr(exc))
+
+
+@app.on_event("shutdown")
+async def _stop_traffic_capture():
+    traffic_capture.stop()
+
+
+@app.on_event("shutdown")
+async def _mark_metrics_process_dead():
+    metrics.mark_process_dead()
 
@@ -0,0 +1,143 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# При нескольких воркерах uvicorn задайте PROMETHEUS_MULTIPROC_DIR (пустой каталог,
+# очищается перед стартом): значения пишутся в mmap-файлы и суммируются при выдаче /metrics
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route template", ["method", "route", "status"],
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ["method", "route"],
+    buckets=_LATENCY_BUCKETS,
+)
+HTTP_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests being processed", multiprocess_mode="livesum",
+)
+
+DB_POOL_CHECKOUTS = Counter("db_pool_checkouts_total", "Connections checked out from the pool")
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Connections currently checked out", multiprocess_mode="livesum",
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow", "Pool overflow connections in use", multiprocess_mode="livesum",
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds", "Time spent waiting for a pooled connection",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+
+TELEGRAM_CALLS = Counter("telegram_calls_total", "Telegram Bot API calls", ["method", "outcome"])
+TELEGRAM_LATENCY = Histogram(
+    "telegram_call_duration_seconds", "Telegram Bot API call latency incl. retries", ["method"],
+    buckets=_LATENCY_BUCKETS,
+)
+SMTP_SENDS = Counter("smtp_sends_total", "SMTP sends", ["outcome"])
+SMTP_LATENCY = Histogram("smtp_send_duration_seconds", "SMTP send latency", buckets=_LATENCY_BUCKETS)
+
+TASK_RUNS = Counter("background_task_runs_total", "Background task iterations", ["task", "outcome"])
+TASK_DURATION = Histogram(
+    "background_task_duration_seconds", "Background task iteration duration", ["task"],
+    buckets=_LATENCY_BUCKETS + (30.0, 60.0, 300.0, 1800.0),
+)
+TASK_LAST_SUCCESS = Gauge(
+    "background_task_last_success_timestamp_seconds", "Unix time of the last successful iteration", ["task"],
+    multiprocess_mode="max",
+)
+TASK_IN_PROGRESS = Gauge(
+    "background_task_in_progress", "Background task iterations running now", ["task"],
+    multiprocess_mode="livesum",
+)
+
+IMAGE_PROCESSING = Histogram(
+    "image_processing_duration_seconds", "Uploaded image processing time", ["outcome"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+
+@contextmanager
+def track_task(task: str) -> Iterator[None]:
+    """Учитывает одну итерацию фоновой задачи: длительность, исход, время последнего успеха"""
+    started = time.perf_counter()
+    TASK_IN_PROGRESS.labels(task).inc()
+    try:
+        yield
+    except BaseException:
+        TASK_RUNS.labels(task, "error").inc()
+        raise
+    else:
+        TASK_RUNS.labels(task, "ok").inc()
+        TASK_LAST_SUCCESS.labels(task).set(time.time())
+    finally:
+        TASK_IN_PROGRESS.labels(task).dec()
+        TASK_DURATION.labels(task).observe(time.perf_counter() - started)
+
+
+def instrument_pool(engine: Engine) -> None:
+    """Счётчики пула соединений: выдачи, занятые, overflow и ожидание соединения"""
+    pool = engine.pool
+    if getattr(pool, "_metrics_installed", False):
+        return
+    pool._metrics_installed = True
+
+    def _overflow() -> None:
+        overflow = getattr(pool, "overflow", None)
+        if callable(overflow):
+            DB_POOL_OVERFLOW.set(max(0, overflow()))
+
+    @event.listens_for(pool, "checkout")
+    def _on_checkout(dbapi_con, con_record, con_proxy):
+        DB_POOL_CHECKOUTS.inc()
+        DB_POOL_CHECKED_OUT.inc()
+        _overflow()
+
+    @event.listens_for(pool, "checkin")
+    def _on_checkin(dbapi_con, con_record):
+        DB_POOL_CHECKED_OUT.dec()
+        _overflow()
+
+    # события "до выдачи" у пула нет — время ожидания меряем вокруг Pool.connect()
+    connect = pool.connect
+
+    def _timed_connect():
+        started = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - started)
+
+    pool.connect = _timed_connect
+
+
+def render_metrics() -> tuple[bytes, str]:
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead() -> None:
+    """Вызывается при остановке воркера, чтобы его livesum-гейджи не висели в выдаче"""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Integer, String, Boolean, Text, ForeignKey, Float, Index, UniqueConstraint
+from sqlalchemy import Integer, String, Boolean, Text, ForeignKey, Float, Index, UniqueConstraint, func
 from sqlalchemy.types import DateTime
 from datetime import datetime
 from app.db import Base
@@ -18,6 +18,10 @@ class User(Base):
     birth_date: Mapped[str | None] = mapped_column(String(16), nullable=True)  # ISO YYYY-MM-DD
 
 
+# username в Telegram регистронезависим — ищем по lower(username)
+Index("ix_users_username_lower", func.lower(User.username))
+
+
 class Restaurant(Base):
     __tablename__ = "restaurants"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -34,6 +38,7 @@ class Restaurant(Base):
     image: Mapped[str] = mapped_column(Text, default="")
     work_open_min: Mapped[int] = mapped_column(Integer, default=0)
     work_close_min: Mapped[int] = mapped_column(Integer, default=1440)
+    menu_version: Mapped[int] = mapped_column(Integer, default=0)  # растёт с каждой правкой меню (см. menu_changes)
 
 
 class RestaurantAdmin(Base):
@@ -81,6 +86,22 @@ class Option(Base):
     price_delta: Mapped[int] = mapped_column(Integer, default=0)
 
 
+class MenuChange(Base):
+    """Журнал правок меню для дельта-синхронизации; строки одной правки делят version"""
+    __tablename__ = "menu_changes"
+    __table_args__ = (
+        Index("ix_menu_changes_restaurant_version", "restaurant_id", "version"),
+        Index("ix_menu_changes_created", "created_at"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    restaurant_id: Mapped[int] = mapped_column(Integer, ForeignKey("restaurants.id"))
+    version: Mapped[int] = mapped_column(Integer)
+    entity: Mapped[str] = mapped_column(String(16))  # category, dish, group, option
+    entity_id: Mapped[int] = mapped_column(Integer)
+    op: Mapped[str] = mapped_column(String(8))  # upsert, delete
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
 class Review(Base):
     __tablename__ = "reviews"
     __table_args__ = (
@@ -151,19 +172,29 @@ class OrderItem(Base):
 
 class Cart(Base):
     __tablename__ = "carts"
+    __table_args__ = (
+        # очистка брошенных корзин идёт по этому индексу
+        Index("ix_carts_updated_at", "updated_at"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), unique=True)
     cutlery_count: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)  # последнее изменение содержимого
 
 
 class CartItem(Base):
     __tablename__ = "cart_items"
+    __table_args__ = (
+        # одна строка на блюдо с одинаковым набором опций — повторное добавление увеличивает qty
+        Index("ux_cart_items_line", "cart_id", "dish_id", "options_key", unique=True),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     cart_id: Mapped[int] = mapped_column(Integer, ForeignKey("carts.id"))
     restaurant_id: Mapped[int] = mapped_column(Integer, ForeignKey("restaurants.id"))
     dish_id: Mapped[int] = mapped_column(Integer)
     qty: Mapped[int] = mapped_column(Integer)
     chosen_options: Mapped[str] = mapped_column(Text, default="[]")  # JSON строка
+    options_key: Mapped[str] = mapped_column(String(500), default="")  # отсортированные id опций через запятую
 
 
 class Collection(Base):
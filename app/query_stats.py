@@ -0,0 +1,79 @@
+import os
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import List, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Включить подсчёт SQL на запрос (выключен по умолчанию: заметная цена на каждый запрос)
+SQL_STATS_ENABLED = os.getenv("SQL_STATS_ENABLED", "false").lower() in ("1", "true", "yes")
+# Сколько одинаковых по форме запросов за HTTP-запрос считать подозрением на N+1
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "10"))
+
+_IN_LIST_RE = re.compile(r"\(\s*(?:\?|%\(\w+\)s|:\w+|\$\d+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+|\$\d+))+\s*\)")
+_SPACES_RE = re.compile(r"\s+")
+
+
+class RequestQueryStats:
+    """Счётчики SQL одного HTTP-запроса"""
+
+    __slots__ = ("count", "db_time", "shapes")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.db_time = 0.0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.count += 1
+        self.db_time += elapsed
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int = SQL_N_PLUS_ONE_THRESHOLD) -> List[Tuple[str, int]]:
+        """Формы запросов, выполненные больше threshold раз (кандидаты в N+1)"""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n > threshold]
+
+
+_current: ContextVar[RequestQueryStats | None] = ContextVar("request_query_stats", default=None)
+
+
+def statement_shape(statement: str) -> str:
+    """Нормализует SQL: списки IN (?, ?, ...) сворачиваются, пробелы схлопываются"""
+    return _IN_LIST_RE.sub("(?)", _SPACES_RE.sub(" ", statement).strip())
+
+
+def start_request_stats() -> Tuple[RequestQueryStats, object]:
+    stats = RequestQueryStats()
+    return stats, _current.set(stats)
+
+
+def stop_request_stats(token: object) -> None:
+    _current.reset(token)  # type: ignore[arg-type]
+
+
+def current_request_stats() -> RequestQueryStats | None:
+    return _current.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # время храним на контексте выполнения: при ошибке запроса ничего не накапливается
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None:
+        started = getattr(context, "_query_start", None)
+        stats.record(statement, time.perf_counter() - started if started is not None else 0.0)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Подключает подсчёт statement'ов и времени БД к движку"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
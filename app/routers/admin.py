@@ -3,11 +3,16 @@ from pydantic import BaseModel
 from typing import List
 from app.deps.auth import require_super_admin
 from app.routers.restaurants import Restaurant
-from app.services.telegram import send_admin_message, bot
+from app.services.telegram import send_admin_message, BOT_TOKEN
+from app.services.telegram_transport import transport
+from app.services.admin_digest import admin_digest
+from app.services.search_index import search_index
+from app.metrics import track_task
 from app.store import ensure_user, bind_restaurant_admin, unbind_restaurant_admin
 from app.models import Review as DBReview
 from sqlalchemy.orm import Session
 from app.db import get_db
+from app.logging_config import get_logger
 from datetime import datetime
 from sqlalchemy.orm import Session
 from fastapi import Depends
@@ -17,6 +22,7 @@ import os
 
 
 router = APIRouter(dependencies=[Depends(require_super_admin)])
+logger = get_logger("admin")
 
 
 class RestaurantCreate(BaseModel):
@@ -82,6 +88,7 @@ async def create_restaurant(payload: RestaurantCreate, db: Session = Depends(get
     )
     db.add(r)
     db.commit()
+    search_index.mark_stale()
     try:
         await send_admin_message(f"[admin] Добавлен ресторан {r.name} (id={new_id})")
     except Exception:
@@ -105,6 +112,7 @@ async def update_restaurant(restaurant_id: int, payload: RestaurantUpdate, db: S
         if hasattr(r, k):
             setattr(r, k, v)
     db.commit()
+    search_index.mark_stale()
     try:
         await send_admin_message(f"[admin] Обновлён ресторан id={restaurant_id}")
     except Exception:
@@ -125,6 +133,7 @@ async def set_restaurant_status(restaurant_id: int, enabled: bool, db: Session =
         return {"status": "not_found"}
     r.is_enabled = bool(enabled)
     db.commit()
+    search_index.mark_stale()
     try:
         await send_admin_message(f"[admin] Ресторан id={restaurant_id} статус={'ON' if enabled else 'OFF'}")
     except Exception:
@@ -139,6 +148,7 @@ async def delete_restaurant(restaurant_id: int, db: Session = Depends(get_db)) -
         return {"status": "not_found"}
     db.delete(r)
     db.commit()
+    search_index.mark_stale()
     try:
         await send_admin_message(f"[admin] Удалён ресторан id={restaurant_id}")
     except Exception:
@@ -199,7 +209,8 @@ async def broadcast(payload: Broadcast, db: Session = Depends(get_db)) -> dict:
         await send_admin_message(
             f"📢 Начинаю рассылку для {len(target_user_ids)} получателей\n"
             f"Тип: {payload.target_type}\n"
-            f"Текст: {payload.text[:100]}{'...' if len(payload.text) > 100 else ''}"
+            f"Текст: {payload.text[:100]}{'...' if len(payload.text) > 100 else ''}",
+            urgent=True,
         )
         
         # Счетчики
@@ -207,46 +218,48 @@ async def broadcast(payload: Broadcast, db: Session = Depends(get_db)) -> dict:
         failed_count = 0
         
         # Проверяем, что бот доступен
-        if not bot:
+        if not BOT_TOKEN:
             return {"status": "error", "message": "Bot not initialized"}
         
-        # Отправляем сообщения
-        for user_id in target_user_ids:
-            try:
-                if payload.media_type == "photo" and payload.media_file_id:
-                    await bot.send_photo(
-                        chat_id=user_id,
-                        photo=payload.media_file_id,
-                        caption=payload.text
-                    )
-                elif payload.media_type == "video" and payload.media_file_id:
-                    await bot.send_video(
-                        chat_id=user_id,
-                        video=payload.media_file_id,
-                        caption=payload.text
-                    )
-                else:
-                    await bot.send_message(
-                        chat_id=user_id,
-                        text=payload.text
-                    )
-                sent_count += 1
-                
-                # Небольшая задержка между сообщениями
-                import asyncio
-                await asyncio.sleep(0.05)
+        # Отправляем сообщения; темп задаёт лимитер транспорта Telegram
+        with track_task("broadcast"):
+            for user_id in target_user_ids:
+                try:
+                    if payload.media_type == "photo" and payload.media_file_id:
+                        result = await transport.call("sendPhoto", {
+                            "chat_id": user_id,
+                            "photo": payload.media_file_id,
+                            "caption": payload.text,
+                        }, queue_on_open=False)
+                    elif payload.media_type == "video" and payload.media_file_id:
+                        result = await transport.call("sendVideo", {
+                            "chat_id": user_id,
+                            "video": payload.media_file_id,
+                            "caption": payload.text,
+                        }, queue_on_open=False)
+                    else:
+                        result = await transport.call("sendMessage", {
+                            "chat_id": user_id,
+                            "text": payload.text,
+                        }, queue_on_open=False)
+                    if result.ok:
+                        sent_count += 1
+                    else:
+                        failed_count += 1
+                        logger.warning("broadcast send failed", extra={"user_id": user_id, "error": result.error})
                 
-            except Exception as e:
-                failed_count += 1
-                print(f"Failed to send to user {user_id}: {e}")
-                continue
+                except Exception as e:
+                    failed_count += 1
+                    logger.warning("broadcast send failed", extra={"user_id": user_id, "error": repr(e)})
+                    continue
         
         # Отправляем отчет админу
         await send_admin_message(
             f"✅ Рассылка завершена!\n"
             f"📊 Отправлено: {sent_count}\n"
             f"❌ Ошибок: {failed_count}\n"
-            f"📈 Успешность: {sent_count/(sent_count+failed_count)*100:.1f}%"
+            f"📈 Успешность: {sent_count/(sent_count+failed_count)*100:.1f}%",
+            urgent=True,
         )
         
         return {
@@ -257,7 +270,7 @@ async def broadcast(payload: Broadcast, db: Session = Depends(get_db)) -> dict:
         }
         
     except Exception as e:
-        await send_admin_message(f"❌ Ошибка рассылки: {str(e)}")
+        await send_admin_message(f"❌ Ошибка рассылки: {str(e)}", urgent=True)
         return {"status": "error", "message": str(e)}
 
 
@@ -303,6 +316,18 @@ async def block_user(user_id: int, block: bool = True, db: Session = Depends(get
     }}
 
 
+@router.get("/telegram/metrics")
+async def telegram_metrics() -> dict:
+    """Состояние транспорта Telegram: лимиты, 429, breaker, очередь"""
+    data = transport.snapshot()
+    data["admin_digest"] = {
+        "window_seconds": admin_digest.window_seconds,
+        "events_buffered": admin_digest.events_buffered,
+        "digests_sent": admin_digest.digests_sent,
+    }
+    return data
+
+
 @router.get("/users/resolve-username")
 async def resolve_username_endpoint(username: str) -> dict:
     """Разрешает username в user_id через Telegram Bot API"""
@@ -493,7 +518,7 @@ async def update_admin_code(payload: AdminCodeUpdate) -> dict:
     os.environ["ADMIN_CODE"] = new_code
     
     try:
-        await send_admin_message(f"[admin] ADMIN_CODE изменён на: {new_code}")
+        await send_admin_message(f"[admin] ADMIN_CODE изменён на: {new_code}", urgent=True)
     except Exception:
         pass
     
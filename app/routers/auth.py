@@ -3,6 +3,8 @@ import hmac
 import os
 from fastapi import APIRouter, HTTPException, Response
 from pydantic import BaseModel
+from app.deps.auth import verify_init_data, issue_session_token
+from app.store import ensure_user
 
 
 router = APIRouter()
@@ -28,6 +30,24 @@ class ExchangeRequest(BaseModel):
     token: str
 
 
+class WebAppSessionRequest(BaseModel):
+    init_data: str
+
+
+@router.post("/auth/webapp")
+async def create_webapp_session(req: WebAppSessionRequest) -> dict:
+    """Обмен initData Telegram WebApp на короткоживущий сессионный токен"""
+    try:
+        data = verify_init_data(req.init_data)
+    except ValueError:
+        raise HTTPException(status_code=401, detail="invalid_init_data")
+    user = data["user"]
+    user_id = int(user["id"])
+    ensure_user(user_id, user.get("username"))
+    token, exp = issue_session_token(user_id)
+    return {"token": token, "expires_at": exp, "user_id": user_id}
+
+
 @router.post("/auth/exchange")
 async def exchange_token(req: ExchangeRequest, response: Response) -> dict:
     try:
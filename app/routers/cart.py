@@ -1,15 +1,25 @@
 from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
-from typing import List, Dict, Optional
+from pydantic import BaseModel, Field
+from typing import List, Dict, Literal, Optional
 # Убираем неиспользуемые импорты
 from app.deps.auth import require_user_id
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
+from app.activity import cart_activity
 from app.db import get_db
-from app.models import Cart as DBCart, CartItem as DBCartItem, Dish as ODish, Option as OOption, OptionGroup as OGroup, User as DBUser
+from app.logging_config import get_logger
+from app.models import Cart as DBCart, CartItem as DBCartItem, Dish as ODish, Option as OOption, Restaurant as ORestaurant, User as DBUser
+from app.routers.restaurants import _compute_is_open
+from app.services.cart_refs import CartRef, cached_cart, forget_cart, remember_cart
+from app.services.dish_options import get_dish_rules, options_key
 import json
 
 
 router = APIRouter()
+logger = get_logger("cart")
 
 
 class CartItem(BaseModel):
@@ -30,159 +40,369 @@ class Cart(BaseModel):
     cutlery_count: int = 0
 
 
+class PricedOption(BaseModel):
+    id: int
+    name: str
+    price_delta: int
+
+
+class PricedLine(BaseModel):
+    id: int
+    dish_id: int
+    qty: int
+    chosen_options: List[int]
+    name: str
+    image: str
+    price: int
+    is_available: bool
+    options: List[PricedOption]
+    unit_price: int
+    line_total: int
+
+
+class PricedRestaurant(BaseModel):
+    id: int
+    name: str
+    image: str
+    delivery_time_minutes: int
+    delivery_fee: int
+    delivery_min_sum: int
+    is_open_now: bool
+    items: List[PricedLine]
+    subtotal: int
+    min_sum_shortfall: int
+    total: int
+
+
+class PricedCart(BaseModel):
+    restaurants: List[PricedRestaurant]
+    cutlery_count: int = 0
+
+
+class CartOp(BaseModel):
+    """Одна операция пакета: add (restaurant_id, dish_id, qty, chosen_options), update (item_id, qty),
+    delete (item_id), clear (restaurant_id или вся корзина)"""
+    op: Literal["add", "update", "delete", "clear"]
+    item_id: Optional[int] = None
+    restaurant_id: Optional[int] = None
+    dish_id: Optional[int] = None
+    qty: Optional[int] = None
+    chosen_options: Optional[List[int]] = None
+
+
 # Константы для корзины
 _MAX_RESTAURANTS = 4
+_MAX_BATCH_OPS = 100
+def _upsert_insert(db: Session):
+    """insert() с поддержкой ON CONFLICT для диалекта текущей БД (SQLite или Postgres)"""
+    return pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
 
 
-def _get_cart_db(user_id: int, db: Session) -> DBCart:
-    # ensure user exists to satisfy FK constraint
-    u = db.query(DBUser).filter(DBUser.id == user_id).first()
-    if not u:
-        db.add(DBUser(id=user_id))
-        db.commit()
-    c = db.query(DBCart).filter(DBCart.user_id == user_id).first()
-    if not c:
-        c = DBCart(user_id=user_id, cutlery_count=0)
-        db.add(c)
+def _insert_ignore(db: Session, model, **values) -> None:
+    db.execute(_upsert_insert(db)(model).values(**values).on_conflict_do_nothing())
+
+
+def _load_cart(user_id: int, db: Session) -> tuple[CartRef, List[DBCartItem]]:
+    """Корзина вместе с позициями одним запросом; при первом обращении создаёт пользователя и корзину"""
+    rows = db.execute(
+        select(DBCart.id, DBCart.cutlery_count, DBCartItem)
+        .outerjoin(DBCartItem, DBCartItem.cart_id == DBCart.id)
+        .where(DBCart.user_id == user_id)
+        .order_by(DBCartItem.id)
+    ).all()
+    if rows:
+        items = [it for _, _, it in rows if it is not None]
+        ref = CartRef(rows[0][0], rows[0][1] or 0, {it.restaurant_id for it in items})
+    else:
+        # пользователь и корзина нужны для FK; конкурирующий запрос мог создать их раньше
+        _insert_ignore(db, DBUser, id=user_id)
+        _insert_ignore(db, DBCart, user_id=user_id, cutlery_count=0)
         db.commit()
-    return c
+        cart_id = db.execute(select(DBCart.id).where(DBCart.user_id == user_id)).scalar_one()
+        items, ref = [], CartRef(cart_id, 0, set())
+    remember_cart(user_id, ref)
+    return ref, items
 
 
-@router.get("")
-async def get_cart(user_id: int = Depends(require_user_id), db: Session = Depends(get_db)) -> Cart:
-    c = _get_cart_db(user_id, db)
-    items = db.query(DBCartItem).filter(DBCartItem.cart_id == c.id).all()
+def _cart_ref(user_id: int, db: Session) -> CartRef:
+    ref = cached_cart(user_id)
+    if ref is not None:
+        return ref
+    return _load_cart(user_id, db)[0]
+
+
+def _cart_response(ref: CartRef, items: List[DBCartItem]) -> Cart:
     return Cart(
         items=[
             CartItem(id=it.id, restaurant_id=it.restaurant_id, dish_id=it.dish_id, qty=it.qty, chosen_options=json.loads(it.chosen_options or "[]"))
             for it in items
         ],
-        cutlery_count=c.cutlery_count or 0,
+        cutlery_count=ref.cutlery_count,
     )
 
 
+@router.get("")
+async def get_cart(user_id: int = Depends(require_user_id), db: Session = Depends(get_db)) -> Cart:
+    ref, items = _load_cart(user_id, db)
+    return _cart_response(ref, items)
+
+
+@router.get("/priced")
+async def get_priced_cart(user_id: int = Depends(require_user_id), db: Session = Depends(get_db)) -> PricedCart:
+    """Корзина, готовая к отрисовке: блюда, опции, подытоги и доставка по ресторанам (3 запроса вместо 5 вызовов API)"""
+    ref, items = _load_cart(user_id, db)
+    if not items:
+        return PricedCart(restaurants=[], cutlery_count=ref.cutlery_count)
+    chosen = {it.id: json.loads(it.chosen_options or "[]") for it in items}
+    dish_rows = db.query(ODish, ORestaurant).join(ORestaurant, ORestaurant.id == ODish.restaurant_id).filter(
+        ODish.id.in_({it.dish_id for it in items})
+    ).all()
+    dishes = {d.id: d for d, _ in dish_rows}
+    restaurants = {r.id: r for _, r in dish_rows}
+    option_ids = {o for ids in chosen.values() for o in ids}
+    options = {o.id: o for o in db.query(OOption).filter(OOption.id.in_(option_ids)).all()} if option_ids else {}
+
+    # порядок ресторанов и позиций — как в корзине; позиции удалённых блюд показываем недоступными
+    grouped: Dict[int, List[PricedLine]] = {}
+    for it in items:
+        dish = dishes.get(it.dish_id)
+        opts = [PricedOption(id=o.id, name=o.name, price_delta=o.price_delta or 0) for o in (options.get(i) for i in chosen[it.id]) if o]
+        price = dish.price if dish else 0
+        available = bool(dish and dish.is_available)
+        unit_price = price + sum(o.price_delta for o in opts)
+        grouped.setdefault(dish.restaurant_id if dish else it.restaurant_id, []).append(PricedLine(
+            id=it.id,
+            dish_id=it.dish_id,
+            qty=it.qty,
+            chosen_options=chosen[it.id],
+            name=dish.name if dish else "",
+            image=(dish.image or "") if dish else "",
+            price=price,
+            is_available=available,
+            options=opts,
+            unit_price=unit_price,
+            line_total=unit_price * it.qty if available else 0,
+        ))
+
+    missing = grouped.keys() - restaurants.keys()
+    if missing:
+        # все блюда ресторана удалены из меню — ресторан догружаем отдельно
+        restaurants.update({r.id: r for r in db.query(ORestaurant).filter(ORestaurant.id.in_(missing)).all()})
+
+    result = []
+    for rid, lines in grouped.items():
+        r = restaurants.get(rid)
+        if r is None:
+            continue
+        subtotal = sum(line.line_total for line in lines)
+        result.append(PricedRestaurant(
+            id=r.id,
+            name=r.name,
+            image=r.image or "",
+            delivery_time_minutes=r.delivery_time_minutes or 0,
+            delivery_fee=r.delivery_fee or 0,
+            delivery_min_sum=r.delivery_min_sum or 0,
+            is_open_now=_compute_is_open(r),
+            items=lines,
+            subtotal=subtotal,
+            min_sum_shortfall=max(0, (r.delivery_min_sum or 0) - subtotal),
+            total=subtotal + (r.delivery_fee or 0),
+        ))
+    return PricedCart(restaurants=result, cutlery_count=ref.cutlery_count)
+
+
 @router.post("/items")
 async def add_item(item: CartItem, force: bool = False, user_id: int = Depends(require_user_id), db: Session = Depends(get_db)) -> Dict[str, int | str | list]:
     # Убеждаемся, что chosen_options не None
     if item.chosen_options is None:
         item.chosen_options = []
-    print(f"DEBUG: Force flag: {force}")
-    print(f"DEBUG: User ID: {user_id}")
-    print(f"DEBUG: restaurant_id type: {type(item.restaurant_id)}, value: {item.restaurant_id}")
-    print(f"DEBUG: dish_id type: {type(item.dish_id)}, value: {item.dish_id}")
-    print(f"DEBUG: qty type: {type(item.qty)}, value: {item.qty}")
-    print(f"DEBUG: chosen_options type: {type(item.chosen_options)}, value: {item.chosen_options}")
-    
-    print("DEBUG: Getting cart from database...")
-    c = _get_cart_db(user_id, db)
-    print(f"DEBUG: Cart ID: {c.id}")
-    
-    print("DEBUG: Checking existing restaurants...")
-    existing_restaurants = {it.restaurant_id for it in db.query(DBCartItem).filter(DBCartItem.cart_id == c.id).all()}
-    print(f"DEBUG: Existing restaurants: {existing_restaurants}")
-    
+    logger.debug(
+        "add_item request",
+        extra={"user_id": user_id, "restaurant_id": item.restaurant_id, "dish_id": item.dish_id,
+               "qty": item.qty, "chosen_options": item.chosen_options, "force": force},
+    )
+    c = _cart_ref(user_id, db)
+
+    existing_restaurants = set(c.restaurants)
     is_new_restaurant = item.restaurant_id not in existing_restaurants
-    print(f"DEBUG: Is new restaurant: {is_new_restaurant}")
-    print(f"DEBUG: Current restaurant count: {len(existing_restaurants)}")
-    print(f"DEBUG: Max restaurants: {_MAX_RESTAURANTS}")
-    
+
     if is_new_restaurant and len(existing_restaurants) >= _MAX_RESTAURANTS and not force:
-        print("DEBUG: Too many restaurants, returning error")
+        logger.debug("add_item rejected: too many restaurants", extra={"cart_id": c.cart_id, "current": sorted(existing_restaurants)})
         return {
             "status": "too_many_restaurants",
             "current_restaurant_ids": list(existing_restaurants),
             "max": _MAX_RESTAURANTS,
         }
     if is_new_restaurant and len(existing_restaurants) >= _MAX_RESTAURANTS and force:
-        print("DEBUG: Force flag is True, clearing other restaurants")
-        db.query(DBCartItem).filter(DBCartItem.cart_id == c.id, DBCartItem.restaurant_id != item.restaurant_id).delete()
-
-    print("DEBUG: Validating dish exists...")
-    # validate options if needed
-    dish = db.query(ODish).filter(ODish.id == item.dish_id).first()
-    if not dish:
-        print("DEBUG: Dish not found, raising 404")
+        logger.debug("add_item force: clearing other restaurants", extra={"cart_id": c.cart_id})
+        db.query(DBCartItem).filter(DBCartItem.cart_id == c.cart_id, DBCartItem.restaurant_id != item.restaurant_id).delete()
+        existing_restaurants = set()
+
+    # правила опций блюда скомпилированы и закэшированы — каталог из БД не читаем
+    rules = get_dish_rules(item.dish_id, db)
+    if rules is None:
         raise HTTPException(status_code=404, detail="Dish not found")
-    print(f"DEBUG: Dish found: {dish.name}, has_options: {dish.has_options}")
-    
-    # Проверяем, есть ли реально группы опций в базе данных
-    groups = db.query(OGroup).filter(OGroup.dish_id == dish.id).all()
-    print(f"DEBUG: Found {len(groups)} option groups for dish {dish.id}")
-    
-    if groups:  # Если есть группы опций, валидируем
-        print("DEBUG: Dish has option groups, validating chosen options...")
-        chosen = set(item.chosen_options or [])
-        print(f"DEBUG: Chosen options: {chosen}")
-        
-        opt_map = {}
-        g_ids = [g.id for g in groups]
-        opts = db.query(OOption).filter(OOption.group_id.in_(g_ids)).all()
-        print(f"DEBUG: Found {len(opts)} options")
-        
-        for g in groups:
-            opt_map[g.id] = {o.id for o in opts if o.group_id == g.id}
-            print(f"DEBUG: Group {g.id} has options: {opt_map[g.id]}")
-        
-        for g in groups:
-            print(f"DEBUG: Validating group {g.id}: min_select={g.min_select}, max_select={g.max_select}, required={g.required}")
-            count = len([oid for oid in chosen if oid in opt_map.get(g.id, set())])
-            print(f"DEBUG: Selected count for group {g.id}: {count}")
-            
-            # Для обязательных групп минимум 1, для необязательных - min_select
-            min_required = max(1, g.min_select) if g.required else g.min_select
-            print(f"DEBUG: Min required for group {g.id}: {min_required}")
-            
-            if count < min_required:
-                print(f"DEBUG: Validation failed - not enough options for group {g.id}")
-                raise HTTPException(status_code=400, detail={"status": "options_required", "group_id": g.id})
-            if g.max_select and count > g.max_select:
-                print(f"DEBUG: Validation failed - too many options for group {g.id}")
-                raise HTTPException(status_code=400, detail={"status": "options_exceeded", "group_id": g.id, "max": g.max_select})
-    
-    print("DEBUG: All validations passed, creating cart item...")
-    db_item = DBCartItem(
-        cart_id=c.id,
+    error = rules.check(item.chosen_options)
+    if error:
+        logger.debug("add_item rejected: invalid options", extra={"dish_id": item.dish_id, **error})
+        raise HTTPException(status_code=400, detail=error)
+
+    # та же позиция (блюдо + набор опций) уже в корзине — увеличиваем qty вместо новой строки
+    chosen = sorted(set(item.chosen_options))
+    stmt = _upsert_insert(db)(DBCartItem).values(
+        cart_id=c.cart_id,
         restaurant_id=item.restaurant_id,
         dish_id=item.dish_id,
         qty=item.qty,
-        chosen_options=json.dumps(item.chosen_options or []),
+        chosen_options=json.dumps(chosen),
+        options_key=options_key(chosen),
     )
-    print(f"DEBUG: Created DB item: {db_item}")
-    
-    db.add(db_item)
-    db.commit()
-    print(f"DEBUG: Item saved to database with ID: {db_item.id}")
-    
-    return {"status": "ok", "id": db_item.id or 0}
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DBCartItem.cart_id, DBCartItem.dish_id, DBCartItem.options_key],
+        set_={"qty": DBCartItem.qty + stmt.excluded.qty},
+    ).returning(DBCartItem.id)
+    try:
+        item_id = db.execute(stmt).scalar_one()
+        db.commit()
+    except IntegrityError:
+        # корзину из кэша успела удалить очистка брошенных корзин — следующий запрос создаст новую
+        db.rollback()
+        forget_cart(user_id)
+        raise HTTPException(status_code=409, detail={"status": "conflict"})
+    c.restaurants = existing_restaurants | {item.restaurant_id}
+    cart_activity.touch(c.cart_id)
+    logger.debug("cart item added", extra={"cart_id": c.cart_id, "item_id": item_id})
+
+    return {"status": "ok", "id": item_id}
 
 
 @router.patch("/items/{item_id}")
 async def update_item(item_id: int, qty: int, user_id: int = Depends(require_user_id), db: Session = Depends(get_db)) -> Dict[str, str]:
-    c = _get_cart_db(user_id, db)
-    it = db.query(DBCartItem).filter(DBCartItem.id == item_id, DBCartItem.cart_id == c.id).first()
-    if not it:
-        return {"status": "not_found"}
-    it.qty = qty
+    c = _cart_ref(user_id, db)
+    updated = db.query(DBCartItem).filter(DBCartItem.id == item_id, DBCartItem.cart_id == c.cart_id).update({DBCartItem.qty: qty})
     db.commit()
-    return {"status": "ok"}
+    if updated:
+        cart_activity.touch(c.cart_id)
+    return {"status": "ok" if updated else "not_found"}
 
 
 @router.delete("/items/{item_id}")
 async def delete_item(item_id: int, user_id: int = Depends(require_user_id), db: Session = Depends(get_db)) -> Dict[str, str]:
-    c = _get_cart_db(user_id, db)
-    deleted = db.query(DBCartItem).filter(DBCartItem.id == item_id, DBCartItem.cart_id == c.id).delete()
+    c = _cart_ref(user_id, db)
+    deleted = db.query(DBCartItem).filter(DBCartItem.id == item_id, DBCartItem.cart_id == c.cart_id).delete()
     db.commit()
+    if deleted:
+        # ресторан мог остаться без позиций — набор перечитаем при следующем обращении
+        forget_cart(user_id)
+        cart_activity.touch(c.cart_id)
     return {"status": "ok" if deleted else "not_found"}
 
 
 @router.post("/clear")
 async def clear_cart(restaurant_id: int | None = None, user_id: int = Depends(require_user_id), db: Session = Depends(get_db)) -> Dict[str, str]:
-    c = _get_cart_db(user_id, db)
+    c = _cart_ref(user_id, db)
     if restaurant_id is None:
-        db.query(DBCartItem).filter(DBCartItem.cart_id == c.id).delete()
+        db.query(DBCartItem).filter(DBCartItem.cart_id == c.cart_id).delete()
         db.commit()
+        c.restaurants = set()
+        cart_activity.touch(c.cart_id)
         return {"status": "ok"}
-    deleted = db.query(DBCartItem).filter(DBCartItem.cart_id == c.id, DBCartItem.restaurant_id == restaurant_id).delete()
+    deleted = db.query(DBCartItem).filter(DBCartItem.cart_id == c.cart_id, DBCartItem.restaurant_id == restaurant_id).delete()
     db.commit()
+    c.restaurants = c.restaurants - {restaurant_id}
+    cart_activity.touch(c.cart_id)
     return {"status": "ok", "removed": str(deleted)}
 
+
+class CartBatch(BaseModel):
+    ops: List[CartOp] = Field(..., max_length=_MAX_BATCH_OPS)
+
+
+def _batch_error(status_code: int, index: int, status: str, **extra) -> HTTPException:
+    return HTTPException(status_code=status_code, detail={"status": status, "index": index, **extra})
+
+
+@router.post("/batch")
+async def batch_update(payload: CartBatch, force: bool = False, user_id: int = Depends(require_user_id), db: Session = Depends(get_db)) -> dict:
+    """Пакет изменений корзины: все операции проверяются и применяются одной транзакцией"""
+    ref, loaded = _load_cart(user_id, db)
+    # состояние корзины в памяти: существующие позиции по id и новые (без id до flush)
+    items: Dict[int, DBCartItem] = {it.id: it for it in loaded}
+    added: List[DBCartItem] = []
+    removed: List[DBCartItem] = []
+
+    def _remove(predicate) -> None:
+        nonlocal added
+        for item_id in [i for i, it in items.items() if predicate(it)]:
+            removed.append(items.pop(item_id))
+        added = [it for it in added if not predicate(it)]
+
+    for index, op in enumerate(payload.ops):
+        if op.op == "add":
+            if op.restaurant_id is None or op.dish_id is None or not op.qty or op.qty < 1:
+                raise _batch_error(400, index, "invalid_op")
+            restaurants = {it.restaurant_id for it in items.values()} | {it.restaurant_id for it in added}
+            if op.restaurant_id not in restaurants and len(restaurants) >= _MAX_RESTAURANTS:
+                if not force:
+                    db.rollback()
+                    return {
+                        "status": "too_many_restaurants",
+                        "index": index,
+                        "current_restaurant_ids": sorted(restaurants),
+                        "max": _MAX_RESTAURANTS,
+                    }
+                _remove(lambda it: it.restaurant_id != op.restaurant_id)
+            rules = get_dish_rules(op.dish_id, db)
+            if rules is None:
+                raise _batch_error(404, index, "dish_not_found")
+            error = rules.check(op.chosen_options)
+            if error:
+                raise _batch_error(400, index, **error)
+            chosen = sorted(set(op.chosen_options or []))
+            key = options_key(chosen)
+            same = next((it for it in [*items.values(), *added] if it.dish_id == op.dish_id and it.options_key == key), None)
+            if same is not None:
+                same.qty += op.qty
+                continue
+            added.append(DBCartItem(
+                cart_id=ref.cart_id,
+                restaurant_id=op.restaurant_id,
+                dish_id=op.dish_id,
+                qty=op.qty,
+                chosen_options=json.dumps(chosen),
+                options_key=key,
+            ))
+        elif op.op == "update":
+            if op.item_id not in items or op.qty is None:
+                raise _batch_error(400 if op.qty is None else 404, index, "invalid_op" if op.qty is None else "not_found")
+            if op.qty < 1:
+                _remove(lambda it, item_id=op.item_id: it.id == item_id)
+            else:
+                items[op.item_id].qty = op.qty
+        elif op.op == "delete":
+            if op.item_id not in items:
+                raise _batch_error(404, index, "not_found")
+            _remove(lambda it, item_id=op.item_id: it.id == item_id)
+        else:
+            _remove(lambda it, rid=op.restaurant_id: rid is None or it.restaurant_id == rid)
+
+    for it in removed:
+        db.delete(it)
+    if removed:
+        # unit of work пишет INSERT раньше DELETE — удалённая и заново добавленная строка упёрлась бы в уникальный индекс
+        db.flush()
+    db.add_all(added)
+    try:
+        db.commit()
+    except IntegrityError:
+        # параллельный запрос успел добавить ту же позицию или корзину удалила очистка
+        db.rollback()
+        forget_cart(user_id)
+        raise HTTPException(status_code=409, detail={"status": "conflict"})
+
+    final = sorted(items.values(), key=lambda it: it.id) + added
+    ref.restaurants = {it.restaurant_id for it in final}
+    remember_cart(user_id, ref)
+    cart_activity.touch(ref.cart_id)
+    logger.debug("cart batch applied", extra={"cart_id": ref.cart_id, "ops": len(payload.ops), "added": len(added), "removed": len(removed)})
+    return {"status": "ok", **_cart_response(ref, final).model_dump()}
@@ -3,12 +3,14 @@ from pydantic import BaseModel
 from typing import List, Optional
 from sqlalchemy.orm import Session
 from app.db import get_db
+from app.logging_config import get_logger
 from app.deps.auth import require_super_admin
 from app.models import Collection as DBCollection, CollectionItem as DBCollectionItem, Restaurant as DBRestaurant, Dish as DBDish
 from app.services.image_processor import ImageProcessor
 from datetime import datetime
 
 router = APIRouter()
+logger = get_logger("collections")
 
 
 class CollectionCreate(BaseModel):
@@ -91,7 +93,7 @@ async def get_restaurants_for_collections(db: Session = Depends(get_db)) -> List
             for r in restaurants
         ]
     except Exception as e:
-        print(f"Error in get_restaurants_for_collections: {e}")
+        logger.exception("get_restaurants_for_collections failed: %s", repr(e))
         return []
 
 
@@ -123,7 +125,7 @@ async def get_dishes_for_collections(restaurant_id: Optional[int] = None, db: Se
         
         return result
     except Exception as e:
-        print(f"Error in get_dishes_for_collections: {e}")
+        logger.exception("get_dishes_for_collections failed: %s", repr(e))
         return []
     
 
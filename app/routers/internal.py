@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.deps.auth import require_internal_service
+from app.services.telegram import resolve_username_to_user_id
+
+
+# Вызовы внутренних сервисов (бот); доступ только с X-Internal-Token
+router = APIRouter(dependencies=[Depends(require_internal_service)])
+
+
+@router.get("/resolve-username")
+async def resolve_username(username: str) -> dict:
+    """Общий резолвер username -> user_id (кэш, БД, getChat) для бота"""
+    user_id = await resolve_username_to_user_id(username)
+    if not user_id:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"user_id": user_id}
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 from sqlalchemy.orm import Session
 from app.db import get_db
 from app.models import Category as OCategory, Dish as ODish, Option as OOption, OptionGroup as OGroup
+from app.services.menu_changes import menu_changes_since
+from app.services.menu_snapshot import etag_matches, get_menu_snapshot
 
 
 router = APIRouter()
@@ -50,30 +53,42 @@ _GROUPS: List[DishOptionGroup] = []
 _OPTIONS: List[DishOption] = []
 
 
+def _include_options(include: Optional[str]) -> bool:
+    parts = {p.strip() for p in (include or "").split(",") if p.strip()}
+    if parts - {"options"}:
+        raise HTTPException(status_code=400, detail="bad_include")
+    return "options" in parts
+
+
+def menu_response(restaurant_id: int, if_none_match: Optional[str], db: Session, include: Optional[str] = None) -> Response:
+    """Снимок меню как есть (без повторной сериализации); 304, если у клиента та же версия"""
+    snapshot = get_menu_snapshot(restaurant_id, db, _include_options(include))
+    headers = {"ETag": snapshot.etag, "X-Menu-Version": str(snapshot.version), "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, snapshot.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
+
 @router.get("/restaurants/{restaurant_id}/menu")
-async def get_menu(restaurant_id: int, db: Session = Depends(get_db)) -> Dict[str, List[dict]]:
-    cats = db.query(OCategory).filter(OCategory.restaurant_id == restaurant_id).order_by(OCategory.sort.asc()).all()
-    dishes = db.query(ODish).filter(ODish.restaurant_id == restaurant_id).all()
-    return {
-        "categories": [
-            {"id": c.id, "restaurant_id": c.restaurant_id, "name": c.name, "sort": c.sort}
-            for c in cats
-        ],
-        "dishes": [
-            {
-                "id": d.id,
-                "restaurant_id": d.restaurant_id,
-                "category_id": d.category_id,
-                "name": d.name,
-                "description": d.description,
-                "price": d.price,
-                "image": d.image,
-                "is_available": d.is_available,
-                "has_options": d.has_options,
-            }
-            for d in dishes
-        ],
-    }
+async def get_menu(
+    restaurant_id: int,
+    include: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+) -> Response:
+    """include=options — плюс группы и опции всех блюд (как в /dishes/{id}/options), страница меню за один запрос"""
+    return menu_response(restaurant_id, if_none_match, db, include)
+
+
+@router.get("/restaurants/{restaurant_id}/menu/changes")
+async def get_menu_changes(restaurant_id: int, since: int, db: Session = Depends(get_db)) -> Response:
+    """Дельта меню после версии since (с группами и опциями); если журнал короче — полный снимок с full=true"""
+    changes = menu_changes_since(restaurant_id, since, db)
+    if changes is not None:
+        return JSONResponse(changes)
+    snapshot = get_menu_snapshot(restaurant_id, db, include_options=True)
+    # готовый снимок не пересериализуем: дописываем признак в начало объекта
+    return Response(content=b'{"full":true,' + snapshot.body[1:], media_type="application/json")
 
 @router.get("/categories")
 async def get_categories(restaurant_id: int, db: Session = Depends(get_db)) -> List[Category]:
@@ -2,9 +2,13 @@ from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import List, Literal
 from datetime import datetime
-from app.services.telegram import send_admin_message, send_user_message, WEBAPP_URL, notify_user_order_delivered, notify_restaurant_admins
+from app.services.telegram import (
+    send_admin_message, send_user_message, WEBAPP_URL, notify_user_order_delivered, notify_restaurant_admins,
+    notify_in_background,
+)
 from app.logging_config import get_logger
-from sqlalchemy.orm import Session
+from sqlalchemy import insert
+from sqlalchemy.orm import Query, Session
 from app.db import get_db
 from app.models import Option as OOption, Restaurant as ORestaurant, Order as DBOrder, OrderItem as DBOrderItem
 from app.store import ensure_user
@@ -65,9 +69,9 @@ async def create_order(payload: OrderCreate, db: Session = Depends(get_db)) -> d
     user = ensure_user(payload.user_id)
     if user.is_blocked:
         raise HTTPException(status_code=403, detail="user_blocked")
+    r = db.query(ORestaurant).filter(ORestaurant.id == payload.restaurant_id).first()
     # server-side validation: minimal sum for delivery
     if payload.delivery_type == "delivery":
-        r = db.query(ORestaurant).filter(ORestaurant.id == payload.restaurant_id).first()
         if not r:
             raise HTTPException(status_code=404, detail="Restaurant not found")
         if payload.total_price < r.delivery_min_sum:
@@ -108,7 +112,6 @@ async def create_order(payload: OrderCreate, db: Session = Depends(get_db)) -> d
 
     # add delivery fee if delivery type
     delivery_fee = 0
-    r = db.query(ORestaurant).filter(ORestaurant.id == payload.restaurant_id).first()
     if payload.delivery_type == "delivery" and r:
         delivery_fee = r.delivery_fee
     computed_total += delivery_fee
@@ -127,18 +130,62 @@ async def create_order(payload: OrderCreate, db: Session = Depends(get_db)) -> d
         created_at=datetime.utcnow(),
     )
     db.add(db_order)
+    db.flush()
+    # позиции одним executemany, без RETURNING на каждую строку
+    if snapped_items:
+        db.execute(insert(DBOrderItem), [
+            {
+                "order_id": db_order.id,
+                "dish_id": it.dish_id,
+                "name": it.name,
+                "price": it.price,
+                "qty": it.qty,
+                "chosen_options": json.dumps(it.chosen_options or []),
+            }
+            for it in snapped_items
+        ])
     db.commit()
-    db.refresh(db_order)
-    for it in snapped_items:
-        db.add(DBOrderItem(
-            order_id=db_order.id,
-            dish_id=it.dish_id,
-            name=it.name,
-            price=it.price,
-            qty=it.qty,
-            chosen_options=json.dumps(it.chosen_options or []),
-        ))
-    db.commit()
+    # Telegram-уведомления уходят фоновой задачей: лимиты Bot API (около сообщения в секунду на чат)
+    # не должны держать ответ. Сессия не истекает на commit, заказ отвязываем — она закроется раньше задачи
+    db.expunge(db_order)
+    notify_in_background(_notify_order_created(db_order, snapped_items))
+
+    # Email уведомление ресторану о новом заказе
+    try:
+        if r and r.email:
+            # Подготавливаем данные для email
+            order_data = {
+                'id': db_order.id,
+                'user_id': db_order.user_id,
+                'created_at': db_order.created_at.strftime('%d.%m.%Y %H:%M'),
+                'delivery_address': db_order.address or 'Самовывоз',
+                'payment_method': {
+                    'cash': 'Наличными',
+                    'card_to_courier': 'Картой курьеру',
+                    'transfer': 'Переводом'
+                }.get(db_order.payment_method, db_order.payment_method),
+                'items': [
+                    {
+                        'name': item.name,
+                        'qty': item.qty,
+                        'price': item.price
+                    } for item in snapped_items
+                ]
+            }
+            
+            email_service.send_order_notification(
+                restaurant_email=r.email,
+                restaurant_name=r.name,
+                order_data=order_data
+            )
+    except Exception as exc:
+        logger.exception("Failed to send email notification: %s", repr(exc))
+
+    return {"id": db_order.id}
+
+
+async def _notify_order_created(db_order: DBOrder, snapped_items: List[OrderItem]) -> None:
+    """Журнал админ-канала, админы ресторана и клиент; выполняется после ответа на создание заказа"""
     # journal notification (админ‑канал)
     try:
         def fmt_item(it: OrderItem) -> str:
@@ -185,38 +232,6 @@ async def create_order(payload: OrderCreate, db: Session = Depends(get_db)) -> d
     except Exception as exc:
         logger.exception("Failed to send notification to restaurant admins: %s", repr(exc))
 
-    # Email уведомление ресторану о новом заказе
-    try:
-        r = db.query(ORestaurant).filter(ORestaurant.id == db_order.restaurant_id).first()
-        if r and r.email:
-            # Подготавливаем данные для email
-            order_data = {
-                'id': db_order.id,
-                'user_id': db_order.user_id,
-                'created_at': db_order.created_at.strftime('%d.%m.%Y %H:%M'),
-                'delivery_address': db_order.address or 'Самовывоз',
-                'payment_method': {
-                    'cash': 'Наличными',
-                    'card_to_courier': 'Картой курьеру',
-                    'transfer': 'Переводом'
-                }.get(db_order.payment_method, db_order.payment_method),
-                'items': [
-                    {
-                        'name': item.name,
-                        'qty': item.qty,
-                        'price': item.price
-                    } for item in snapped_items
-                ]
-            }
-            
-            email_service.send_order_notification(
-                restaurant_email=r.email,
-                restaurant_name=r.name,
-                order_data=order_data
-            )
-    except Exception as exc:
-        logger.exception("Failed to send email notification: %s", repr(exc))
-
     # notify user with deep‑link to current order (mini app web_app)
     try:
         if WEBAPP_URL:
@@ -246,8 +261,6 @@ async def create_order(payload: OrderCreate, db: Session = Depends(get_db)) -> d
             logger.warning("WEBAPP_URL is empty; skip user_message")
     except Exception as exc:
         logger.exception("user_message failed: %s", repr(exc))
-    
-    return {"id": db_order.id}
 
 
 @router.get("/{order_id}")
@@ -275,12 +288,28 @@ async def get_order(order_id: int, db: Session = Depends(get_db)) -> Order:
     )
 
 
+def load_order_items(db: Session, orders: Query) -> dict[int, List[DBOrderItem]]:
+    """Позиции заказов выборки одним запросом: order_id -> [items] в порядке id.
+
+    Фильтр выборки повторяется подзапросом (order_id IN (SELECT id FROM orders WHERE ...)),
+    а не списком id: у ресторана заказов может быть больше лимита параметров SQLite.
+    """
+    grouped: dict[int, List[DBOrderItem]] = {}
+    order_ids = orders.with_entities(DBOrder.id).order_by(None).scalar_subquery()
+    rows = db.query(DBOrderItem).filter(DBOrderItem.order_id.in_(order_ids)).order_by(DBOrderItem.id.asc()).all()
+    for it in rows:
+        grouped.setdefault(it.order_id, []).append(it)
+    return grouped
+
+
 @router.get("")
 async def list_orders(user_id: int, db: Session = Depends(get_db)) -> List[Order]:
-    rows = db.query(DBOrder).filter(DBOrder.user_id == user_id).all()
+    orders = db.query(DBOrder).filter(DBOrder.user_id == user_id)
+    rows = orders.all()
+    items_by_order = load_order_items(db, orders) if rows else {}
     result: List[Order] = []
     for o in rows:
-        items = db.query(DBOrderItem).filter(DBOrderItem.order_id == o.id).all()
+        items = items_by_order.get(o.id, [])
         result.append(Order(
             id=o.id,
             user_id=o.user_id,
@@ -303,10 +332,12 @@ async def list_orders(user_id: int, db: Session = Depends(get_db)) -> List[Order
 
 @router.get("/by-restaurant/{restaurant_id}")
 async def list_orders_by_restaurant(restaurant_id: int, db: Session = Depends(get_db)) -> List[Order]:
-    rows = db.query(DBOrder).filter(DBOrder.restaurant_id == restaurant_id).all()
+    orders = db.query(DBOrder).filter(DBOrder.restaurant_id == restaurant_id)
+    rows = orders.all()
+    items_by_order = load_order_items(db, orders) if rows else {}
     result: List[Order] = []
     for o in rows:
-        items = db.query(DBOrderItem).filter(DBOrderItem.order_id == o.id).all()
+        items = items_by_order.get(o.id, [])
         result.append(Order(
             id=o.id,
             user_id=o.user_id,
@@ -13,11 +13,24 @@ async def get_public_collections(db: Session = Depends(get_db)) -> List[dict]:
     collections = db.query(DBCollection).filter(DBCollection.is_enabled == True).order_by(DBCollection.sort_order, DBCollection.id).all()
     result = []
     
-    for collection in collections:
-        items = db.query(DBCollectionItem).filter(
-            DBCollectionItem.collection_id == collection.id,
+    # Элементы всех подборок и связанные рестораны/блюда — по одному запросу на таблицу
+    items_by_collection: dict[int, list] = {}
+    if collections:
+        all_items = db.query(DBCollectionItem).filter(
+            DBCollectionItem.collection_id.in_([c.id for c in collections]),
             DBCollectionItem.is_enabled == True
         ).order_by(DBCollectionItem.sort_order, DBCollectionItem.id).all()
+        for item in all_items:
+            items_by_collection.setdefault(item.collection_id, []).append(item)
+    else:
+        all_items = []
+    restaurant_ids = {i.item_id for i in all_items if i.item_type == "restaurant"}
+    dish_ids = {i.item_id for i in all_items if i.item_type == "dish"}
+    restaurants = {r.id: r for r in db.query(DBRestaurant).filter(DBRestaurant.id.in_(restaurant_ids)).all()} if restaurant_ids else {}
+    dishes = {d.id: d for d in db.query(DBDish).filter(DBDish.id.in_(dish_ids)).all()} if dish_ids else {}
+    
+    for collection in collections:
+        items = items_by_collection.get(collection.id, [])
         
         collection_items = []
         for item in items:
@@ -33,7 +46,7 @@ async def get_public_collections(db: Session = Depends(get_db)) -> List[dict]:
             }
             
             if item.item_type == "restaurant":
-                restaurant = db.query(DBRestaurant).filter(DBRestaurant.id == item.item_id).first()
+                restaurant = restaurants.get(item.item_id)
                 if restaurant:
                     item_data["restaurant"] = {
                         "id": restaurant.id,
@@ -44,7 +57,7 @@ async def get_public_collections(db: Session = Depends(get_db)) -> List[dict]:
                         "delivery_time_minutes": restaurant.delivery_time_minutes
                     }
             elif item.item_type == "dish":
-                dish = db.query(DBDish).filter(DBDish.id == item.item_id).first()
+                dish = dishes.get(item.item_id)
                 if dish:
                     item_data["dish"] = {
                         "id": dish.id,
@@ -4,9 +4,12 @@ from app.deps.auth import require_user_id
 from app.store import get_restaurant_for_admin
 from app.services.telegram import send_admin_message, notify_user_order_modified, notify_user_order_accepted, WEBAPP_URL
 from app.services.image_processor import ImageProcessor
+from app.services.search_index import search_index
+from app.routers.orders import load_order_items
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from app.db import get_db, get_session
+from app.logging_config import get_logger
 from app.models import Restaurant as ORestaurant, Option as OOption, Order as DBOrder, OrderItem as DBOrderItem, RestaurantAdmin as DBRestaurantAdmin
 import os
 import uuid
@@ -14,17 +17,14 @@ from datetime import datetime
 
 
 router = APIRouter()
+logger = get_logger("ra")
 
 
 def require_restaurant_id(user_id: int = Depends(require_user_id)) -> int:
-    print(f"DEBUG: require_restaurant_id called with user_id={user_id}")
+    # роль берётся из снимка restaurant_admins в памяти — без запроса к БД
     rid = get_restaurant_for_admin(user_id)
-    print(f"DEBUG: require_restaurant_id result: rid={rid}")
     if rid is None:
-        print(f"DEBUG: require_restaurant_id: raising 403 for user_id={user_id}")
-        print(f"DEBUG: User {user_id} is not a restaurant admin")
         raise HTTPException(status_code=403, detail="not_restaurant_admin")
-    print(f"DEBUG: require_restaurant_id: returning rid={rid} for user_id={user_id}")
     return rid
 
 
@@ -44,14 +44,13 @@ async def ra_me(rid: int = Depends(require_restaurant_id), db: Session = Depends
 
 @router.get("/ra/orders")
 async def ra_list_orders(rid: int = Depends(require_restaurant_id), db: Session = Depends(get_db)) -> List[dict]:
-    print(f"DEBUG: ra_list_orders called with rid={rid}")
-    orders = db.query(DBOrder).filter(DBOrder.restaurant_id == rid).all()
-    print(f"DEBUG: Found {len(orders)} orders for restaurant {rid}")
+    orders_query = db.query(DBOrder).filter(DBOrder.restaurant_id == rid)
+    orders = orders_query.all()
+    items_by_order = load_order_items(db, orders_query) if orders else {}
     
     data: List[dict] = []
     for o in orders:
-        items = db.query(DBOrderItem).filter(DBOrderItem.order_id == o.id).order_by(DBOrderItem.id.asc()).all()
-        print(f"DEBUG: Order {o.id} has {len(items)} items")
+        items = items_by_order.get(o.id, [])
         data.append({
             "id": o.id,
             "user_id": o.user_id,
@@ -70,7 +69,7 @@ async def ra_list_orders(rid: int = Depends(require_restaurant_id), db: Session
             "items": [{"name": it.name, "qty": it.qty} for it in items],
         })
     
-    print(f"DEBUG: Returning {len(data)} orders")
+    logger.debug("ra orders listed", extra={"restaurant_id": rid, "orders": len(data)})
     return data
 
 
@@ -324,6 +323,7 @@ async def ra_set_status(enabled: bool, rid: int = Depends(require_restaurant_id)
         raise HTTPException(status_code=404, detail="not_found")
     r.is_enabled = bool(enabled)
     db.commit()
+    search_index.mark_stale()
     try:
         await send_admin_message(f"[ra] Ресторан id={rid} статус={'ON' if enabled else 'OFF'}")
     except Exception:
@@ -357,6 +357,7 @@ async def ra_update_restaurant(payload: RestaurantPatch, rid: int = Depends(requ
         if hasattr(r, k):
             setattr(r, k, v)
     db.commit()
+    search_index.mark_stale()
     try:
         await send_admin_message(f"[ra] Обновлены данные ресторана id={rid}")
     except Exception:
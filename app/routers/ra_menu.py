@@ -1,24 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
 from pydantic import BaseModel
 from typing import List, Optional
 from app.routers.ra import require_restaurant_id
 from app.routers.menu import Category, Dish
-from app.routers.menu import DishOptionGroup, DishOption
+from app.routers.menu import DishOptionGroup, DishOption, menu_response
 from sqlalchemy.orm import Session
 from app.db import get_db
 from app.models import Category as OCategory, Dish as ODish, OptionGroup as OGroup, Option as OOption
+from app.services.dish_options import invalidate_dish_rules
+from app.services.menu_changes import record_menu_change
+from app.services.menu_snapshot import invalidate_menu_snapshot
+from app.services.search_index import search_index
 
 
 router = APIRouter()
 
 
 def update_dish_has_options(dish_id: int, db: Session):
-    """Обновляет флаг has_options для блюда на основе количества групп опций"""
+    """Обновляет флаг has_options для блюда на основе количества групп опций (коммитит вызывающий)"""
+    db.flush()
     groups_count = db.query(OGroup).filter(OGroup.dish_id == dish_id).count()
     dish = db.query(ODish).filter(ODish.id == dish_id).first()
     if dish:
         dish.has_options = groups_count > 0
-        db.commit()
 
 
 class CategoryCreate(BaseModel):
@@ -78,29 +82,14 @@ class OptionUpdate(BaseModel):
 
 
 @router.get("/ra/menu")
-async def ra_menu(rid: int = Depends(require_restaurant_id), db: Session = Depends(get_db)) -> dict:
-    cats = db.query(OCategory).filter(OCategory.restaurant_id == rid).order_by(OCategory.sort.asc()).all()
-    dishes = db.query(ODish).filter(ODish.restaurant_id == rid).all()
-    return {
-        "categories": [
-            {"id": c.id, "restaurant_id": c.restaurant_id, "name": c.name, "sort": c.sort}
-            for c in cats
-        ],
-        "dishes": [
-            {
-                "id": d.id,
-                "restaurant_id": d.restaurant_id,
-                "category_id": d.category_id,
-                "name": d.name,
-                "description": d.description,
-                "price": d.price,
-                "image": d.image,
-                "is_available": d.is_available,
-                "has_options": d.has_options,
-            }
-            for d in dishes
-        ],
-    }
+async def ra_menu(
+    rid: int = Depends(require_restaurant_id),
+    include: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+) -> Response:
+    # тот же снимок, что и у покупателей; правки этого RA сбрасывают его сразу
+    return menu_response(rid, if_none_match, db, include)
 
 
 @router.post("/ra/categories")
@@ -109,7 +98,9 @@ async def ra_create_category(payload: CategoryCreate, rid: int = Depends(require
     new_id = (last.id + 1) if last else 1
     cat = OCategory(id=new_id, restaurant_id=rid, name=payload.name, sort=payload.sort)
     db.add(cat)
+    record_menu_change(db, rid, upserted={"category": [new_id]})
     db.commit()
+    invalidate_menu_snapshot(rid)
     return {"id": new_id}
 
 
@@ -123,7 +114,9 @@ async def ra_update_category(category_id: int, payload: CategoryUpdate, rid: int
         c.name = data["name"]
     if "sort" in data:
         c.sort = int(data["sort"])
+    record_menu_change(db, rid, upserted={"category": [category_id]})
     db.commit()
+    invalidate_menu_snapshot(rid)
     return {"status": "ok"}
 
 
@@ -133,9 +126,15 @@ async def ra_delete_category(category_id: int, rid: int = Depends(require_restau
     if not c:
         raise HTTPException(status_code=404, detail="not_found")
     # delete dishes in category
+    dish_ids = [d_id for (d_id,) in db.query(ODish.id).filter(ODish.category_id == category_id).all()]
     db.query(ODish).filter(ODish.category_id == category_id).delete()
     db.delete(c)
+    record_menu_change(db, rid, deleted={"category": [category_id], "dish": dish_ids})
     db.commit()
+    invalidate_menu_snapshot(rid)
+    for dish_id in dish_ids:
+        invalidate_dish_rules(dish_id)
+    search_index.mark_stale()
     return {"status": "ok"}
 
 
@@ -158,7 +157,12 @@ async def ra_create_dish(payload: DishCreate, rid: int = Depends(require_restaur
         has_options=payload.has_options,
     )
     db.add(dish)
+    record_menu_change(db, rid, upserted={"dish": [new_id]})
     db.commit()
+    invalidate_menu_snapshot(rid)
+    search_index.mark_stale()
+    # id мог попасть в кэш как «блюда нет»
+    invalidate_dish_rules(new_id)
     return {"id": new_id}
 
 
@@ -178,7 +182,10 @@ async def ra_update_dish(dish_id: int, payload: DishUpdate, rid: int = Depends(r
     for k, v in data.items():
         if hasattr(d, k):
             setattr(d, k, v)
+    record_menu_change(db, rid, upserted={"dish": [dish_id]})
     db.commit()
+    invalidate_menu_snapshot(rid)
+    search_index.mark_stale()
     return {"status": "ok"}
 
 
@@ -190,11 +197,17 @@ async def ra_delete_dish(dish_id: int, rid: int = Depends(require_restaurant_id)
     # delete groups and options for dish
     groups = db.query(OGroup).filter(OGroup.dish_id == dish_id).all()
     g_ids = [g.id for g in groups]
+    o_ids = []
     if g_ids:
+        o_ids = [o_id for (o_id,) in db.query(OOption.id).filter(OOption.group_id.in_(g_ids)).all()]
         db.query(OOption).filter(OOption.group_id.in_(g_ids)).delete(synchronize_session=False)
         db.query(OGroup).filter(OGroup.id.in_(g_ids)).delete(synchronize_session=False)
     db.delete(d)
+    record_menu_change(db, rid, deleted={"dish": [dish_id], "group": g_ids, "option": o_ids})
     db.commit()
+    invalidate_dish_rules(dish_id)
+    invalidate_menu_snapshot(rid)
+    search_index.mark_stale()
     return {"status": "ok"}
 
 
@@ -209,10 +222,12 @@ async def ra_create_group(payload: GroupCreate, rid: int = Depends(require_resta
     g = OGroup(id=new_id, dish_id=payload.dish_id, name=payload.name,
                min_select=payload.min_select, max_select=payload.max_select, required=payload.required)
     db.add(g)
-    db.commit()
-    
-    # Обновляем флаг has_options для блюда
+    # Обновляем флаг has_options для блюда в той же транзакции
     update_dish_has_options(payload.dish_id, db)
+    record_menu_change(db, rid, upserted={"group": [new_id], "dish": [payload.dish_id]})
+    db.commit()
+    invalidate_dish_rules(payload.dish_id)
+    invalidate_menu_snapshot(rid)
     
     return {"id": new_id}
 
@@ -229,7 +244,10 @@ async def ra_update_group(group_id: int, payload: GroupUpdate, rid: int = Depend
     for k, v in data.items():
         if hasattr(g, k):
             setattr(g, k, v)
+    record_menu_change(db, rid, upserted={"group": [group_id]})
     db.commit()
+    invalidate_dish_rules(g.dish_id)
+    invalidate_menu_snapshot(rid)
     return {"status": "ok"}
 
 
@@ -241,12 +259,15 @@ async def ra_delete_group(group_id: int, rid: int = Depends(require_restaurant_i
     d = db.query(ODish).filter(ODish.id == g.dish_id).first()
     if not d or d.restaurant_id != rid:
         raise HTTPException(status_code=403, detail="forbidden")
+    o_ids = [o_id for (o_id,) in db.query(OOption.id).filter(OOption.group_id == group_id).all()]
     db.query(OOption).filter(OOption.group_id == group_id).delete(synchronize_session=False)
     db.delete(g)
-    db.commit()
-    
-    # Обновляем флаг has_options для блюда
+    # Обновляем флаг has_options для блюда в той же транзакции
     update_dish_has_options(g.dish_id, db)
+    record_menu_change(db, rid, upserted={"dish": [g.dish_id]}, deleted={"group": [group_id], "option": o_ids})
+    db.commit()
+    invalidate_dish_rules(g.dish_id)
+    invalidate_menu_snapshot(rid)
     
     return {"status": "ok"}
 
@@ -263,7 +284,10 @@ async def ra_create_option(payload: OptionCreate, rid: int = Depends(require_res
     new_id = (last.id + 1) if last else 1
     o = OOption(id=new_id, group_id=payload.group_id, name=payload.name, price_delta=payload.price_delta)
     db.add(o)
+    record_menu_change(db, rid, upserted={"option": [new_id]})
     db.commit()
+    invalidate_dish_rules(g.dish_id)
+    invalidate_menu_snapshot(rid)
     return {"id": new_id}
 
 
@@ -280,7 +304,10 @@ async def ra_update_option(option_id: int, payload: OptionUpdate, rid: int = Dep
     for k, v in data.items():
         if hasattr(o, k):
             setattr(o, k, v)
+    record_menu_change(db, rid, upserted={"option": [option_id]})
     db.commit()
+    invalidate_dish_rules(d.id)
+    invalidate_menu_snapshot(rid)
     return {"status": "ok"}
 
 
@@ -294,6 +321,9 @@ async def ra_delete_option(option_id: int, rid: int = Depends(require_restaurant
     if not d or d.restaurant_id != rid:
         raise HTTPException(status_code=403, detail="forbidden")
     db.delete(o)
+    record_menu_change(db, rid, deleted={"option": [option_id]})
     db.commit()
+    invalidate_dish_rules(d.id)
+    invalidate_menu_snapshot(rid)
     return {"status": "ok"}
 
@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Query
+from typing import Optional
+
+from app.services.search_index import search_index
+
+
+router = APIRouter()
+
+
+@router.get("/search")
+async def search(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=50),
+    type: Optional[str] = Query(None, pattern="^(dish|restaurant)$"),
+) -> dict:
+    """Поиск по названиям и описаниям блюд и ресторанов: слова, префиксы (автодополнение) и опечатки"""
+    hits = await search_index.search(q, limit, type)
+    return {
+        "query": q,
+        "results": [{"type": doc.kind, "score": score, **doc.payload} for score, doc in hits],
+    }
@@ -0,0 +1,100 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import List, Set, Tuple
+
+from app.logging_config import get_logger
+from app.services.telegram_transport import transport
+
+
+# Окно накопления событий журнала (0 — отправлять каждое событие сразу)
+ADMIN_DIGEST_WINDOW_SECONDS = float(os.getenv("ADMIN_DIGEST_WINDOW_SECONDS", "10"))
+ADMIN_DIGEST_MAX_EVENTS = int(os.getenv("ADMIN_DIGEST_MAX_EVENTS", "20"))
+# Лимит Telegram на длину сообщения 4096 символов, оставляем запас под заголовок
+_MAX_DIGEST_CHARS = 3800
+
+logger = get_logger("telegram.digest")
+
+
+class AdminDigest:
+    """Буфер событий админ-канала: копит события окно времени и отправляет одним сообщением"""
+
+    def __init__(self, window_seconds: float = ADMIN_DIGEST_WINDOW_SECONDS, max_events: int = ADMIN_DIGEST_MAX_EVENTS) -> None:
+        self.window_seconds = window_seconds
+        self.max_events = max(1, max_events)
+        self._events: List[Tuple[datetime, str]] = []
+        self._chars = 0
+        self._timer: asyncio.Task | None = None
+        # фоновые отправки дайджестов; ссылки держим, чтобы задачи не собрал GC
+        self._sending: Set[asyncio.Task] = set()
+        self.digests_sent = 0
+        self.events_buffered = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_seconds > 0
+
+    async def add(self, chat_id: str, text: str) -> None:
+        line_len = len(text) + 12
+        if self._events and self._chars + line_len > _MAX_DIGEST_CHARS:
+            self._flush_in_background(chat_id)
+        self._events.append((datetime.now(), text))
+        self._chars += line_len
+        self.events_buffered += 1
+        if len(self._events) >= self.max_events:
+            self._flush_in_background(chat_id)
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.get_running_loop().create_task(self._flush_later(chat_id))
+
+    async def _flush_later(self, chat_id: str) -> None:
+        await asyncio.sleep(self.window_seconds)
+        self._timer = None
+        await self.flush(chat_id)
+
+    def _flush_in_background(self, chat_id: str) -> None:
+        """Пачка забирается сразу, отправка идёт отдельной задачей: add не ждёт Telegram"""
+        events = self._take()
+        if events:
+            task = asyncio.get_running_loop().create_task(self._send(chat_id, events))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def flush(self, chat_id: str) -> None:
+        """Отправляет накопленное и дожидается фоновых отправок (в том числе при остановке)"""
+        events = self._take()
+        if events:
+            await self._send(chat_id, events)
+        pending = [t for t in self._sending if t is not asyncio.current_task()]
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def _take(self) -> List[Tuple[datetime, str]]:
+        events, self._events, self._chars = self._events, [], 0
+        if events and self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+            self._timer = None
+        return events
+
+    async def _send(self, chat_id: str, events: List[Tuple[datetime, str]]) -> None:
+        text = self._format(events)
+        try:
+            result = await transport.call("sendMessage", {"chat_id": chat_id, "text": text})
+            if not result.ok and not result.queued:
+                logger.warning("admin digest: failed: %s", result.error)
+            self.digests_sent += 1
+        except Exception as exc:
+            logger.exception("admin digest: exception: %s", repr(exc))
+
+    @staticmethod
+    def _format(events: List[Tuple[datetime, str]]) -> str:
+        if len(events) == 1:
+            return events[0][1]
+        first, last = events[0][0], events[-1][0]
+        lines = [f"🗂 Журнал: {len(events)} событий, {first:%H:%M:%S}–{last:%H:%M:%S}", ""]
+        for ts, text in events:
+            lines.append(f"[{ts:%H:%M:%S}] {text}")
+        return "\n".join(lines)
+
+
+# Глобальный буфер журнала админ-канала
+admin_digest = AdminDigest()
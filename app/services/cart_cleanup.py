@@ -0,0 +1,91 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from sqlalchemy import delete, select
+
+from app.activity import cart_activity
+from app.db import get_session
+from app.logging_config import get_logger
+from app.metrics import track_task
+from app.models import Cart as DBCart, CartItem as DBCartItem, Dish as ODish, Restaurant as ORestaurant
+from app.services.cart_refs import forget_cart
+
+
+# Корзина без изменений дольше этого срока считается брошенной и удаляется вместе с позициями
+CART_EXPIRY_DAYS = float(os.getenv("CART_EXPIRY_DAYS", "30"))
+CART_CLEANUP_INTERVAL_SECONDS = float(os.getenv("CART_CLEANUP_INTERVAL_SECONDS", "3600"))
+# Строк за одну транзакцию и максимум транзакций за проход — чтобы не держать БД долго
+CART_CLEANUP_BATCH = int(os.getenv("CART_CLEANUP_BATCH", "500"))
+CART_CLEANUP_MAX_BATCHES = int(os.getenv("CART_CLEANUP_MAX_BATCHES", "100"))
+
+logger = get_logger("cart_cleanup")
+
+
+def expire_abandoned_batch(cutoff: datetime, limit: int = CART_CLEANUP_BATCH) -> List[Tuple[int, int]]:
+    """Удаляет до limit корзин с updated_at < cutoff (по индексу ix_carts_updated_at); возвращает (cart_id, user_id)"""
+    with get_session() as db:
+        rows = db.execute(
+            select(DBCart.id, DBCart.user_id).where(DBCart.updated_at < cutoff).order_by(DBCart.updated_at).limit(limit)
+        ).all()
+        if not rows:
+            return []
+        # повторная проверка срока: корзину могли изменить между выборкой и удалением
+        still_expired = select(DBCart.id).where(DBCart.id.in_([cart_id for cart_id, _ in rows]), DBCart.updated_at < cutoff)
+        db.execute(delete(DBCartItem).where(DBCartItem.cart_id.in_(still_expired)))
+        db.execute(delete(DBCart).where(DBCart.id.in_(still_expired)))
+        db.commit()
+        return [(cart_id, user_id) for cart_id, user_id in rows]
+
+
+def delete_orphan_items_batch(limit: int = CART_CLEANUP_BATCH) -> int:
+    """Удаляет до limit позиций, чьё блюдо или ресторан больше не существует"""
+    with get_session() as db:
+        ids = db.execute(
+            select(DBCartItem.id)
+            .outerjoin(ODish, ODish.id == DBCartItem.dish_id)
+            .outerjoin(ORestaurant, ORestaurant.id == DBCartItem.restaurant_id)
+            .where((ODish.id.is_(None)) | (ORestaurant.id.is_(None)))
+            .limit(limit)
+        ).scalars().all()
+        if not ids:
+            return 0
+        db.execute(delete(DBCartItem).where(DBCartItem.id.in_(ids)))
+        db.commit()
+        return len(ids)
+
+
+async def cleanup_carts(now: datetime | None = None) -> dict:
+    """Один проход очистки; каждая пачка — отдельная короткая транзакция в потоке"""
+    # свежие изменения этого процесса должны попасть в updated_at раньше, чем по нему будем выбирать
+    await asyncio.to_thread(cart_activity.flush)
+    cutoff = (now or datetime.utcnow()) - timedelta(days=CART_EXPIRY_DAYS)
+    carts = items = 0
+    for _ in range(CART_CLEANUP_MAX_BATCHES):
+        expired = await asyncio.to_thread(expire_abandoned_batch, cutoff)
+        for _, user_id in expired:
+            forget_cart(user_id)
+        carts += len(expired)
+        if len(expired) < CART_CLEANUP_BATCH:
+            break
+        await asyncio.sleep(0)
+    for _ in range(CART_CLEANUP_MAX_BATCHES):
+        removed = await asyncio.to_thread(delete_orphan_items_batch)
+        items += removed
+        if removed < CART_CLEANUP_BATCH:
+            break
+        await asyncio.sleep(0)
+    return {"expired_carts": carts, "orphan_items": items}
+
+
+async def cart_cleanup_loop() -> None:
+    while True:
+        await asyncio.sleep(CART_CLEANUP_INTERVAL_SECONDS)
+        try:
+            with track_task("cart_cleanup"):
+                result = await cleanup_carts()
+            if result["expired_carts"] or result["orphan_items"]:
+                logger.info("cart cleanup", extra=result)
+        except Exception as exc:
+            logger.exception("cart cleanup failed: %s", repr(exc))
@@ -0,0 +1,37 @@
+import os
+from typing import Optional
+
+from app.cache import TTLCache
+
+
+# Сколько держать в памяти id корзины и набор её ресторанов
+CART_CACHE_TTL_SECONDS = float(os.getenv("CART_CACHE_TTL_SECONDS", "60"))
+
+
+class CartRef:
+    """id корзины и рестораны в ней — всё, что нужно для проверок перед изменением"""
+
+    __slots__ = ("cart_id", "cutlery_count", "restaurants")
+
+    def __init__(self, cart_id: int, cutlery_count: int, restaurants: set) -> None:
+        self.cart_id = cart_id
+        self.cutlery_count = cutlery_count
+        self.restaurants = restaurants
+
+
+# Корзины пишут роутер корзины (обновляет кэш на месте после каждой записи) и очистка брошенных (сбрасывает)
+_cart_refs: TTLCache[CartRef] = TTLCache(maxsize=50000, ttl=CART_CACHE_TTL_SECONDS)
+
+
+def cached_cart(user_id: int) -> Optional[CartRef]:
+    found, ref = _cart_refs.get(user_id)
+    return ref if found else None
+
+
+def remember_cart(user_id: int, ref: CartRef) -> None:
+    _cart_refs.set(user_id, ref)
+
+
+def forget_cart(user_id: int) -> None:
+    """Сбрасывает закэшированную корзину (например, после удаления брошенной корзины)"""
+    _cart_refs.invalidate(user_id)
@@ -0,0 +1,88 @@
+import os
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.cache import TTLCache
+from app.models import Dish as ODish, Option as OOption, OptionGroup as OGroup
+
+
+# Правила опций меняются только через ra_menu (там же сбрасываются); TTL страхует соседние воркеры
+DISH_OPTION_RULES_TTL_SECONDS = float(os.getenv("DISH_OPTION_RULES_TTL_SECONDS", "600"))
+
+
+class GroupRule(NamedTuple):
+    group_id: int
+    option_ids: frozenset
+    min_required: int
+    max_select: int
+
+
+class DishOptionRules(NamedTuple):
+    """Скомпилированные правила выбора опций блюда; неизменяемы, проверка без обращений к БД"""
+
+    dish_id: int
+    groups: Tuple[GroupRule, ...]
+
+    def check(self, chosen_options: Iterable[int]) -> Optional[dict]:
+        """None, если выбор корректен, иначе detail ошибки (первая нарушенная группа)"""
+        chosen = frozenset(chosen_options or ())
+        for g in self.groups:
+            count = len(chosen & g.option_ids)
+            if count < g.min_required:
+                return {"status": "options_required", "group_id": g.group_id}
+            if g.max_select and count > g.max_select:
+                return {"status": "options_exceeded", "group_id": g.group_id, "max": g.max_select}
+        return None
+
+
+# dish_id -> правила; None — блюда нет (кэшируется ненадолго)
+_rules_cache: TTLCache[DishOptionRules] = TTLCache(maxsize=50000, ttl=DISH_OPTION_RULES_TTL_SECONDS, negative_ttl=30.0)
+
+
+def compile_dish_rules(dish_id: int, db: Session) -> Optional[DishOptionRules]:
+    """Блюдо, его группы и опции одним запросом"""
+    rows = db.execute(
+        select(ODish.id, OGroup.id, OGroup.min_select, OGroup.max_select, OGroup.required, OOption.id)
+        .select_from(ODish)
+        .outerjoin(OGroup, OGroup.dish_id == ODish.id)
+        .outerjoin(OOption, OOption.group_id == OGroup.id)
+        .where(ODish.id == dish_id)
+        .order_by(OGroup.id, OOption.id)
+    ).all()
+    if not rows:
+        return None
+    groups: dict = {}
+    options: dict = {}
+    for _, group_id, min_select, max_select, required, option_id in rows:
+        if group_id is None:
+            continue
+        if group_id not in groups:
+            # для обязательных групп минимум 1, для необязательных — min_select
+            groups[group_id] = (max(1, min_select) if required else min_select, max_select)
+            options[group_id] = set()
+        if option_id is not None:
+            options[group_id].add(option_id)
+    return DishOptionRules(dish_id, tuple(
+        GroupRule(gid, frozenset(options[gid]), min_required, max_select)
+        for gid, (min_required, max_select) in groups.items()
+    ))
+
+
+def get_dish_rules(dish_id: int, db: Session) -> Optional[DishOptionRules]:
+    found, rules = _rules_cache.get(dish_id)
+    if found:
+        return rules
+    rules = compile_dish_rules(dish_id, db)
+    _rules_cache.set(dish_id, rules)
+    return rules
+
+
+def invalidate_dish_rules(dish_id: int) -> None:
+    _rules_cache.invalidate(dish_id)
+
+
+def options_key(chosen_options: Iterable[int] | None) -> str:
+    """Канонический ключ набора опций: уникальные id по возрастанию через запятую"""
+    return ",".join(str(o) for o in sorted(set(chosen_options or ())))
@@ -3,6 +3,8 @@ import uuid
 from PIL import Image
 from typing import Tuple, Optional
 import io
+import time
+from app.metrics import IMAGE_PROCESSING
 
 
 class ImageProcessor:
@@ -30,6 +32,7 @@ class ImageProcessor:
         Returns:
             dict: Словарь с URL'ами для разных размеров
         """
+        started = time.perf_counter()
         try:
             # Открываем изображение
             image = Image.open(io.BytesIO(image_data))
@@ -100,6 +103,7 @@ class ImageProcessor:
             
             urls['original'] = f"/uploads/original/{original_filename}"
             
+            IMAGE_PROCESSING.labels("ok").observe(time.perf_counter() - started)
             return {
                 "status": "ok",
                 "urls": urls,
@@ -108,6 +112,7 @@ class ImageProcessor:
             }
             
         except Exception as e:
+            IMAGE_PROCESSING.labels("error").observe(time.perf_counter() - started)
             raise Exception(f"Ошибка при обработке изображения: {str(e)}")
     
     @staticmethod
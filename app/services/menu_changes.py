@@ -0,0 +1,132 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from app.db import get_session
+from app.logging_config import get_logger
+from app.metrics import track_task
+from app.models import (
+    Category as OCategory, Dish as ODish, MenuChange, Option as OOption, OptionGroup as OGroup, Restaurant as ORestaurant,
+)
+from app.services.menu_snapshot import category_dict, dish_dict, group_dict, option_dict, read_menu_version
+
+
+# Сколько хранится журнал правок; клиент с более старой версией получает полный снимок
+MENU_CHANGELOG_RETENTION_DAYS = float(os.getenv("MENU_CHANGELOG_RETENTION_DAYS", "7"))
+MENU_CHANGELOG_CLEANUP_INTERVAL_SECONDS = float(os.getenv("MENU_CHANGELOG_CLEANUP_INTERVAL_SECONDS", "3600"))
+# Ресторанов за одну транзакцию очистки
+MENU_CHANGELOG_CLEANUP_BATCH = int(os.getenv("MENU_CHANGELOG_CLEANUP_BATCH", "200"))
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+# сущность журнала -> (ключ в ответе, модель, сериализация)
+_ENTITIES = {
+    "category": ("categories", OCategory, category_dict),
+    "dish": ("dishes", ODish, dish_dict),
+    "group": ("groups", OGroup, group_dict),
+    "option": ("options", OOption, option_dict),
+}
+
+logger = get_logger("menu_changes")
+
+
+def record_menu_change(
+    db: Session,
+    restaurant_id: int,
+    upserted: Optional[Dict[str, Iterable[int]]] = None,
+    deleted: Optional[Dict[str, Iterable[int]]] = None,
+) -> int:
+    """Поднимает версию меню и пишет затронутые сущности в журнал; вызывать до commit той же транзакции"""
+    # атомарный инкремент: параллельные правки одного ресторана получают разные версии
+    version = db.execute(
+        update(ORestaurant)
+        .where(ORestaurant.id == restaurant_id)
+        .values(menu_version=func.coalesce(ORestaurant.menu_version, 0) + 1)
+        .returning(ORestaurant.menu_version)
+    ).scalar_one()
+    now = datetime.utcnow()
+    for op, changes in ((UPSERT, upserted), (DELETE, deleted)):
+        for entity, ids in (changes or {}).items():
+            db.add_all([
+                MenuChange(restaurant_id=restaurant_id, version=version, entity=entity, entity_id=entity_id, op=op, created_at=now)
+                for entity_id in ids
+            ])
+    return version
+
+
+def menu_changes_since(restaurant_id: int, since: int, db: Session) -> Optional[dict]:
+    """Сущности, созданные/изменённые/удалённые после версии since; None — журнала не хватает, нужен полный снимок"""
+    version = read_menu_version(restaurant_id, db) or 0
+    result: dict = {"version": version, "full": False}
+    for key, _, _ in _ENTITIES.values():
+        result[key] = []
+    result["deleted"] = {key: [] for key, _, _ in _ENTITIES.values()}
+    if since == version:
+        return result
+    if since < 0 or since > version:
+        return None
+    rows = db.execute(
+        select(MenuChange.version, MenuChange.entity, MenuChange.entity_id, MenuChange.op)
+        .where(MenuChange.restaurant_id == restaurant_id, MenuChange.version > since)
+        .order_by(MenuChange.id)
+    ).all()
+    # версии идут подряд, у каждой есть строки; пропуск после since — журнал уже подчищен
+    if not rows or min(r.version for r in rows) > since + 1:
+        return None
+    final: Dict[tuple, str] = {}
+    for r in rows:
+        final[(r.entity, r.entity_id)] = r.op
+    for entity, (key, model, to_dict) in _ENTITIES.items():
+        ids = [entity_id for (e, entity_id), op in final.items() if e == entity and op == UPSERT]
+        found = {obj.id: obj for obj in db.query(model).filter(model.id.in_(ids)).all()} if ids else {}
+        result[key] = [to_dict(found[i]) for i in sorted(found)]
+        # изменённое и затем удалённое без записи в журнал (например, сиротские опции) — тоже удаление
+        result["deleted"][key] = sorted(
+            [entity_id for (e, entity_id), op in final.items() if e == entity and op == DELETE]
+            + [i for i in ids if i not in found]
+        )
+    result["categories"].sort(key=lambda c: c["sort"])
+    return result
+
+
+def prune_menu_changes_batch(cutoff: datetime, limit: int = MENU_CHANGELOG_CLEANUP_BATCH) -> int:
+    """Удаляет строки журнала старше cutoff у до limit ресторанов; версии удаляются целиком, без дыр"""
+    with get_session() as db:
+        rows = db.execute(
+            select(MenuChange.restaurant_id, func.max(MenuChange.version))
+            .where(MenuChange.created_at < cutoff)
+            .group_by(MenuChange.restaurant_id)
+            .limit(limit)
+        ).all()
+        for restaurant_id, version in rows:
+            db.execute(delete(MenuChange).where(MenuChange.restaurant_id == restaurant_id, MenuChange.version <= version))
+        db.commit()
+        return len(rows)
+
+
+async def prune_menu_changes(now: datetime | None = None) -> int:
+    cutoff = (now or datetime.utcnow()) - timedelta(days=MENU_CHANGELOG_RETENTION_DAYS)
+    total = 0
+    while True:
+        pruned = await asyncio.to_thread(prune_menu_changes_batch, cutoff)
+        total += pruned
+        if pruned < MENU_CHANGELOG_CLEANUP_BATCH:
+            return total
+        await asyncio.sleep(0)
+
+
+async def menu_changelog_cleanup_loop() -> None:
+    while True:
+        await asyncio.sleep(MENU_CHANGELOG_CLEANUP_INTERVAL_SECONDS)
+        try:
+            with track_task("menu_changelog_cleanup"):
+                pruned = await prune_menu_changes()
+            if pruned:
+                logger.info("menu changelog pruned", extra={"restaurants": pruned})
+        except Exception as exc:
+            logger.exception("menu changelog cleanup failed: %s", repr(exc))
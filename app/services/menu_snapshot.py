@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, NamedTuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.cache import TTLCache
+from app.models import Category as OCategory, Dish as ODish, Option as OOption, OptionGroup as OGroup, Restaurant as ORestaurant
+
+
+# Меню меняется только через ra_menu (там же сбрасывается снимок); TTL страхует соседние воркеры
+MENU_SNAPSHOT_TTL_SECONDS = float(os.getenv("MENU_SNAPSHOT_TTL_SECONDS", "60"))
+
+
+class MenuSnapshot(NamedTuple):
+    """Готовое к отдаче меню ресторана: версия, сериализованное тело и его ETag"""
+
+    version: int
+    body: bytes
+    etag: str
+
+
+# restaurant_id -> счётчик сбросов в этом процессе; снимок, собранный во время правки, не кэшируется
+_generations: Dict[int, int] = {}
+_generations_lock = threading.Lock()
+# (restaurant_id, с опциями) -> снимок
+_snapshots: TTLCache[MenuSnapshot] = TTLCache(maxsize=10000, ttl=MENU_SNAPSHOT_TTL_SECONDS)
+
+
+def invalidate_menu_snapshot(restaurant_id: int) -> None:
+    """Вызывается после коммита любой правки меню ресторана"""
+    with _generations_lock:
+        _generations[restaurant_id] = _generations.get(restaurant_id, 0) + 1
+    _snapshots.invalidate((restaurant_id, False))
+    _snapshots.invalidate((restaurant_id, True))
+
+
+def serialize_menu(payload: dict) -> bytes:
+    # так же, как JSONResponse FastAPI: клиенты получают те же байты, что и раньше
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def menu_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+
+def category_dict(c: OCategory) -> dict:
+    return {"id": c.id, "restaurant_id": c.restaurant_id, "name": c.name, "sort": c.sort}
+
+
+def dish_dict(d: ODish) -> dict:
+    return {
+        "id": d.id,
+        "restaurant_id": d.restaurant_id,
+        "category_id": d.category_id,
+        "name": d.name,
+        "description": d.description,
+        "price": d.price,
+        "image": d.image,
+        "is_available": d.is_available,
+        "has_options": d.has_options,
+    }
+
+
+def group_dict(g: OGroup) -> dict:
+    return {"id": g.id, "dish_id": g.dish_id, "name": g.name, "min_select": g.min_select, "max_select": g.max_select, "required": g.required}
+
+
+def option_dict(o: OOption) -> dict:
+    return {"id": o.id, "group_id": o.group_id, "name": o.name, "price_delta": o.price_delta}
+
+
+def read_menu_version(restaurant_id: int, db: Session) -> int | None:
+    """Текущая версия меню из БД; None — ресторана нет"""
+    return db.execute(select(ORestaurant.menu_version).where(ORestaurant.id == restaurant_id)).scalar_one_or_none()
+
+
+def build_menu_payload(restaurant_id: int, db: Session, include_options: bool = False) -> dict:
+    # версия — тем же запросом, что и категории, и до блюд: данные не старше её, а повтор уже применённой дельты безвреден
+    rows = db.execute(
+        select(ORestaurant.menu_version, OCategory)
+        .select_from(ORestaurant)
+        .outerjoin(OCategory, OCategory.restaurant_id == ORestaurant.id)
+        .where(ORestaurant.id == restaurant_id)
+        .order_by(OCategory.sort.asc())
+    ).all()
+    version = (rows[0][0] or 0) if rows else 0
+    cats = [c for _, c in rows if c is not None]
+    dishes = db.query(ODish).filter(ODish.restaurant_id == restaurant_id).all()
+    payload = {
+        "version": version,
+        "categories": [category_dict(c) for c in cats],
+        "dishes": [dish_dict(d) for d in dishes],
+    }
+    if include_options:
+        payload.update(build_options_payload(restaurant_id, db))
+    return payload
+
+
+def build_options_payload(restaurant_id: int, db: Session) -> dict:
+    """Группы и опции всех блюд ресторана — по одному запросу, в форме /dishes/{id}/options"""
+    groups = (
+        db.query(OGroup)
+        .join(ODish, ODish.id == OGroup.dish_id)
+        .filter(ODish.restaurant_id == restaurant_id)
+        .order_by(OGroup.id)
+        .all()
+    )
+    options = (
+        db.query(OOption)
+        .join(OGroup, OGroup.id == OOption.group_id)
+        .join(ODish, ODish.id == OGroup.dish_id)
+        .filter(ODish.restaurant_id == restaurant_id)
+        .order_by(OOption.id)
+        .all()
+    )
+    return {
+        "groups": [group_dict(g) for g in groups],
+        "options": [option_dict(o) for o in options],
+    }
+
+
+def get_menu_snapshot(restaurant_id: int, db: Session, include_options: bool = False) -> MenuSnapshot:
+    """Снимок из кэша; при промахе собирается из БД и кэшируется, если меню не правили во время сборки"""
+    key = (restaurant_id, include_options)
+    found, snapshot = _snapshots.get(key)
+    if found and snapshot is not None:
+        return snapshot
+    with _generations_lock:
+        generation = _generations.get(restaurant_id, 0)
+    payload = build_menu_payload(restaurant_id, db, include_options)
+    body = serialize_menu(payload)
+    snapshot = MenuSnapshot(payload["version"], body, menu_etag(body))
+    with _generations_lock:
+        if _generations.get(restaurant_id, 0) == generation:
+            _snapshots.set(key, snapshot)
+    return snapshot
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # браузеры и прокси могут ослабить тег до W/"..."
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
@@ -0,0 +1,337 @@
+import asyncio
+import bisect
+import heapq
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.db import get_session
+from app.logging_config import get_logger
+from app.models import Dish as ODish, Restaurant as ORestaurant
+
+
+# Индекс пересобирается целиком: после правок (mark_stale) и не реже, чем раз в TTL; поиск всё это время отвечает по старому
+SEARCH_INDEX_TTL_SECONDS = float(os.getenv("SEARCH_INDEX_TTL_SECONDS", "300"))
+# Порог триграммного сходства слова запроса и слова индекса (как pg_trgm.similarity_threshold)
+SEARCH_FUZZY_THRESHOLD = float(os.getenv("SEARCH_FUZZY_THRESHOLD", "0.3"))
+
+# Вес совпадения: точное слово, продолжение префикса, нечёткое (умножается на сходство)
+_EXACT, _PREFIX, _FUZZY = 1.0, 0.8, 0.6
+# Вес поля документа: название важнее описания
+_NAME, _DESCRIPTION = 2.0, 1.0
+# Недоступное блюдо остаётся в выдаче, но ниже доступных
+_UNAVAILABLE_FACTOR = 0.3
+# Ограничения на разворот одного слова запроса, чтобы «а» не обходило весь словарь
+_MAX_PREFIX_TERMS = 300
+_MAX_FUZZY_TERMS = 50
+_MAX_QUERY_TOKENS = 8
+# Сочетаний уровней вклада слов, после которых многословный запрос досчитывается по документам
+_MAX_TIER_COMBINATIONS = 200
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+logger = get_logger("search")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Слова в нижнем регистре; ё приравнена к е"""
+    return _WORD_RE.findall((text or "").lower().replace("ё", "е"))
+
+
+def trigrams(term: str) -> Set[str]:
+    # как в pg_trgm: два пробела в начале и один в конце, чтобы начало слова весило больше
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchDoc(NamedTuple):
+    kind: str  # "dish" или "restaurant"
+    available: bool
+    payload: dict
+
+
+class _IndexData(NamedTuple):
+    docs: List[SearchDoc]  # по возрастанию длины названия: меньший id выигрывает при равном счёте
+    vocab: List[str]  # отсортирован — префиксы ищутся bisect'ом
+    name_postings: List[List[int]]  # term_id -> документы со словом в названии, по возрастанию id
+    description_postings: List[List[int]]  # term_id -> документы со словом только в описании
+    term_trigrams: List[int]  # term_id -> число триграмм
+    trigram_terms: Dict[str, List[int]]  # триграмма -> term_id
+    unavailable: frozenset
+    restaurants: frozenset
+
+
+def load_documents(db: Session) -> List[Tuple[SearchDoc, str, str]]:
+    """Включённые рестораны и их блюда — двумя запросами: (документ, название, описание)"""
+    restaurants = db.execute(
+        select(ORestaurant.id, ORestaurant.name, ORestaurant.description, ORestaurant.image)
+        .where(ORestaurant.is_enabled == True)  # noqa: E712
+    ).all()
+    names = {r.id: r.name for r in restaurants}
+    dishes = db.execute(
+        select(ODish.id, ODish.restaurant_id, ODish.name, ODish.description, ODish.price, ODish.image, ODish.is_available)
+        .join(ORestaurant, ORestaurant.id == ODish.restaurant_id)
+        .where(ORestaurant.is_enabled == True)  # noqa: E712
+    ).all()
+    docs = [
+        (SearchDoc("restaurant", True, {"id": r.id, "name": r.name, "image": r.image}), r.name, r.description)
+        for r in restaurants
+    ]
+    docs += [
+        (SearchDoc("dish", bool(d.is_available), {
+            "id": d.id, "restaurant_id": d.restaurant_id, "restaurant_name": names.get(d.restaurant_id, ""),
+            "name": d.name, "price": d.price, "image": d.image, "is_available": bool(d.is_available),
+        }), d.name, d.description)
+        for d in dishes
+    ]
+    return docs
+
+
+def build_index(documents: List[Tuple[SearchDoc, str, str]]) -> _IndexData:
+    tokenized = [(doc, tokenize(name), tokenize(description), name) for doc, name, description in documents]
+    tokenized.sort(key=lambda d: (len(d[1]), len(d[3])))
+    vocab = sorted({term for _, name, description, _ in tokenized for term in (*name, *description)})
+    term_ids = {term: i for i, term in enumerate(vocab)}
+    name_postings: List[List[int]] = [[] for _ in vocab]
+    description_postings: List[List[int]] = [[] for _ in vocab]
+    for doc_id, (_, name, description, _) in enumerate(tokenized):
+        name_terms = set(name)
+        for term in name_terms:
+            name_postings[term_ids[term]].append(doc_id)
+        for term in set(description) - name_terms:
+            description_postings[term_ids[term]].append(doc_id)
+    trigram_terms: Dict[str, List[int]] = {}
+    term_trigrams = []
+    for term_id, term in enumerate(vocab):
+        grams = trigrams(term)
+        term_trigrams.append(len(grams))
+        for gram in grams:
+            trigram_terms.setdefault(gram, []).append(term_id)
+    docs = [doc for doc, _, _, _ in tokenized]
+    return _IndexData(
+        docs, vocab, name_postings, description_postings, term_trigrams, trigram_terms,
+        frozenset(i for i, doc in enumerate(docs) if not doc.available),
+        frozenset(i for i, doc in enumerate(docs) if doc.kind == "restaurant"),
+    )
+
+
+def _expand(index: _IndexData, token: str) -> Dict[int, float]:
+    """Слова индекса, подходящие под слово запроса: точно, как продолжение (автодополнение) или нечётко"""
+    matches: Dict[int, float] = {}
+    lo = bisect.bisect_left(index.vocab, token)
+    for term_id in range(lo, min(lo + _MAX_PREFIX_TERMS, len(index.vocab))):
+        term = index.vocab[term_id]
+        if not term.startswith(token):
+            break
+        matches[term_id] = _EXACT if term == token else _PREFIX
+    if len(token) < 3:
+        return matches
+    grams = trigrams(token)
+    shared: Counter = Counter()
+    for gram in grams:
+        shared.update(index.trigram_terms.get(gram, ()))
+    fuzzy = []
+    for term_id, common in shared.items():
+        if term_id in matches:
+            continue
+        similarity = common / (len(grams) + index.term_trigrams[term_id] - common)
+        if similarity >= SEARCH_FUZZY_THRESHOLD:
+            fuzzy.append((similarity, term_id))
+    for similarity, term_id in heapq.nlargest(_MAX_FUZZY_TERMS, fuzzy):
+        matches[term_id] = _FUZZY * similarity
+    return matches
+
+
+def _score_groups(index: _IndexData, matches: Dict[int, float]) -> List[Tuple[float, List[List[int]]]]:
+    """Вклад слова запроса в счёт документа: значение -> списки документов, по убыванию значения"""
+    groups: Dict[float, List[List[int]]] = {}
+    for term_id, weight in matches.items():
+        for field_weight, postings in ((_NAME, index.name_postings), (_DESCRIPTION, index.description_postings)):
+            if postings[term_id]:
+                groups.setdefault(round(weight * field_weight, 4), []).append(postings[term_id])
+    return sorted(groups.items(), reverse=True)
+
+
+def _kind_filter(index: _IndexData, kind: Optional[str], doc_id: int) -> bool:
+    return kind is None or (doc_id in index.restaurants) == (kind == "restaurant")
+
+
+def _top_single(index: _IndexData, groups, limit: int, kind: Optional[str]) -> List[Tuple[float, int]]:
+    """Одно слово (автодополнение): идём от больших вкладов к меньшим и останавливаемся, как только top-k не может измениться"""
+    heap: List[Tuple[float, int]] = []  # (счёт, -doc_id), минимальный — худший из найденных
+    seen: Set[int] = set()
+    for value, lists in groups:
+        if len(heap) >= limit and (value, 0) <= heap[0]:
+            break
+        for doc_id in heapq.merge(*lists):
+            if len(heap) >= limit and (value, -doc_id) <= heap[0]:
+                # дальше в группе документы с тем же вкладом и большим id — они проигрывают
+                break
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+            if not _kind_filter(index, kind, doc_id):
+                continue
+            key = (round(value * _UNAVAILABLE_FACTOR, 4) if doc_id in index.unavailable else value, -doc_id)
+            if len(heap) < limit:
+                heapq.heappush(heap, key)
+            elif key > heap[0]:
+                heapq.heapreplace(heap, key)
+    return sorted(heap, reverse=True)
+
+
+def _top_multi_exhaustive(index: _IndexData, per_token, limit: int, kind: Optional[str]) -> List[Tuple[float, int]]:
+    """Счёт каждого документа из пересечения: лучший вклад каждого слова (dict.fromkeys, от меньших к большим) и сумма"""
+    contributions = []
+    for groups in per_token:
+        best: Dict[int, float] = {}
+        for value, lists in reversed(groups):
+            for postings in lists:
+                best.update(dict.fromkeys(postings, value))
+        contributions.append(best)
+    contributions.sort(key=len)
+    candidates = set(contributions[0])
+    for best in contributions[1:]:
+        candidates.intersection_update(best.keys())
+    candidates = _filter_kind(index, candidates, kind)
+    ranked = []
+    for doc_id in candidates:
+        score = sum(best[doc_id] for best in contributions)
+        if doc_id in index.unavailable:
+            score *= _UNAVAILABLE_FACTOR
+        ranked.append((round(score, 4), -doc_id))
+    return heapq.nlargest(limit, ranked)
+
+
+def _filter_kind(index: _IndexData, docs: Set[int], kind: Optional[str]) -> Set[int]:
+    if kind == "restaurant":
+        return docs & index.restaurants
+    if kind == "dish":
+        return docs - index.restaurants
+    return docs
+
+
+def _top_multi(index: _IndexData, per_token, limit: int, kind: Optional[str]) -> List[Tuple[float, int]]:
+    """Несколько слов: сочетания уровней вклада слов перебираются по убыванию суммы, документы — пересечением множеств"""
+    tiers = []
+    for groups in per_token:
+        # у каждого документа — только лучший вклад слова: уровни не пересекаются
+        assigned: Set[int] = set()
+        token_tiers = []
+        for value, lists in groups:
+            docs = set().union(*lists) - assigned
+            if docs:
+                assigned |= docs
+                token_tiers.append((value, docs))
+        tiers.append(token_tiers)
+    heap: List[Tuple[float, int]] = []
+    start = (0,) * len(tiers)
+    frontier = [(-sum(t[0][0] for t in tiers), start)]
+    visited = {start}
+    for _ in range(_MAX_TIER_COMBINATIONS):
+        if not frontier:
+            return sorted(heap, reverse=True)
+        neg_total, combo = heapq.heappop(frontier)
+        total = round(-neg_total, 4)
+        if len(heap) >= limit and (total, 0) <= heap[0]:
+            return sorted(heap, reverse=True)
+        sets = sorted((tiers[i][level][1] for i, level in enumerate(combo)), key=len)
+        docs = _filter_kind(index, sets[0].intersection(*sets[1:]), kind)
+        for doc_id in sorted(docs):
+            if doc_id in index.unavailable:
+                key = (round(total * _UNAVAILABLE_FACTOR, 4), -doc_id)
+            else:
+                key = (total, -doc_id)
+                if len(heap) >= limit and key <= heap[0]:
+                    continue
+            if len(heap) < limit:
+                heapq.heappush(heap, key)
+            elif key > heap[0]:
+                heapq.heapreplace(heap, key)
+        for i, level in enumerate(combo):
+            if level + 1 < len(tiers[i]):
+                nxt = combo[:i] + (level + 1,) + combo[i + 1:]
+                if nxt not in visited:
+                    visited.add(nxt)
+                    heapq.heappush(frontier, (neg_total + tiers[i][level][0] - tiers[i][level + 1][0], nxt))
+    # много мелких уровней (опечатки в каждом слове) — дешевле досчитать честно
+    return _top_multi_exhaustive(index, per_token, limit, kind)
+
+
+def search(index: _IndexData, query: str, limit: int = 20, kind: Optional[str] = None) -> List[Tuple[float, SearchDoc]]:
+    """Документы, где нашлось каждое слово запроса; счёт — сумма лучших совпадений слов с учётом поля и доступности"""
+    tokens = list(dict.fromkeys(tokenize(query)))[:_MAX_QUERY_TOKENS]
+    if not tokens:
+        return []
+    per_token = []
+    for token in tokens:
+        groups = _score_groups(index, _expand(index, token))
+        if not groups:
+            return []
+        per_token.append(groups)
+    if len(per_token) == 1:
+        top = _top_single(index, per_token[0], limit, kind)
+    else:
+        top = _top_multi(index, per_token, limit, kind)
+    # при равном счёте выше документ с более коротким названием: «Пицца» раньше «Пицца с ананасами»
+    return [(score, index.docs[-neg_id]) for score, neg_id in top]
+
+
+class SearchIndex:
+    """Индекс в памяти процесса; сборка — в потоке, поиск по готовому индексу без обращений к БД"""
+
+    def __init__(self) -> None:
+        self._data: Optional[_IndexData] = None
+        self._built_at = 0.0
+        self._stale = True
+        self._build_lock = threading.Lock()
+        self._rebuild_task: Optional[asyncio.Task] = None
+
+    def mark_stale(self) -> None:
+        self._stale = True
+
+    def rebuild(self, only_if_missing: bool = False) -> None:
+        with self._build_lock:
+            # одновременные первые запросы ждут одну сборку, а не делают каждый свою
+            if only_if_missing and self._data is not None:
+                return
+            self._stale = False
+            started = time.perf_counter()
+            try:
+                with get_session() as db:
+                    documents = load_documents(db)
+                self._data = build_index(documents)
+            except Exception:
+                self._stale = True
+                raise
+            self._built_at = time.monotonic()
+            logger.info("search index rebuilt", extra={"docs": len(documents), "terms": len(self._data.vocab),
+                                                       "duration_ms": round((time.perf_counter() - started) * 1000, 1)})
+
+    async def _rebuild_in_background(self) -> None:
+        try:
+            await asyncio.to_thread(self.rebuild)
+        except Exception as exc:
+            logger.exception("search index rebuild failed: %s", repr(exc))
+
+    async def ensure_ready(self) -> _IndexData:
+        """Первая сборка ждёт; устаревший индекс отдаётся сразу, а новый собирается в фоне"""
+        if self._data is None:
+            await asyncio.to_thread(self.rebuild, True)
+        elif (self._stale or time.monotonic() - self._built_at > SEARCH_INDEX_TTL_SECONDS) and (
+            self._rebuild_task is None or self._rebuild_task.done()
+        ):
+            self._rebuild_task = asyncio.create_task(self._rebuild_in_background())
+        return self._data
+
+    async def search(self, query: str, limit: int = 20, kind: Optional[str] = None) -> List[Tuple[float, SearchDoc]]:
+        return search(await self.ensure_ready(), query, limit, kind)
+
+
+search_index = SearchIndex()
@@ -1,8 +1,13 @@
+import asyncio
 import os
-import httpx
+from typing import Any, Coroutine, Set
 from dotenv import load_dotenv
 from app.logging_config import get_logger
+from app.services.telegram_transport import transport, TELEGRAM_API_BASE
+from app.services.admin_digest import admin_digest
 from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 
 
 load_dotenv()
@@ -12,83 +17,106 @@ BOT_TOKEN = os.getenv("BOT_TOKEN", "")
 ADMIN_CHANNEL_ID = os.getenv("ADMIN_CHANNEL_ID", "")
 WEBAPP_URL = os.getenv("WEBAPP_URL", "")
 SUPPORT_TG_URL = os.getenv("SUPPORT_TG_URL", "https://t.me/support")
+# Сколько уведомлений админам ресторанов отправляется одновременно
+ADMIN_NOTIFY_CONCURRENCY = int(os.getenv("ADMIN_NOTIFY_CONCURRENCY", "10"))
 logger = get_logger("telegram")
 
 # Создаем объект бота для рассылки
-bot = Bot(BOT_TOKEN) if BOT_TOKEN else None
+bot = Bot(BOT_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_BASE))) if BOT_TOKEN else None
 
+_ADMIN_NOTIFY_SEM: asyncio.Semaphore | None = None
+# Фоновые уведомления; ссылки держим, чтобы задачи не собрал GC
+_NOTIFY_TASKS: Set[asyncio.Task] = set()
+# Сколько при остановке ждать недоставленные фоновые уведомления
+NOTIFY_SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("NOTIFY_SHUTDOWN_TIMEOUT_SECONDS", "5"))
 
-async def send_admin_message(text: str) -> None:
+
+def notify_in_background(coro: Coroutine[Any, Any, None]) -> None:
+    """Запускает уведомление отдельной задачей: ожидание лимитов Telegram не держит HTTP-запрос"""
+    task = asyncio.get_running_loop().create_task(coro)
+    _NOTIFY_TASKS.add(task)
+    task.add_done_callback(_NOTIFY_TASKS.discard)
+
+
+async def flush_admin_messages() -> None:
+    """Дожидается фоновых уведомлений и досылает накопленный дайджест журнала (вызывается при остановке)"""
+    if _NOTIFY_TASKS:
+        await asyncio.wait(set(_NOTIFY_TASKS), timeout=NOTIFY_SHUTDOWN_TIMEOUT_SECONDS)
+    if BOT_TOKEN and ADMIN_CHANNEL_ID:
+        await admin_digest.flush(ADMIN_CHANNEL_ID)
+
+
+async def send_admin_message(text: str, urgent: bool = False) -> None:
+    """Пишет в журнал админ-канала; обычные события уходят дайджестом, urgent — сразу"""
     if not BOT_TOKEN or not ADMIN_CHANNEL_ID:
         logger.warning("admin_message: missing token or channel")
         return
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-    payload = {"chat_id": ADMIN_CHANNEL_ID, "text": text}
-    async with httpx.AsyncClient(timeout=10) as client:
+    if not urgent and admin_digest.enabled:
         try:
-            await client.post(url, json=payload)
+            await admin_digest.add(ADMIN_CHANNEL_ID, text)
         except Exception as exc:
-            logger.exception("admin_message: exception: %s", repr(exc))
-            return
+            logger.exception("admin_message: digest exception: %s", repr(exc))
+        return
+    payload = {"chat_id": ADMIN_CHANNEL_ID, "text": text}
+    try:
+        result = await transport.call("sendMessage", payload)
+        if not result.ok and not result.queued:
+            logger.warning("admin_message: failed: %s", result.error)
+    except Exception as exc:
+        logger.exception("admin_message: exception: %s", repr(exc))
+        return
 
 
 async def send_user_message(chat_id: int, text: str, button_text: str | None = None, button_url: str | None = None) -> bool:
     if not BOT_TOKEN or not chat_id:
         logger.warning("user_message: missing token or chat_id")
         return False
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
     payload: dict = {"chat_id": chat_id, "text": text}
     if button_text and button_url:
         payload["reply_markup"] = {
             "inline_keyboard": [[{"text": button_text, "web_app": {"url": button_url}}]]
         }
-    async with httpx.AsyncClient(timeout=10) as client:
-        try:
-            resp = await client.post(url, json=payload)
-            ok = 200 <= resp.status_code < 300
-            if not ok:
-                logger.error(
-                    "user_message: non-200 response", extra={
-                        "status": resp.status_code, "body": resp.text, "chat_id": chat_id, "url": button_url
-                    }
-                )
-            return ok
-        except Exception as exc:
-            logger.exception("user_message: exception: %s", repr(exc))
-            return False
+    try:
+        result = await transport.call("sendMessage", payload)
+        if not result.ok and not result.queued:
+            logger.error(
+                "user_message: non-200 response", extra={
+                    "status": result.status_code, "body": result.error, "chat_id": chat_id, "url": button_url
+                }
+            )
+        return result.ok
+    except Exception as exc:
+        logger.exception("user_message: exception: %s", repr(exc))
+        return False
 
 
 async def notify_user_order_modified(chat_id: int, url: str, text: str | None = None) -> None:
     if not BOT_TOKEN or not chat_id:
         return
-    api = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
     payload = {
         "chat_id": chat_id,
         "text": text or "Заказ изменён рестораном. Нажмите, чтобы открыть текущий заказ.",
         "reply_markup": {"inline_keyboard": [[{"text": "Открыть текущий заказ", "web_app": {"url": url}}]]},
     }
-    async with httpx.AsyncClient(timeout=10) as client:
-        try:
-            await client.post(api, json=payload)
-        except Exception:
-            return
+    try:
+        await transport.call("sendMessage", payload)
+    except Exception:
+        return
 
 
 async def notify_user_order_accepted(chat_id: int, url: str, restaurant_name: str, eta_minutes: int) -> None:
     if not BOT_TOKEN or not chat_id:
         return
-    api = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
     text = f"Ресторан \"{restaurant_name}\" принял Ваш заказ.  Время доставки - {eta_minutes} мин."
     payload = {
         "chat_id": chat_id,
         "text": text,
         "reply_markup": {"inline_keyboard": [[{"text": "Открыть текущий заказ", "web_app": {"url": url}}]]},
     }
-    async with httpx.AsyncClient(timeout=10) as client:
-        try:
-            await client.post(api, json=payload)
-        except Exception:
-            return
+    try:
+        await transport.call("sendMessage", payload)
+    except Exception:
+        return
 
 
 async def notify_user_order_delivered(chat_id: int, order_id: int, restaurant_name: str) -> None:
@@ -98,7 +126,6 @@ async def notify_user_order_delivered(chat_id: int, order_id: int, restaurant_na
     
     review_url = f"{WEBAPP_URL}/static/order.html?order_id={order_id}&show_review=1"
     
-    api = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
     text = f"🎉 Ваш заказ из ресторана \"{restaurant_name}\" доставлен!\n\nПожалуйста, оцените качество обслуживания и оставьте отзыв о ресторане."
     payload = {
         "chat_id": chat_id,
@@ -109,12 +136,33 @@ async def notify_user_order_delivered(chat_id: int, order_id: int, restaurant_na
             ]]
         },
     }
-    async with httpx.AsyncClient(timeout=10) as client:
+    try:
+        await transport.call("sendMessage", payload)
+    except Exception as exc:
+        logger.exception("notify_user_order_delivered: exception: %s", repr(exc))
+        return
+
+
+def _admin_notify_semaphore() -> asyncio.Semaphore:
+    global _ADMIN_NOTIFY_SEM
+    if _ADMIN_NOTIFY_SEM is None:
+        _ADMIN_NOTIFY_SEM = asyncio.Semaphore(ADMIN_NOTIFY_CONCURRENCY)
+    return _ADMIN_NOTIFY_SEM
+
+
+async def _send_to_restaurant_admin(payload: dict, restaurant_id: int) -> bool:
+    chat_id = payload["chat_id"]
+    async with _admin_notify_semaphore():
         try:
-            await client.post(api, json=payload)
+            result = await transport.call("sendMessage", payload)
         except Exception as exc:
-            logger.exception("notify_user_order_delivered: exception: %s", repr(exc))
-            return
+            logger.exception(f"Error sending notification to admin {chat_id}: {exc}")
+            return False
+    if result.ok:
+        logger.info(f"Notification sent to restaurant admin {chat_id} for restaurant {restaurant_id}")
+        return True
+    logger.warning(f"Failed to send notification to admin {chat_id}: {result.status_code} {result.error}")
+    return False
 
 
 async def notify_restaurant_admins(restaurant_id: int, message: str, button_text: str | None = None, button_url: str | None = None) -> None:
@@ -122,103 +170,74 @@ async def notify_restaurant_admins(restaurant_id: int, message: str, button_text
     if not BOT_TOKEN:
         return
     
-    # Получаем список админов ресторана из базы данных
-    from app.db import get_session
-    from app.models import RestaurantAdmin
+    from app.store import peek_restaurant_admin_ids, get_restaurant_admin_ids
     
     try:
-        db = get_session()
-        admin_rows = db.query(RestaurantAdmin).filter(RestaurantAdmin.restaurant_id == restaurant_id).all()
+        # Состав админов берём из кэша; на промахе читаем БД вне event loop
+        admin_ids = peek_restaurant_admin_ids(restaurant_id)
+        if admin_ids is None:
+            admin_ids = await asyncio.to_thread(get_restaurant_admin_ids, restaurant_id)
         
-        if not admin_rows:
+        if not admin_ids:
             logger.warning(f"No restaurant admins found for restaurant_id={restaurant_id}")
             return
         
-        api = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-        
-        for admin in admin_rows:
-            payload = {
-                "chat_id": admin.user_id,
-                "text": message
+        reply_markup = None
+        if button_text and button_url:
+            reply_markup = {
+                "inline_keyboard": [[
+                    {"text": button_text, "web_app": {"url": button_url}}
+                ]]
             }
-            
-            if button_text and button_url:
-                payload["reply_markup"] = {
-                    "inline_keyboard": [[
-                        {"text": button_text, "web_app": {"url": button_url}}
-                    ]]
-                }
-            
-            async with httpx.AsyncClient(timeout=10) as client:
-                try:
-                    resp = await client.post(api, json=payload)
-                    if resp.status_code == 200:
-                        logger.info(f"Notification sent to restaurant admin {admin.user_id} for restaurant {restaurant_id}")
-                    else:
-                        logger.warning(f"Failed to send notification to admin {admin.user_id}: {resp.status_code}")
-                except Exception as exc:
-                    logger.exception(f"Error sending notification to admin {admin.user_id}: {exc}")
+        
+        # Рассылаем всем админам параллельно
+        sends = []
+        for admin_id in admin_ids:
+            payload: dict = {"chat_id": admin_id, "text": message}
+            if reply_markup:
+                payload["reply_markup"] = reply_markup
+            sends.append(_send_to_restaurant_admin(payload, restaurant_id))
+        await asyncio.gather(*sends)
                     
     except Exception as exc:
         logger.exception(f"Error in notify_restaurant_admins: {exc}")
-    finally:
-        if 'db' in locals():
-            db.close()
 
 
 async def resolve_username_to_user_id(username: str) -> int | None:
-    """Разрешает username в user_id через Telegram Bot API"""
-    if not BOT_TOKEN:
-        logger.warning("resolve_username: missing bot token")
+    """Разрешает username в user_id: кэш -> БД (индекс lower(username)) -> getChat"""
+    # Убираем @ если есть
+    clean_username = username.strip().lstrip('@')
+    if not clean_username:
         return None
     
-    # Убираем @ если есть
-    clean_username = username.lstrip('@')
+    from app.store import get_user_by_username, peek_username, remember_username
+    found, cached_id = peek_username(clean_username)
+    if found:
+        return cached_id
     
-    # Сначала ищем в нашей базе данных
-    from app.store import get_user_by_username
-    db_user_id = get_user_by_username(clean_username)
+    # Сначала ищем в нашей базе данных: туда попадают все, кто писал боту /start
+    db_user_id = await asyncio.to_thread(get_user_by_username, clean_username)
     if db_user_id:
         logger.info("resolve_username: found user %s in database with id %d", clean_username, db_user_id)
+        remember_username(clean_username, db_user_id)
         return db_user_id
     
     # Пробуем метод getChat (работает с публичными каналами/группами)
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/getChat"
-    payload = {"chat_id": f"@{clean_username}"}
-    
-    async with httpx.AsyncClient(timeout=10) as client:
+    if BOT_TOKEN:
         try:
-            resp = await client.post(url, json=payload)
-            if resp.status_code == 200:
-                data = resp.json()
-                if data.get("ok") and data.get("result"):
-                    return data["result"]["id"]
+            result = await transport.call("getChat", {"chat_id": f"@{clean_username}"})
+            if result.ok and result.result:
+                user_id = int(result.result["id"])
+                remember_username(clean_username, user_id)
+                return user_id
+            if result.error in ("circuit_open", "transport_error", "server_error", "rate_limited"):
+                # Telegram недоступен — не кэшируем промах
+                return None
         except Exception:
-            pass
-    
-    # Если getChat не сработал, пробуем метод getUpdates для поиска пользователя
-    # Это работает только если пользователь недавно взаимодействовал с ботом
-    try:
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/getUpdates"
-        resp = await client.get(url)
-        if resp.status_code == 200:
-            data = resp.json()
-            if data.get("ok") and data.get("result"):
-                for update in data["result"]:
-                    if "message" in update:
-                        user = update["message"].get("from")
-                        if user and user.get("username") == clean_username:
-                            return user["id"]
-                    elif "callback_query" in update:
-                        user = update["callback_query"].get("from")
-                        if user and user.get("username") == clean_username:
-                            return user["id"]
-    except Exception:
-        pass
+            return None
     
-    # Если ничего не сработало, возвращаем None
+    # Если ничего не сработало, кэшируем промах и возвращаем None
     # Пользователь должен сначала взаимодействовать с ботом
+    remember_username(clean_username, None)
     logger.warning("resolve_username: failed to resolve %s. User must interact with bot first.", username)
     return None
-
-
@@ -0,0 +1,417 @@
+import asyncio
+import os
+import random
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional, Set, Tuple
+
+import httpx
+from dotenv import load_dotenv
+from app.logging_config import get_logger
+from app.metrics import TELEGRAM_CALLS, TELEGRAM_LATENCY
+
+
+load_dotenv()
+
+
+BOT_TOKEN = os.getenv("BOT_TOKEN", "")
+# Базовый URL Bot API; для нагрузочных тестов указывается локальный tools/fake_telegram.py
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org").rstrip("/")
+
+# Таймауты короче прежних 10 секунд: медленный Telegram не должен держать запрос заказа
+TG_CONNECT_TIMEOUT = float(os.getenv("TG_CONNECT_TIMEOUT", "3"))
+TG_READ_TIMEOUT = float(os.getenv("TG_READ_TIMEOUT", "5"))
+# Лимиты Telegram: ~30 сообщений/с на бота, ~1/с в личный чат, ~20/мин в группу/канал
+TG_GLOBAL_RATE = float(os.getenv("TG_GLOBAL_RATE", "30"))
+TG_CHAT_RATE = float(os.getenv("TG_CHAT_RATE", "1"))
+TG_GROUP_RATE_PER_MIN = float(os.getenv("TG_GROUP_RATE_PER_MIN", "20"))
+TG_MAX_ATTEMPTS = int(os.getenv("TG_MAX_ATTEMPTS", "3"))
+TG_BACKOFF_BASE = float(os.getenv("TG_BACKOFF_BASE", "0.5"))
+TG_BACKOFF_CAP = float(os.getenv("TG_BACKOFF_CAP", "5"))
+# retry_after больше этого значения не ждём внутри запроса: отправка переносится на потом
+TG_MAX_RETRY_AFTER = float(os.getenv("TG_MAX_RETRY_AFTER", "10"))
+TG_BREAKER_THRESHOLD = int(os.getenv("TG_BREAKER_THRESHOLD", "5"))
+TG_BREAKER_RESET_SECONDS = float(os.getenv("TG_BREAKER_RESET_SECONDS", "30"))
+TG_QUEUE_MAX = int(os.getenv("TG_QUEUE_MAX", "1000"))
+
+# Методы без побочных эффектов: их можно повторять при таймаутах и 5xx
+IDEMPOTENT_METHODS = {"getChat", "getUpdates", "getMe", "getChatMember"}
+_MAX_CHAT_BUCKETS = 10000
+# Ошибки транспорта, которые идут в метки метрик как есть; прочие — api_error
+_KNOWN_ERRORS = {"missing_token", "circuit_open", "queued", "transport_error", "server_error", "rate_limited"}
+
+logger = get_logger("telegram.transport")
+
+
+@dataclass
+class TelegramResult:
+    ok: bool
+    status_code: int = 0
+    data: Optional[dict] = None
+    error: Optional[str] = None
+    queued: bool = False
+
+    @property
+    def result(self) -> Any:
+        return (self.data or {}).get("result")
+
+
+class _TokenBucket:
+    """Простой token bucket для asyncio; pause_until блокирует его до момента из retry_after"""
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause_until(self, moment: float) -> None:
+        self.paused_until = max(self.paused_until, moment)
+
+    async def acquire(self) -> float:
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return waited
+                    delay = (1 - self.tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+
+class _CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: int, reset_seconds: float) -> None:
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened_total = 0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            # в полуоткрытом состоянии пропускаем ровно один пробный запрос
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.info("circuit breaker closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+            if self.state != self.OPEN:
+                self.opened_total += 1
+                logger.warning("circuit breaker opened after %d failures", self.failures)
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def retry_in(self) -> float:
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+
+@dataclass
+class _Stats:
+    requests: int = 0
+    ok: int = 0
+    api_errors: int = 0
+    transport_errors: int = 0
+    server_errors: int = 0
+    rate_limited: int = 0
+    retries: int = 0
+    short_circuited: int = 0
+    queued: int = 0
+    queue_dropped: int = 0
+    drained: int = 0
+    rescheduled: int = 0
+    limiter_wait_seconds: float = 0.0
+    latency_seconds_sum: float = 0.0
+    latency_count: int = 0
+    by_method: Dict[str, int] = field(default_factory=dict)
+
+
+class TelegramTransport:
+    """Единая точка отправки запросов в Bot API: лимиты, retry_after, повторы и circuit breaker"""
+
+    def __init__(self, token: str = BOT_TOKEN) -> None:
+        self.token = token
+        self._client: httpx.AsyncClient | None = None
+        self._global = _TokenBucket(TG_GLOBAL_RATE, max(1.0, TG_GLOBAL_RATE))
+        self._chats: "OrderedDict[str, _TokenBucket]" = OrderedDict()
+        self._breaker = _CircuitBreaker(TG_BREAKER_THRESHOLD, TG_BREAKER_RESET_SECONDS)
+        self._queue: Deque[Tuple[str, dict]] = deque()
+        self._drainer: asyncio.Task | None = None
+        # отправки, отложенные до конца retry_after
+        self._delayed: Set[asyncio.Task] = set()
+        self.stats = _Stats()
+
+    def _url(self, method: str) -> str:
+        return f"{TELEGRAM_API_BASE}/bot{self.token}/{method}"
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(TG_READ_TIMEOUT, connect=TG_CONNECT_TIMEOUT),
+            )
+        return self._client
+
+    def _chat_bucket(self, chat_id: Any) -> _TokenBucket:
+        key = str(chat_id)
+        bucket = self._chats.get(key)
+        if bucket is None:
+            # группы и каналы (отрицательный id или @username) лимитируются строже личных чатов
+            if key.startswith("-") or key.startswith("@"):
+                bucket = _TokenBucket(TG_GROUP_RATE_PER_MIN / 60.0, 3)
+            else:
+                bucket = _TokenBucket(TG_CHAT_RATE, 3)
+            self._chats[key] = bucket
+            if len(self._chats) > _MAX_CHAT_BUCKETS:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(key)
+        return bucket
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        # full jitter: равномерно в [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(TG_BACKOFF_CAP, TG_BACKOFF_BASE * (2 ** attempt)))
+
+    @staticmethod
+    def _retry_after(resp: httpx.Response, data: dict | None) -> float:
+        params = (data or {}).get("parameters") or {}
+        value = params.get("retry_after") or resp.headers.get("Retry-After")
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            return 1.0
+
+    async def call(self, method: str, payload: dict | None = None, *, idempotent: bool | None = None,
+                   queue_on_open: bool | None = None) -> TelegramResult:
+        """Вызывает метод Bot API. Отправки (send*) при открытом breaker ставятся в очередь"""
+        payload = payload or {}
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        if queue_on_open is None:
+            queue_on_open = method.startswith("send")
+        if not self.token:
+            return self._observed(method, TelegramResult(ok=False, error="missing_token"), None)
+        if not self._breaker.allow():
+            self.stats.short_circuited += 1
+            if queue_on_open:
+                return self._observed(method, self._enqueue(method, payload), None)
+            return self._observed(method, TelegramResult(ok=False, error="circuit_open"), None)
+        started = time.perf_counter()
+        result = await self._call(method, payload, idempotent)
+        if result.error == "rate_limited" and queue_on_open:
+            result = self._retry_later(method, payload)
+        elif result.error in ("transport_error", "server_error") and queue_on_open and self._breaker.state == _CircuitBreaker.OPEN:
+            # breaker открылся на этом запросе — сообщение не теряем
+            result = self._enqueue(method, payload)
+        return self._observed(method, result, started)
+
+    @staticmethod
+    def _observed(method: str, result: TelegramResult, started: float | None) -> TelegramResult:
+        if result.ok:
+            outcome = "ok"
+        elif result.error in _KNOWN_ERRORS:
+            outcome = result.error
+        else:
+            outcome = "api_error"
+        TELEGRAM_CALLS.labels(method, outcome).inc()
+        if started is not None:
+            TELEGRAM_LATENCY.labels(method).observe(time.perf_counter() - started)
+        return result
+
+    async def _call(self, method: str, payload: dict, idempotent: bool) -> TelegramResult:
+        chat_id = payload.get("chat_id")
+        bucket = self._chat_bucket(chat_id) if chat_id is not None else None
+        self.stats.by_method[method] = self.stats.by_method.get(method, 0) + 1
+        result = TelegramResult(ok=False, error="not_sent")
+        for attempt in range(TG_MAX_ATTEMPTS):
+            if attempt:
+                self.stats.retries += 1
+            if bucket is not None:
+                self.stats.limiter_wait_seconds += await bucket.acquire()
+            self.stats.limiter_wait_seconds += await self._global.acquire()
+            self.stats.requests += 1
+            started = time.perf_counter()
+            try:
+                resp = await self._get_client().post(self._url(method), json=payload)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as exc:
+                # запрос не дошёл до Telegram — повтор безопасен даже для отправок
+                self._record_latency(started)
+                self.stats.transport_errors += 1
+                self._breaker.record_failure()
+                result = TelegramResult(ok=False, error="transport_error")
+                logger.warning("%s: connect failed: %s", method, repr(exc))
+                if self._breaker.state == _CircuitBreaker.OPEN:
+                    return result
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            except httpx.HTTPError as exc:
+                self._record_latency(started)
+                self.stats.transport_errors += 1
+                self._breaker.record_failure()
+                result = TelegramResult(ok=False, error="transport_error")
+                logger.warning("%s: request failed: %s", method, repr(exc))
+                if not idempotent or self._breaker.state == _CircuitBreaker.OPEN:
+                    return result
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            self._record_latency(started)
+            try:
+                data = resp.json()
+            except ValueError:
+                data = None
+            if resp.status_code == 429:
+                # Telegram гарантирует, что запрос с 429 не выполнен — повторяем после retry_after
+                self.stats.rate_limited += 1
+                self._breaker.record_success()
+                delay = self._retry_after(resp, data)
+                (bucket or self._global).pause_until(time.monotonic() + delay)
+                result = TelegramResult(ok=False, status_code=429, data=data, error="rate_limited")
+                logger.warning("%s: 429 for chat %s, retry_after=%.1f", method, chat_id, delay)
+                if delay > TG_MAX_RETRY_AFTER:
+                    return result
+                continue
+            if resp.status_code >= 500:
+                self.stats.server_errors += 1
+                self._breaker.record_failure()
+                result = TelegramResult(ok=False, status_code=resp.status_code, data=data, error="server_error")
+                if not idempotent or self._breaker.state == _CircuitBreaker.OPEN:
+                    return result
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            self._breaker.record_success()
+            ok = 200 <= resp.status_code < 300 and bool((data or {}).get("ok", True))
+            if ok:
+                self.stats.ok += 1
+                return TelegramResult(ok=True, status_code=resp.status_code, data=data)
+            self.stats.api_errors += 1
+            return TelegramResult(
+                ok=False, status_code=resp.status_code, data=data,
+                error=(data or {}).get("description") or resp.text,
+            )
+        return result
+
+    def _record_latency(self, started: float) -> None:
+        self.stats.latency_seconds_sum += time.perf_counter() - started
+        self.stats.latency_count += 1
+
+    def _enqueue(self, method: str, payload: dict) -> TelegramResult:
+        if len(self._queue) >= TG_QUEUE_MAX:
+            self._queue.popleft()
+            self.stats.queue_dropped += 1
+        self._queue.append((method, payload))
+        self.stats.queued += 1
+        if self._drainer is None or self._drainer.done():
+            self._drainer = asyncio.get_running_loop().create_task(self._drain())
+        return TelegramResult(ok=False, error="queued", queued=True)
+
+    def _retry_later(self, method: str, payload: dict, rescheduled: int = 1) -> TelegramResult:
+        """429 с долгим retry_after: сообщение отправится, когда лимит чата снимется"""
+        chat_id = payload.get("chat_id")
+        bucket = self._chat_bucket(chat_id) if chat_id is not None else self._global
+        task = asyncio.get_running_loop().create_task(self._send_after_pause(method, payload, bucket, rescheduled))
+        self._delayed.add(task)
+        task.add_done_callback(self._delayed.discard)
+        self.stats.rescheduled += 1
+        return TelegramResult(ok=False, status_code=429, error="queued", queued=True)
+
+    async def _send_after_pause(self, method: str, payload: dict, bucket: _TokenBucket, rescheduled: int) -> None:
+        await asyncio.sleep(max(0.0, bucket.paused_until - time.monotonic()))
+        result = await self.call(method, payload, idempotent=False, queue_on_open=False)
+        if result.error == "rate_limited" and rescheduled < TG_MAX_ATTEMPTS:
+            self._retry_later(method, payload, rescheduled + 1)
+        elif result.error == "circuit_open" or (
+            result.error in ("transport_error", "server_error") and self._breaker.state == _CircuitBreaker.OPEN
+        ):
+            self._enqueue(method, payload)
+        elif not result.ok:
+            logger.warning("%s: rescheduled send failed: %s", method, result.error)
+
+    async def _drain(self) -> None:
+        """Досылает накопленные сообщения, когда breaker снова пропускает запросы"""
+        while self._queue:
+            wait = self._breaker.retry_in()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if not self._breaker.allow():
+                await asyncio.sleep(0.5)
+                continue
+            method, payload = self._queue.popleft()
+            result = await self._call(method, payload, idempotent=False)
+            if result.error in ("transport_error", "server_error"):
+                # Telegram всё ещё недоступен: возвращаем сообщение в голову очереди
+                self._queue.appendleft((method, payload))
+                continue
+            if result.error == "rate_limited":
+                self._retry_later(method, payload)
+                continue
+            self.stats.drained += 1
+
+    def snapshot(self) -> dict:
+        s = self.stats
+        return {
+            "breaker_state": self._breaker.state,
+            "breaker_consecutive_failures": self._breaker.failures,
+            "breaker_opened_total": self._breaker.opened_total,
+            "queue_length": len(self._queue),
+            "requests": s.requests,
+            "ok": s.ok,
+            "api_errors": s.api_errors,
+            "transport_errors": s.transport_errors,
+            "server_errors": s.server_errors,
+            "rate_limited": s.rate_limited,
+            "retries": s.retries,
+            "short_circuited": s.short_circuited,
+            "queued": s.queued,
+            "queue_dropped": s.queue_dropped,
+            "drained": s.drained,
+            "rescheduled": s.rescheduled,
+            "limiter_wait_seconds": round(s.limiter_wait_seconds, 3),
+            "latency_seconds_sum": round(s.latency_seconds_sum, 3),
+            "latency_count": s.latency_count,
+            "by_method": dict(s.by_method),
+        }
+
+    async def aclose(self) -> None:
+        if self._drainer is not None and not self._drainer.done():
+            self._drainer.cancel()
+        for task in list(self._delayed):
+            task.cancel()
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+
+# Глобальный экземпляр транспорта
+transport = TelegramTransport()
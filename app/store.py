@@ -1,10 +1,35 @@
+import os
+import threading
+import time
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
+from sqlalchemy import func
 from sqlalchemy.orm import Session
+from app.activity import activity_tracker
+from app.cache import TTLCache
 from app.db import get_session
+from app.logging_config import get_logger
 from app.models import User as DBUser, RestaurantAdmin as DBRestaurantAdmin
 
 
+logger = get_logger("store")
+
+# Снимок таблицы restaurant_admins в памяти: user_id -> restaurant_id и restaurant_id -> [user_id].
+# Загружается лениво одним запросом, сбрасывается в bind/unbind; TTL страхует
+# от изменений, сделанных другими воркерами.
+_ADMIN_MAP_TTL_SECONDS = float(os.getenv("RA_ADMIN_MAP_TTL_SECONDS", "300"))
+_ADMIN_MAP: Tuple[float, Dict[int, int], Dict[int, List[int]]] | None = None
+_ADMIN_MAP_LOCK = threading.Lock()
+_ADMIN_MAP_GEN = 0
+
+# Кэш username -> user_id (ключ в нижнем регистре); None кэшируется коротким negative TTL
+_USERNAME_CACHE: TTLCache[int] = TTLCache(
+    maxsize=int(os.getenv("USERNAME_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("USERNAME_CACHE_TTL_SECONDS", "3600")),
+    negative_ttl=float(os.getenv("USERNAME_NEGATIVE_TTL_SECONDS", "60")),
+)
+
+
 def ensure_user(user_id: int, username: str | None = None) -> DBUser:
     with get_session() as db:  # type: Session
         u = db.query(DBUser).filter(DBUser.id == user_id).first()
@@ -13,30 +38,30 @@ def ensure_user(user_id: int, username: str | None = None) -> DBUser:
             db.add(u)
             db.commit()
         else:
-            # Обновляем last_activity и username для существующих пользователей
-            u.last_activity = datetime.utcnow()
+            # last_activity пишется отложенно пачкой (app/activity.py); синхронно — только username
+            activity_tracker.touch(user_id)
             if username and not u.username:
                 u.username = username
-            db.commit()
+                db.commit()
+        if u.username:
+            # пользователь мог только что появиться — перекрываем negative-запись
+            remember_username(u.username, u.id)
         return u
 
 
 def bind_restaurant_admin(user_id: int, restaurant_id: int) -> None:
-    print(f"DEBUG: bind_restaurant_admin called with user_id={user_id}, restaurant_id={restaurant_id}")
     with get_session() as db:
         # Сначала убеждаемся, что пользователь существует
         ensure_user(user_id)
-        print(f"DEBUG: user {user_id} ensured")
         
         row = db.query(DBRestaurantAdmin).filter(DBRestaurantAdmin.user_id == user_id).first()
         if row:
-            print(f"DEBUG: updating existing admin record for user {user_id}")
             row.restaurant_id = restaurant_id
         else:
-            print(f"DEBUG: creating new admin record for user {user_id}")
             db.add(DBRestaurantAdmin(user_id=user_id, restaurant_id=restaurant_id))
         db.commit()
-        print(f"DEBUG: commit successful")
+        logger.info("restaurant admin bound", extra={"user_id": user_id, "restaurant_id": restaurant_id, "updated": row is not None})
+    invalidate_restaurant_admin_cache()
 
 
 def unbind_restaurant_admin(user_id: int) -> None:
@@ -45,33 +70,80 @@ def unbind_restaurant_admin(user_id: int) -> None:
         if row:
             db.delete(row)
             db.commit()
+    invalidate_restaurant_admin_cache()
 
 
 def get_restaurant_for_admin(user_id: int) -> int | None:
-    print(f"DEBUG: get_restaurant_for_admin called with user_id={user_id}")
+    """Ресторан, которым управляет пользователь (из снимка restaurant_admins)"""
+    by_user, _ = _admin_map()
+    return by_user.get(user_id)
+
+
+def invalidate_restaurant_admin_cache() -> None:
+    # при перепривязке админ уходит из одного состава в другой — проще сбросить всё
+    global _ADMIN_MAP, _ADMIN_MAP_GEN
+    with _ADMIN_MAP_LOCK:
+        _ADMIN_MAP = None
+        _ADMIN_MAP_GEN += 1
+
+
+def _admin_map() -> Tuple[Dict[int, int], Dict[int, List[int]]]:
+    global _ADMIN_MAP
+    snapshot = _ADMIN_MAP
+    if snapshot is not None and snapshot[0] >= time.monotonic():
+        return snapshot[1], snapshot[2]
+    gen = _ADMIN_MAP_GEN
     with get_session() as db:
-        print(f"DEBUG: Querying RestaurantAdmin table for user_id={user_id}")
-        row = db.query(DBRestaurantAdmin).filter(DBRestaurantAdmin.user_id == user_id).first()
-        result = row.restaurant_id if row else None
-        print(f"DEBUG: get_restaurant_for_admin result: {result}")
-        if row:
-            print(f"DEBUG: Found row: user_id={row.user_id}, restaurant_id={row.restaurant_id}")
-        else:
-            print(f"DEBUG: No row found for user_id={user_id}")
-            # Проверяем, есть ли вообще записи в таблице
-            all_rows = db.query(DBRestaurantAdmin).all()
-            print(f"DEBUG: Total rows in RestaurantAdmin table: {len(all_rows)}")
-            for r in all_rows:
-                print(f"DEBUG: Row: user_id={r.user_id}, restaurant_id={r.restaurant_id}")
-        return result
+        rows = db.query(DBRestaurantAdmin.user_id, DBRestaurantAdmin.restaurant_id).all()
+    by_user: Dict[int, int] = {}
+    by_restaurant: Dict[int, List[int]] = {}
+    for user_id, restaurant_id in rows:
+        by_user[user_id] = restaurant_id
+        by_restaurant.setdefault(restaurant_id, []).append(user_id)
+    with _ADMIN_MAP_LOCK:
+        # не кэшируем результат, если во время чтения прошла инвалидация
+        if gen == _ADMIN_MAP_GEN:
+            _ADMIN_MAP = (time.monotonic() + _ADMIN_MAP_TTL_SECONDS, by_user, by_restaurant)
+    return by_user, by_restaurant
+
+
+def peek_restaurant_admin_ids(restaurant_id: int) -> List[int] | None:
+    """Состав админов ресторана из кэша без обращения к БД (None — промах)"""
+    snapshot = _ADMIN_MAP
+    if snapshot is None or snapshot[0] < time.monotonic():
+        return None
+    return snapshot[2].get(restaurant_id, [])
+
+
+def get_restaurant_admin_ids(restaurant_id: int) -> List[int]:
+    """Список user_id админов ресторана; при промахе кэша перечитывает restaurant_admins"""
+    _, by_restaurant = _admin_map()
+    return by_restaurant.get(restaurant_id, [])
+
+
+def _username_key(username: str) -> str:
+    return username.strip().lstrip('@').lower()
+
+
+def peek_username(username: str) -> tuple[bool, int | None]:
+    """Ищет username в кэше: (найдено, user_id); user_id=None — закэшированный промах"""
+    return _USERNAME_CACHE.get(_username_key(username))
+
+
+def remember_username(username: str, user_id: int | None) -> None:
+    key = _username_key(username)
+    if key:
+        _USERNAME_CACHE.set(key, user_id)
 
 
 def get_user_by_username(username: str) -> int | None:
-    """Находит пользователя по username в базе данных"""
-    clean_username = username.lstrip('@')
+    """Находит пользователя по username в базе данных (без учёта регистра, по индексу lower(username))"""
+    key = _username_key(username)
+    if not key:
+        return None
     with get_session() as db:
-        user = db.query(DBUser).filter(DBUser.username == clean_username).first()
-        return user.id if user else None
+        row = db.query(DBUser.id).filter(func.lower(DBUser.username) == key).first()
+        return row[0] if row else None
 
 
 # Временные заглушки для совместимости с существующим кодом, где импортируются эти имена
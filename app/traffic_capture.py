@@ -0,0 +1,168 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.deps.auth import _session_token_from_request, verify_session_token
+
+
+# Запись трасс запросов для последующего воспроизведения (python -m tools.replay); по умолчанию выключена
+TRAFFIC_CAPTURE_ENABLED = os.getenv("TRAFFIC_CAPTURE_ENABLED", "false").lower() in ("1", "true", "yes")
+TRAFFIC_CAPTURE_PATH = os.getenv("TRAFFIC_CAPTURE_PATH", "logs/traffic.jsonl")
+TRAFFIC_CAPTURE_MAX_BYTES = int(os.getenv("TRAFFIC_CAPTURE_MAX_BYTES", str(50 * 1024 * 1024)))
+TRAFFIC_CAPTURE_BACKUPS = int(os.getenv("TRAFFIC_CAPTURE_BACKUPS", "5"))
+TRAFFIC_CAPTURE_SAMPLE_RATE = float(os.getenv("TRAFFIC_CAPTURE_SAMPLE_RATE", "1.0"))
+# Соль для псевдонимов; одинаковая у всех воркеров, чтобы один пользователь был одним псевдонимом
+TRAFFIC_CAPTURE_SALT = os.getenv("TRAFFIC_CAPTURE_SALT") or hashlib.sha256(
+    f"traffic:{os.getenv('BOT_TOKEN', '')}".encode()
+).hexdigest()
+
+# Идентификаторы пользователей заменяются стабильными числовыми псевдонимами (replay подставляет их как есть)
+_USER_ID_KEYS = {"user_id", "uid", "customer_id", "tg_id", "telegram_id", "x-telegram-user-id"}
+# Персональные данные и свободный текст — хэш вместо значения. "name" тоже: в профиле (PUT /api/users/me)
+# это настоящее имя клиента
+_PII_KEYS = {
+    "name", "username", "first_name", "last_name", "birth_date", "init_data",
+    "reason", "text", "caption", "message",
+}
+# Внутри позиций заказа/корзины "name" — название блюда; без него записанные тела бесполезны для replay
+_ITEM_LIST_KEYS = {"items"}
+# Ключи, содержащие эти части (client_comment, staff_comment, contact_phone, delivery_address, ...)
+_PII_KEY_PARTS = ("comment", "phone", "email", "address", "password", "token")
+_SKIP_PREFIXES = ("/static", "/uploads", "/metrics")
+_MAX_BODY_BYTES = 64 * 1024
+# Псевдонимы лежат выше реальных Telegram id, чтобы не пересекаться с ними при replay
+_PSEUDONYM_BASE = 5_000_000_000
+
+
+def _digest(value: str) -> str:
+    return hmac.new(TRAFFIC_CAPTURE_SALT.encode(), value.encode(), hashlib.sha256).hexdigest()
+
+
+def pseudonym_id(user_id: Any) -> int:
+    """Стабильный числовой псевдоним пользователя"""
+    return _PSEUDONYM_BASE + int(_digest(f"uid:{user_id}")[:12], 16) % 1_000_000_000
+
+
+def hash_value(value: Any) -> str:
+    return "h:" + _digest(f"pii:{value}")[:16]
+
+
+def sanitize(data: Any, key: str | None = None, parent: str | None = None) -> Any:
+    """Рекурсивно заменяет идентификаторы пользователей и PII на псевдонимы; parent — ключ, под которым лежит объект"""
+    if isinstance(data, dict):
+        return {k: sanitize(v, k.lower(), key) for k, v in data.items()}
+    if isinstance(data, list):
+        return [sanitize(v, key, parent) for v in data]
+    if data is None or key is None:
+        return data
+    if key in _USER_ID_KEYS:
+        return pseudonym_id(data)
+    if key == "name" and parent in _ITEM_LIST_KEYS:
+        return data
+    if key in _PII_KEYS or any(part in key for part in _PII_KEY_PARTS):
+        return hash_value(data)
+    return data
+
+
+class TrafficCapture:
+    """Пишет трассы в ротируемый JSONL через очередь; обработчик запроса не ждёт диск"""
+
+    def __init__(self) -> None:
+        self._queue: queue.Queue = queue.Queue(maxsize=10000)
+        self._listener: QueueListener | None = None
+        self._logger = logging.getLogger("traffic_capture")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self.dropped = 0
+
+    def start(self) -> None:
+        if self._listener is not None:
+            return
+        directory = os.path.dirname(TRAFFIC_CAPTURE_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = RotatingFileHandler(
+            TRAFFIC_CAPTURE_PATH, maxBytes=TRAFFIC_CAPTURE_MAX_BYTES, backupCount=TRAFFIC_CAPTURE_BACKUPS, encoding="utf-8",
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._logger.addHandler(QueueHandler(self._queue))
+        self._listener = QueueListener(self._queue, handler)
+        self._listener.start()
+
+    def stop(self) -> None:
+        if self._listener is None:
+            return
+        self._listener.stop()
+        self._listener = None
+        for h in list(self._logger.handlers):
+            self._logger.removeHandler(h)
+
+    def should_capture(self, request: Request) -> bool:
+        if self._listener is None or request.url.path.startswith(_SKIP_PREFIXES):
+            return False
+        return TRAFFIC_CAPTURE_SAMPLE_RATE >= 1.0 or random.random() < TRAFFIC_CAPTURE_SAMPLE_RATE
+
+    def record(self, entry: dict) -> None:
+        if self._queue.full():
+            self.dropped += 1
+            return
+        self._logger.info(json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=str))
+
+
+def _request_user(request: Request) -> int | None:
+    token = _session_token_from_request(request)
+    if token:
+        return verify_session_token(token)
+    raw = request.headers.get("x-telegram-user-id") or request.query_params.get("uid")
+    try:
+        return int(raw) if raw else None
+    except ValueError:
+        return None
+
+
+async def read_json_body(request: Request) -> Any:
+    """Тело JSON-запроса (Starlette кэширует его, обработчик прочитает то же самое); иное не пишем"""
+    if request.method in ("GET", "HEAD", "OPTIONS"):
+        return None
+    if "application/json" not in request.headers.get("content-type", ""):
+        return None
+    body = await request.body()
+    if not body or len(body) > _MAX_BODY_BYTES:
+        return None
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+def build_entry(request: Request, response: Response, body: Any, started_at: float, duration: float) -> dict:
+    route = request.scope.get("route")
+    user_id = _request_user(request)
+    query: dict = {}
+    for k, v in request.query_params.multi_items():
+        query.setdefault(k, []).append(v)
+    size = response.headers.get("content-length")
+    return {
+        "ts": round(started_at, 3),
+        "method": request.method,
+        "route": getattr(route, "path", None) or "unmatched",
+        "path_params": sanitize(dict(request.scope.get("path_params") or {})),
+        "query": sanitize(query),
+        "user": pseudonym_id(user_id) if user_id is not None else None,
+        "body": sanitize(body),
+        "status": response.status_code,
+        "duration_ms": round(duration * 1000, 2),
+        "response_bytes": int(size) if size else None,
+    }
+
+
+traffic_capture = TrafficCapture()
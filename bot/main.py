@@ -3,8 +3,11 @@ import os
 from aiogram import Bot, Dispatcher, types, F
 from aiogram.filters import CommandStart, Command
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo, ReplyKeyboardMarkup, KeyboardButton
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from dotenv import load_dotenv
 import httpx
+from app.deps.auth import INTERNAL_API_TOKEN
 from app.logging_config import get_logger
 
 load_dotenv()
@@ -17,6 +20,8 @@ PUBLIC_WEBAPP_URL = os.getenv("PUBLIC_WEBAPP_URL", os.getenv("WEBAPP_URL", "http
 INTERNAL_API_URL = os.getenv("INTERNAL_API_URL", os.getenv("WEBAPP_URL", "http://localhost:8000"))
 SUPER_ADMIN_IDS = {int(x) for x in os.getenv("SUPER_ADMIN_IDS", "").split(",") if x.strip().isdigit()}
 ADMIN_CODE = os.getenv("ADMIN_CODE", "").strip()
+# Базовый URL Bot API (для офлайн-тестов — локальный tools/fake_telegram.py)
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org").rstrip("/")
 
 # Простая сессия для авторизованных по кодовому слову
 ADMIN_SESSIONS: set[int] = set()
@@ -36,7 +41,7 @@ async def start(message: types.Message) -> None:
             # Активируем пользователя и сохраняем username
             r = await client.post(
                 INTERNAL_API_URL + "/api/users/activate", 
-                headers={"X-Telegram-User-Id": str(message.from_user.id)},
+                headers=_user_headers(message.from_user.id),
                 json={"username": username} if username else {}
             )
             logger.info("activate_user id=%s username=%s status=%s", message.from_user.id, username, getattr(r, "status_code", "n/a"))
@@ -56,11 +61,16 @@ async def start(message: types.Message) -> None:
         )
 
 
+def _user_headers(user_id: int) -> dict:
+    """Заголовки запроса к API от имени пользователя: id заверяется токеном сервиса, а не подписью initData"""
+    return {"X-Telegram-User-Id": str(user_id), "X-Internal-Token": INTERNAL_API_TOKEN}
+
+
 async def _is_restaurant_admin(user_id: int) -> bool:
     try:
         async with httpx.AsyncClient(timeout=10) as client:
             url = INTERNAL_API_URL + "/api/ra/me"
-            r = await client.get(url, headers={"X-Telegram-User-Id": str(user_id)})
+            r = await client.get(url, headers=_user_headers(user_id))
             return r.status_code == 200
     except Exception:
         return False
@@ -218,49 +228,33 @@ BROADCAST_FLOW: dict[int, dict] = {}
 DEL_FLOW: dict[int, dict] = {}
 
 
-async def _resolve_user_id_by_username(username: str) -> int | None:
-    uname = username.strip()
+async def _resolve_user_id_by_username(username: str, actor_id: int) -> int | None:
+    """Разрешает username через общий резолвер API (кэш, БД, getChat); доступ по токену сервиса, а не правам admin"""
+    uname = username.strip().lstrip("@")
     if not uname:
         return None
-    if not uname.startswith("@"):
-        uname = "@" + uname
-    if not BOT_TOKEN:
-        return None
-    
-    print(f"DEBUG: Resolving username: {uname}")
     
     try:
         async with httpx.AsyncClient(timeout=7) as client:
-            # Сначала пробуем getChat
-            resp = await client.get(f"https://api.telegram.org/bot{BOT_TOKEN}/getChat", params={"chat_id": uname})
-            data = resp.json()
-            print(f"DEBUG: getChat response: {data}")
-            
-            if data.get("ok") and data.get("result", {}).get("id"):
-                user_id = int(data["result"]["id"])
-                print(f"DEBUG: Found user_id via getChat: {user_id}")
-                return user_id
-            
-            # Если getChat не сработал, пробуем через API нашего приложения
-            print(f"DEBUG: getChat failed, trying internal API")
-            api_resp = await client.get(f"{INTERNAL_API_URL}/api/admin/users/resolve-username?username={uname}")
-            api_data = api_resp.json()
-            print(f"DEBUG: Internal API response: {api_data}")
-            
-            if api_resp.status_code == 200 and api_data.get("user_id"):
-                user_id = int(api_data["user_id"])
-                print(f"DEBUG: Found user_id via internal API: {user_id}")
-                return user_id
-                
-    except Exception as e:
-        print(f"DEBUG: Exception in _resolve_user_id_by_username: {e}")
+            api_resp = await client.get(
+                f"{INTERNAL_API_URL}/api/internal/resolve-username",
+                params={"username": uname},
+                headers={"X-Internal-Token": INTERNAL_API_TOKEN},
+            )
+            if api_resp.status_code == 200:
+                user_id = (api_resp.json() or {}).get("user_id")
+                if user_id:
+                    return int(user_id)
+            elif api_resp.status_code != 404:
+                logger.warning("resolve_username: api status=%s for %s (actor %s)", api_resp.status_code, uname, actor_id)
+    except Exception as exc:
+        logger.exception("resolve_username failed: %s", repr(exc))
         return None
     
-    print(f"DEBUG: Could not resolve username: {uname}")
     return None
 
 
-# Обработчики Inline кнопок админки
+
 @dp.callback_query(F.data == "admin_add_restaurant")
 async def admin_add_restaurant_callback(callback: types.CallbackQuery) -> None:
     uid = callback.from_user.id
@@ -550,7 +544,7 @@ async def _try_finish_add_restaurant(uid: int, message: types.Message) -> None:
     if not state or not state.get("username") or not state.get("name"):
         return
     # resolve user id
-    admin_user_id = await _resolve_user_id_by_username(state["username"])
+    admin_user_id = await _resolve_user_id_by_username(state["username"], uid)
     if not admin_user_id:
         await message.answer("Не удалось определить аккаунт по username. Проверьте написание и попробуйте снова.")
         return
@@ -620,7 +614,7 @@ async def handle_add_restaurant_username(message: types.Message) -> None:
         print(f"DEBUG: Using direct user_id: {admin_user_id}")
     else:
         # Если введен username
-        admin_user_id = await _resolve_user_id_by_username(input_text)
+        admin_user_id = await _resolve_user_id_by_username(input_text, uid)
         if not admin_user_id:
             await message.answer("❌ Не удалось найти пользователя с таким username. Проверьте написание и попробуйте снова.\n\n💡 Подсказка: Пользователь должен сначала взаимодействовать с ботом (написать /start), чтобы его можно было найти по username.")
             return
@@ -770,10 +764,10 @@ async def toggle_restaurant(message: types.Message) -> None:
         return
     try:
         async with httpx.AsyncClient(timeout=5) as client:
-            info = await client.get(PUBLIC_WEBAPP_URL + "/api/ra/restaurant", headers={"X-Telegram-User-Id": str(uid)})
+            info = await client.get(PUBLIC_WEBAPP_URL + "/api/ra/restaurant", headers=_user_headers(uid))
             r = info.json()
             enabled = not bool(r.get("is_enabled"))
-            await client.post(PUBLIC_WEBAPP_URL + f"/api/ra/restaurant/status?enabled={'true' if enabled else 'false'}", headers={"X-Telegram-User-Id": str(uid)})
+            await client.post(PUBLIC_WEBAPP_URL + f"/api/ra/restaurant/status?enabled={'true' if enabled else 'false'}", headers=_user_headers(uid))
         await message.answer("Статус обновлён.", reply_markup=RA_INLINE_KB)
     except Exception:
         await message.answer("Не удалось обновить статус.")
@@ -787,7 +781,7 @@ async def admin_orders(message: types.Message) -> None:
         return
     try:
         async with httpx.AsyncClient(timeout=5) as client:
-            res = await client.get(PUBLIC_WEBAPP_URL + "/api/ra/orders", headers={"X-Telegram-User-Id": str(uid)})
+            res = await client.get(PUBLIC_WEBAPP_URL + "/api/ra/orders", headers=_user_headers(uid))
             if res.status_code != 200:
                 await message.answer("Нет доступа к заказам.")
                 return
@@ -1014,18 +1008,18 @@ async def handle_text_inputs(message: types.Message) -> None:
     try:
         async with httpx.AsyncClient(timeout=5) as client:
             if kind == "address":
-                await client.patch(PUBLIC_WEBAPP_URL + "/api/ra/restaurant", headers={"X-Telegram-User-Id": str(uid)}, json={"address": text})
+                await client.patch(PUBLIC_WEBAPP_URL + "/api/ra/restaurant", headers=_user_headers(uid), json={"address": text})
                 await message.answer("Адрес обновлён.", reply_markup=RESTAURANT_DATA_KB)
             elif kind == "phone":
-                await client.patch(PUBLIC_WEBAPP_URL + "/api/ra/restaurant", headers={"X-Telegram-User-Id": str(uid)}, json={"phone": text})
+                await client.patch(PUBLIC_WEBAPP_URL + "/api/ra/restaurant", headers=_user_headers(uid), json={"phone": text})
                 await message.answer("Телефон обновлён.", reply_markup=RESTAURANT_DATA_KB)
             elif kind == "min_sum":
                 val = int(text)
-                await client.patch(PUBLIC_WEBAPP_URL + "/api/ra/restaurant", headers={"X-Telegram-User-Id": str(uid)}, json={"delivery_min_sum": val})
+                await client.patch(PUBLIC_WEBAPP_URL + "/api/ra/restaurant", headers=_user_headers(uid), json={"delivery_min_sum": val})
                 await message.answer("Минимальная сумма обновлена.", reply_markup=ORDER_TERMS_KB)
             elif kind == "delivery_time":
                 val = int(text)
-                await client.patch(PUBLIC_WEBAPP_URL + "/api/ra/restaurant", headers={"X-Telegram-User-Id": str(uid)}, json={"delivery_time_minutes": val})
+                await client.patch(PUBLIC_WEBAPP_URL + "/api/ra/restaurant", headers=_user_headers(uid), json={"delivery_time_minutes": val})
                 await message.answer("Время доставки обновлено.", reply_markup=ORDER_TERMS_KB)
             elif kind == "work_hours":
                 # ожидаемый формат: "с HH:MM - HH:MM"
@@ -1037,7 +1031,7 @@ async def handle_text_inputs(message: types.Message) -> None:
                     h1, m1, h2, m2 = map(int, m.groups())
                     open_min = h1 * 60 + m1
                     close_min = h2 * 60 + m2
-                    await client.patch(PUBLIC_WEBAPP_URL + "/api/ra/restaurant", headers={"X-Telegram-User-Id": str(uid)}, json={"work_open_min": open_min, "work_close_min": close_min})
+                    await client.patch(PUBLIC_WEBAPP_URL + "/api/ra/restaurant", headers=_user_headers(uid), json={"work_open_min": open_min, "work_close_min": close_min})
                     await message.answer("Режим работы обновлён.", reply_markup=RESTAURANT_DATA_KB)
             elif kind == "ga_add_username":
                 state = ADD_FLOW.get(uid)
@@ -1469,7 +1463,7 @@ async def broadcast_cancel(message: types.Message) -> None:
 async def main() -> None:
     if not BOT_TOKEN:
         raise RuntimeError("BOT_TOKEN is required")
-    bot = Bot(BOT_TOKEN)
+    bot = Bot(BOT_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_BASE)))
     await dp.start_polling(bot)
 
 
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Миграция: cart_items.options_key и уникальный индекс (cart_id, dish_id, options_key).
+Одинаковые позиции (блюдо + набор опций) в одной корзине сливаются в одну строку с суммарным qty.
+"""
+import json
+import os
+import sys
+
+# Добавляем корневую директорию в путь
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from app.db import DATABASE_URL
+from app.services.dish_options import options_key
+
+def run_migration():
+    """Добавляет options_key, заполняет его, сливает дубликаты и создаёт индекс ux_cart_items_line"""
+    engine = create_engine(DATABASE_URL)
+    
+    with engine.connect() as conn:
+        try:
+            print("🔄 Добавляем поле options_key в таблицу cart_items...")
+            conn.execute(text("ALTER TABLE cart_items ADD COLUMN options_key VARCHAR(500) DEFAULT ''"))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            if "duplicate column name" in str(e).lower() or "already exists" in str(e).lower():
+                print("✅ Поле options_key уже существует в таблице cart_items")
+            else:
+                print(f"❌ Ошибка при выполнении миграции: {e}")
+                raise
+
+        print("🔄 Заполняем options_key и сливаем одинаковые позиции...")
+        rows = conn.execute(text("SELECT id, cart_id, dish_id, qty, chosen_options FROM cart_items ORDER BY id")).all()
+        lines = {}
+        updates, merged, deleted = [], {}, []
+        for item_id, cart_id, dish_id, qty, chosen_options in rows:
+            try:
+                chosen = sorted(set(json.loads(chosen_options or "[]")))
+            except ValueError:
+                chosen = []
+            key = options_key(chosen)
+            first = lines.get((cart_id, dish_id, key))
+            if first is None:
+                lines[(cart_id, dish_id, key)] = item_id
+                updates.append({"id": item_id, "key": key, "chosen": json.dumps(chosen)})
+            else:
+                merged[first] = merged.get(first, 0) + (qty or 0)
+                deleted.append({"id": item_id})
+        if updates:
+            conn.execute(text("UPDATE cart_items SET options_key = :key, chosen_options = :chosen WHERE id = :id"), updates)
+        if merged:
+            conn.execute(text("UPDATE cart_items SET qty = qty + :extra WHERE id = :id"),
+                         [{"id": item_id, "extra": extra} for item_id, extra in merged.items()])
+        if deleted:
+            conn.execute(text("DELETE FROM cart_items WHERE id = :id"), deleted)
+
+        print("🔄 Создаём индекс ux_cart_items_line...")
+        conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ux_cart_items_line ON cart_items (cart_id, dish_id, options_key)"))
+        conn.commit()
+        print(f"✅ Миграция успешно выполнена! Слито дубликатов: {len(deleted)}")
+
+if __name__ == "__main__":
+    run_migration()
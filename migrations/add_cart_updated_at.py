@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Миграция: carts.updated_at (время последнего изменения корзины) и индекс ix_carts_updated_at для очистки брошенных корзин
+"""
+import os
+import sys
+
+# Добавляем корневую директорию в путь
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from app.db import DATABASE_URL
+
+def run_migration():
+    """Добавляет поле updated_at; существующим корзинам отсчёт срока начинается с момента миграции"""
+    engine = create_engine(DATABASE_URL)
+    
+    with engine.connect() as conn:
+        try:
+            print("🔄 Добавляем поле updated_at в таблицу carts...")
+            conn.execute(text("ALTER TABLE carts ADD COLUMN updated_at TIMESTAMP"))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            if "duplicate column name" in str(e).lower() or "already exists" in str(e).lower():
+                print("✅ Поле updated_at уже существует в таблице carts")
+            else:
+                print(f"❌ Ошибка при выполнении миграции: {e}")
+                raise
+
+        print("🔄 Обновляем существующие записи...")
+        conn.execute(text("UPDATE carts SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL"))
+        print("🔄 Создаём индекс ix_carts_updated_at...")
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_carts_updated_at ON carts (updated_at)"))
+        conn.commit()
+        print("✅ Миграция успешно выполнена!")
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Миграция: restaurants.menu_version и журнал правок меню menu_changes для дельта-синхронизации (/menu/changes)
+"""
+import os
+import sys
+
+# Добавляем корневую директорию в путь
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from app.db import DATABASE_URL, Base
+from app.models import MenuChange
+
+def run_migration():
+    """Добавляет версию меню (у существующих ресторанов 0) и создаёт таблицу журнала с индексами"""
+    engine = create_engine(DATABASE_URL)
+    
+    with engine.connect() as conn:
+        try:
+            print("🔄 Добавляем поле menu_version в таблицу restaurants...")
+            conn.execute(text("ALTER TABLE restaurants ADD COLUMN menu_version INTEGER DEFAULT 0"))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            if "duplicate column name" in str(e).lower() or "already exists" in str(e).lower():
+                print("✅ Поле menu_version уже существует в таблице restaurants")
+            else:
+                print(f"❌ Ошибка при выполнении миграции: {e}")
+                raise
+
+        print("🔄 Обновляем существующие записи...")
+        conn.execute(text("UPDATE restaurants SET menu_version = 0 WHERE menu_version IS NULL"))
+        conn.commit()
+
+    print("🔄 Создаём таблицу menu_changes...")
+    Base.metadata.create_all(bind=engine, tables=[MenuChange.__table__])
+    print("✅ Миграция успешно выполнена!")
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Миграция: регистронезависимый индекс по users.username (lower(username))
+"""
+import os
+import sys
+
+# Добавляем корневую директорию в путь
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from app.db import DATABASE_URL
+
+def run_migration():
+    """Создаёт индекс ix_users_username_lower, если его ещё нет"""
+    engine = create_engine(DATABASE_URL)
+    
+    with engine.connect() as conn:
+        print("🔄 Создаём индекс ix_users_username_lower...")
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_username_lower ON users (lower(username))"))
+        conn.commit()
+        print("✅ Миграция успешно выполнена!")
+
+if __name__ == "__main__":
+    run_migration()
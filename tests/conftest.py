@@ -0,0 +1,140 @@
+import os
+import re
+import sys
+import tempfile
+
+import pytest
+
+
+# Окружение задаётся до импорта приложения: движок БД и токены читаются при импорте,
+# а load_dotenv() не перетирает уже заданные переменные
+_TMP_DIR = tempfile.mkdtemp(prefix="foodbot-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(_TMP_DIR, 'test.db')}",
+    "BOT_TOKEN": "",
+    "WEBAPP_URL": "",
+    "ADMIN_CHANNEL_ID": "",
+    "SMTP_USERNAME": "",
+    "SMTP_PASSWORD": "",
+    "SUPER_ADMIN_IDS": "1",
+    "SQL_STATS_ENABLED": "true",
+    # тесты ходят с X-Telegram-User-Id; подписанный путь проверяется в test_auth
+    "WEBAPP_ALLOW_UNSIGNED": "true",
+    "LOG_LEVEL": "WARNING",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+
+SUPER_ADMIN_ID = 1
+_SERVER_TIMING_QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as c:
+        yield c
+
+
+def query_count(response) -> int:
+    """Число SQL-запросов, выполненных обработчиком (из заголовка Server-Timing)"""
+    match = _SERVER_TIMING_QUERIES.search(response.headers.get("server-timing", ""))
+    assert match, f"no Server-Timing db metric in {response.headers!r}"
+    return int(match.group(1))
+
+
+_USER_SEQ = [10_000]
+
+
+def _next_user_id() -> int:
+    _USER_SEQ[0] += 1
+    return _USER_SEQ[0]
+
+
+def seed_dataset(scale: int) -> dict:
+    """Ресторан с меню, клиент с корзиной и заказами, админ ресторана и подборка; всё в `scale` строк"""
+    from app.db import get_session
+    from app.models import (
+        Cart, CartItem, Category, Collection, CollectionItem, Dish, Option, OptionGroup,
+        Order, OrderItem, Restaurant, User,
+    )
+    from app.store import bind_restaurant_admin
+
+    with get_session() as db:
+        restaurant = Restaurant(name=f"R{scale}", delivery_min_sum=0, delivery_fee=100, email="")
+        db.add(restaurant)
+        db.flush()
+        categories = [Category(restaurant_id=restaurant.id, name=f"C{i}", sort=i) for i in range(scale)]
+        db.add_all(categories)
+        db.flush()
+        dishes = [
+            Dish(restaurant_id=restaurant.id, category_id=categories[i % scale].id, name=f"D{i}", price=100 + i, has_options=True)
+            for i in range(scale)
+        ]
+        db.add_all(dishes)
+        db.flush()
+        groups = [OptionGroup(dish_id=d.id, name="Размер", min_select=1, max_select=1, required=True) for d in dishes]
+        db.add_all(groups)
+        db.flush()
+        options = []
+        for g in groups:
+            options += [Option(group_id=g.id, name="S", price_delta=0), Option(group_id=g.id, name="L", price_delta=50)]
+        db.add_all(options)
+        db.flush()
+
+        customer = User(id=_next_user_id())
+        ra_admin = User(id=_next_user_id())
+        db.add_all([customer, ra_admin])
+        db.flush()
+        cart = Cart(user_id=customer.id, cutlery_count=1)
+        db.add(cart)
+        db.flush()
+        db.add_all([
+            CartItem(
+                cart_id=cart.id, restaurant_id=restaurant.id, dish_id=d.id, qty=1,
+                chosen_options=f"[{options[2 * i].id}]", options_key=str(options[2 * i].id),
+            )
+            for i, d in enumerate(dishes)
+        ])
+        orders = [
+            Order(user_id=customer.id, restaurant_id=restaurant.id, total_price=300, phone="+70000000000")
+            for _ in range(scale)
+        ]
+        db.add_all(orders)
+        db.flush()
+        db.add_all([
+            OrderItem(order_id=o.id, dish_id=dishes[k % scale].id, name=f"D{k}", price=100, qty=1)
+            for o in orders for k in range(3)
+        ])
+        collection = Collection(name=f"Подборка {scale}", is_enabled=True)
+        db.add(collection)
+        db.flush()
+        db.add_all([
+            CollectionItem(
+                collection_id=collection.id,
+                item_type="restaurant" if i % 2 else "dish",
+                item_id=restaurant.id if i % 2 else dishes[i % scale].id,
+                title=f"I{i}",
+            )
+            for i in range(scale)
+        ])
+        db.commit()
+        data = {
+            "restaurant_id": restaurant.id,
+            "customer_id": customer.id,
+            "ra_admin_id": ra_admin.id,
+            "dish_ids": [d.id for d in dishes],
+            "option_ids": [o.id for o in options],
+            "order_ids": [o.id for o in orders],
+        }
+    bind_restaurant_admin(data["ra_admin_id"], data["restaurant_id"])
+    return data
+
+
+@pytest.fixture(scope="session")
+def datasets(client) -> dict:
+    """Один и тот же набор данных в малом и большом масштабе"""
+    return {"small": seed_dataset(3), "large": seed_dataset(60)}
@@ -0,0 +1,99 @@
+"""Вход через initData Telegram WebApp и подписанные сессионные токены."""
+
+import hashlib
+import hmac
+import json
+import time
+from urllib.parse import urlencode
+
+import pytest
+
+from app.deps import auth
+
+_BOT_TOKEN = "123456:test-token"
+
+
+def _init_data(user_id: int = 777, auth_date: int | None = None, **extra) -> str:
+    fields = {"auth_date": str(auth_date or int(time.time())), "query_id": "q1", "user": json.dumps({"id": user_id, "username": "u"}), **extra}
+    check_string = "\n".join(f"{k}={fields[k]}" for k in sorted(fields))
+    secret_key = hmac.new(b"WebAppData", _BOT_TOKEN.encode(), hashlib.sha256).digest()
+    fields["hash"] = hmac.new(secret_key, check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+
+@pytest.fixture
+def bot_token(monkeypatch):
+    monkeypatch.setattr(auth, "BOT_TOKEN", _BOT_TOKEN)
+
+
+def test_valid_init_data(bot_token):
+    data = auth.verify_init_data(_init_data(user_id=777))
+    assert data["user"]["id"] == 777
+
+
+def test_tampered_init_data_is_rejected(bot_token):
+    forged = _init_data(user_id=777).replace("%22id%22%3A+777", "%22id%22%3A+1")
+    assert forged != _init_data(user_id=777)
+    with pytest.raises(ValueError, match="bad signature"):
+        auth.verify_init_data(forged)
+    with pytest.raises(ValueError, match="bad signature"):
+        auth.verify_init_data(_init_data().split("&hash=")[0])
+
+
+def test_expired_init_data_is_rejected(bot_token):
+    old = _init_data(auth_date=int(time.time()) - 3600)
+    with pytest.raises(ValueError, match="expired"):
+        auth.verify_init_data(old, max_age=60)
+    assert auth.verify_init_data(old, max_age=7200)["user"]["id"] == 777
+
+
+def test_session_token_roundtrip():
+    token, exp = auth.issue_session_token(4242)
+    assert exp > time.time()
+    assert auth.verify_session_token(token) == 4242
+
+
+def test_session_token_rejects_forgery_and_expiry():
+    token, _ = auth.issue_session_token(4243)
+    uid, exp, sig = token.split(".")
+    # чужой user_id с той же подписью и подпись, сделанная не нашим ключом
+    assert auth.verify_session_token(f"4244.{exp}.{sig}") is None
+    assert auth.verify_session_token(f"{uid}.{exp}.{'0' * len(sig)}") is None
+    assert auth.verify_session_token("garbage") is None
+    expired, _ = auth.issue_session_token(4245, ttl=-1)
+    assert auth.verify_session_token(expired) is None
+
+
+def test_webapp_login_issues_usable_token(client, bot_token):
+    response = client.post("/api/auth/webapp", json={"init_data": _init_data(user_id=778)})
+    assert response.status_code == 200, response.text
+    token = response.json()["token"]
+
+    assert client.get("/api/cart", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+    assert client.get("/api/cart", headers={"Authorization": "Bearer 1.2.3"}).status_code == 401
+    assert client.post("/api/auth/webapp", json={"init_data": "user=%7B%7D&hash=x"}).status_code == 401
+
+
+def test_unsigned_user_id_is_rejected_by_default(client, bot_token, monkeypatch):
+    monkeypatch.setattr(auth, "WEBAPP_ALLOW_UNSIGNED", False)
+    token = client.post("/api/auth/webapp", json={"init_data": _init_data(user_id=779)}).json()["token"]
+
+    assert client.get("/api/cart", headers={"X-Telegram-User-Id": "779"}).status_code == 401
+    assert client.get("/api/cart", params={"uid": 779}).status_code == 401
+    # бот ходит от имени пользователя с токеном сервиса
+    assert client.get("/api/cart", headers={"X-Telegram-User-Id": "779", "X-Internal-Token": auth.INTERNAL_API_TOKEN}).status_code == 200
+    # заголовок с чужим id не перебивает токен
+    response = client.get("/api/users/me", headers={"Authorization": f"Bearer {token}", "X-Telegram-User-Id": "1"})
+    assert response.status_code == 200 and response.json()["id"] == 779
+
+
+def test_internal_resolver_needs_service_token(client):
+    from app.store import ensure_user
+
+    ensure_user(780, "InternalUser")
+    params = {"username": "@internaluser"}
+    assert client.get("/api/internal/resolve-username", params=params).status_code == 403
+    # id супер-админа в заголовке не заменяет токен сервиса
+    assert client.get("/api/internal/resolve-username", params=params, headers={"X-Telegram-User-Id": "1"}).status_code == 403
+    response = client.get("/api/internal/resolve-username", params=params, headers={"X-Internal-Token": auth.INTERNAL_API_TOKEN})
+    assert response.status_code == 200 and response.json() == {"user_id": 780}
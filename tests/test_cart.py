@@ -0,0 +1,166 @@
+"""Поведение корзины поверх кэшей: правила опций и набор ресторанов должны следовать за изменениями."""
+
+from conftest import seed_dataset
+
+
+def _uid(user_id: int) -> dict:
+    return {"X-Telegram-User-Id": str(user_id)}
+
+
+def test_option_rules_follow_ra_menu_changes(client):
+    d = seed_dataset(2)
+    customer, ra_admin = _uid(d["customer_id"]), _uid(d["ra_admin_id"])
+    item = {"restaurant_id": d["restaurant_id"], "dish_id": d["dish_ids"][0], "qty": 1, "chosen_options": [d["option_ids"][0]]}
+
+    assert client.post("/api/cart/items", headers=customer, json=item).json()["status"] == "ok"
+
+    group = client.post("/api/ra/option-groups", headers=ra_admin, json={
+        "dish_id": d["dish_ids"][0], "name": "Соус", "min_select": 1, "max_select": 1, "required": True,
+    }).json()
+    rejected = client.post("/api/cart/items", headers=customer, json=item)
+    assert rejected.status_code == 400
+    assert rejected.json()["detail"] == {"status": "options_required", "group_id": group["id"]}
+
+    option = client.post("/api/ra/options", headers=ra_admin, json={"group_id": group["id"], "name": "Чесночный", "price_delta": 0}).json()
+    item["chosen_options"] = [d["option_ids"][0], option["id"]]
+    assert client.post("/api/cart/items", headers=customer, json=item).json()["status"] == "ok"
+
+    client.delete(f"/api/ra/option-groups/{group['id']}", headers=ra_admin)
+    item["chosen_options"] = [d["option_ids"][0]]
+    assert client.post("/api/cart/items", headers=customer, json=item).json()["status"] == "ok"
+
+
+def test_unknown_dish_is_rejected(client):
+    d = seed_dataset(1)
+    response = client.post("/api/cart/items", headers=_uid(d["customer_id"]), json={
+        "restaurant_id": d["restaurant_id"], "dish_id": 987654, "qty": 1, "chosen_options": [],
+    })
+    assert response.status_code == 404
+
+
+def test_dishes_of_deleted_category_are_rejected(client):
+    from app.db import get_session
+    from app.services.dish_options import get_dish_rules
+
+    d = seed_dataset(1)
+    ra_admin = _uid(d["ra_admin_id"])
+    category_id = client.post("/api/ra/categories", headers=ra_admin, json={"name": "Сезонное"}).json()["id"]
+    dish_id = client.post("/api/ra/dishes", headers=ra_admin, json={"category_id": category_id, "name": "Окрошка", "price": 300}).json()["id"]
+    with get_session() as db:
+        assert get_dish_rules(dish_id, db) is not None
+
+    assert client.delete(f"/api/ra/categories/{category_id}", headers=ra_admin).json()["status"] == "ok"
+    response = client.post("/api/cart/items", headers=_uid(d["customer_id"]), json={
+        "restaurant_id": d["restaurant_id"], "dish_id": dish_id, "qty": 1, "chosen_options": [],
+    })
+    assert response.status_code == 404
+
+
+def test_batch_applies_all_ops_in_one_request(client):
+    d = seed_dataset(2)
+    customer = _uid(d["customer_id"])
+    before = client.get("/api/cart", headers=customer).json()["items"]
+    first, second = before[0]["id"], before[1]["id"]
+
+    response = client.post("/api/cart/batch", headers=customer, json={"ops": [
+        {"op": "update", "item_id": first, "qty": 5},
+        {"op": "delete", "item_id": second},
+        {"op": "add", "restaurant_id": d["restaurant_id"], "dish_id": d["dish_ids"][1], "qty": 2, "chosen_options": [d["option_ids"][3]]},
+    ]})
+    body = response.json()
+
+    assert body["status"] == "ok"
+    assert [(it["id"] == first, it["qty"]) for it in body["items"]] == [(True, 5), (False, 2)]
+    assert client.get("/api/cart", headers=customer).json()["items"] == body["items"]
+
+
+def test_batch_is_atomic_on_invalid_op(client):
+    d = seed_dataset(2)
+    customer = _uid(d["customer_id"])
+    before = client.get("/api/cart", headers=customer).json()["items"]
+
+    response = client.post("/api/cart/batch", headers=customer, json={"ops": [
+        {"op": "update", "item_id": before[0]["id"], "qty": 9},
+        {"op": "add", "restaurant_id": d["restaurant_id"], "dish_id": d["dish_ids"][0], "qty": 1, "chosen_options": []},
+    ]})
+
+    assert response.status_code == 400
+    assert response.json()["detail"]["index"] == 1
+    assert client.get("/api/cart", headers=customer).json()["items"] == before
+
+
+def test_batch_applies_restaurant_limit(client):
+    shops = [seed_dataset(1) for _ in range(5)]
+    customer = _uid(shops[0]["customer_id"])
+    client.post("/api/cart/clear", headers=customer)
+    ops = [
+        {"op": "add", "restaurant_id": s["restaurant_id"], "dish_id": s["dish_ids"][0], "qty": 1, "chosen_options": [s["option_ids"][0]]}
+        for s in shops
+    ]
+
+    rejected = client.post("/api/cart/batch", headers=customer, json={"ops": ops}).json()
+    assert rejected["status"] == "too_many_restaurants" and rejected["index"] == 4
+    assert client.get("/api/cart", headers=customer).json()["items"] == []
+
+    forced = client.post("/api/cart/batch", params={"force": "true"}, headers=customer, json={"ops": ops}).json()
+    assert forced["status"] == "ok"
+    assert [it["restaurant_id"] for it in forced["items"]] == [shops[4]["restaurant_id"]]
+
+
+def test_identical_lines_are_merged(client):
+    d = seed_dataset(2)
+    customer = _uid(d["customer_id"])
+    client.post("/api/cart/clear", headers=customer)
+    item = {"restaurant_id": d["restaurant_id"], "dish_id": d["dish_ids"][0], "qty": 1}
+
+    first = client.post("/api/cart/items", headers=customer, json={**item, "chosen_options": [d["option_ids"][0]]}).json()
+    again = client.post("/api/cart/items", headers=customer, json={**item, "qty": 2, "chosen_options": [d["option_ids"][0], d["option_ids"][0]]}).json()
+    assert again["id"] == first["id"]
+    client.post("/api/cart/batch", headers=customer, json={"ops": [
+        {"op": "add", **item, "chosen_options": [d["option_ids"][0]]},
+        {"op": "add", **item, "qty": 1, "chosen_options": [d["option_ids"][0]]},
+    ]})
+
+    items = client.get("/api/cart", headers=customer).json()["items"]
+    assert [(it["id"], it["qty"]) for it in items] == [(first["id"], 5)]
+
+
+def test_priced_cart_totals(client):
+    d = seed_dataset(2)
+    customer = _uid(d["customer_id"])
+    client.post("/api/cart/clear", headers=customer)
+    client.post("/api/cart/items", headers=customer, json={
+        "restaurant_id": d["restaurant_id"], "dish_id": d["dish_ids"][1], "qty": 2, "chosen_options": [d["option_ids"][3]],
+    })
+
+    priced = client.get("/api/cart/priced", headers=customer).json()
+
+    [restaurant] = priced["restaurants"]
+    [line] = restaurant["items"]
+    assert [o["name"] for o in line["options"]] == ["L"]
+    assert (line["price"], line["unit_price"], line["line_total"]) == (101, 151, 302)
+    assert (restaurant["subtotal"], restaurant["delivery_fee"], restaurant["total"]) == (302, 100, 402)
+    assert restaurant["min_sum_shortfall"] == 0
+
+
+def test_cleanup_expires_abandoned_carts_and_orphan_items(client):
+    import asyncio
+    from datetime import datetime, timedelta
+
+    from app.db import get_session
+    from app.models import Cart, CartItem
+    from app.services.cart_cleanup import cleanup_carts
+
+    abandoned, active = seed_dataset(1), seed_dataset(1)
+    client.get("/api/cart", headers=_uid(abandoned["customer_id"]))
+    with get_session() as db:
+        db.query(Cart).filter(Cart.user_id == abandoned["customer_id"]).update({Cart.updated_at: datetime.utcnow() - timedelta(days=90)})
+        cart_id = db.query(Cart.id).filter(Cart.user_id == active["customer_id"]).scalar()
+        db.add(CartItem(cart_id=cart_id, restaurant_id=active["restaurant_id"], dish_id=987654, qty=1, options_key=""))
+        db.commit()
+
+    result = asyncio.run(cleanup_carts())
+
+    assert result["expired_carts"] >= 1 and result["orphan_items"] >= 1
+    assert client.get("/api/cart", headers=_uid(abandoned["customer_id"])).json()["items"] == []
+    assert [it["dish_id"] for it in client.get("/api/cart", headers=_uid(active["customer_id"])).json()["items"]] == active["dish_ids"]
@@ -0,0 +1,102 @@
+"""Снимок меню: отдаётся из кэша с ETag и следует за правками из ra_menu."""
+
+from conftest import seed_dataset
+
+
+def _uid(user_id: int) -> dict:
+    return {"X-Telegram-User-Id": str(user_id)}
+
+
+def test_menu_revalidates_with_etag(client):
+    d = seed_dataset(2)
+    url = f"/api/restaurants/{d['restaurant_id']}/menu"
+    first = client.get(url)
+    etag = first.headers["etag"]
+
+    cached = client.get(url, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert client.get(url, headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+    assert client.get(url).content == first.content
+
+
+def test_menu_follows_ra_edits(client):
+    d = seed_dataset(2)
+    url = f"/api/restaurants/{d['restaurant_id']}/menu"
+    before = client.get(url)
+
+    client.patch(f"/api/ra/dishes/{d['dish_ids'][0]}", headers=_uid(d["ra_admin_id"]), json={"is_available": False})
+    after = client.get(url, headers={"If-None-Match": before.headers["etag"]})
+
+    assert after.status_code == 200
+    assert int(after.headers["x-menu-version"]) > int(before.headers["x-menu-version"])
+    dish = next(x for x in after.json()["dishes"] if x["id"] == d["dish_ids"][0])
+    assert dish["is_available"] is False
+    ra_view = client.get("/api/ra/menu", headers=_uid(d["ra_admin_id"]))
+    assert ra_view.content == after.content
+
+
+def test_menu_include_options_matches_per_dish_endpoint(client):
+    d = seed_dataset(3)
+    menu = client.get(f"/api/restaurants/{d['restaurant_id']}/menu?include=options").json()
+    plain = client.get(f"/api/restaurants/{d['restaurant_id']}/menu").json()
+
+    assert {k: menu[k] for k in ("version", "categories", "dishes")} == plain
+    for dish_id in d["dish_ids"]:
+        per_dish = client.get(f"/api/dishes/{dish_id}/options").json()
+        groups = [g for g in menu["groups"] if g["dish_id"] == dish_id]
+        group_ids = {g["id"] for g in groups}
+        assert groups == per_dish["groups"]
+        assert [o for o in menu["options"] if o["group_id"] in group_ids] == per_dish["options"]
+    assert client.get(f"/api/restaurants/{d['restaurant_id']}/menu?include=reviews").status_code == 400
+
+
+def test_menu_options_follow_ra_edits(client):
+    d = seed_dataset(1)
+    url = f"/api/restaurants/{d['restaurant_id']}/menu?include=options"
+    client.get(url)
+
+    client.patch(f"/api/ra/options/{d['option_ids'][1]}", headers=_uid(d["ra_admin_id"]), json={"price_delta": 70})
+
+    option = next(o for o in client.get(url).json()["options"] if o["id"] == d["option_ids"][1])
+    assert option["price_delta"] == 70
+
+
+def test_menu_changes_return_only_edits_since_version(client):
+    d = seed_dataset(3)
+    ra_admin = _uid(d["ra_admin_id"])
+    base = client.get(f"/api/restaurants/{d['restaurant_id']}/menu?include=options").json()
+    changes_url = f"/api/restaurants/{d['restaurant_id']}/menu/changes"
+
+    client.patch(f"/api/ra/dishes/{d['dish_ids'][0]}", headers=ra_admin, json={"is_available": False})
+    client.delete(f"/api/ra/options/{d['option_ids'][5]}", headers=ra_admin)
+    delta = client.get(changes_url, params={"since": base["version"]}).json()
+
+    assert delta["full"] is False
+    assert delta["version"] == base["version"] + 2
+    assert [(x["id"], x["is_available"]) for x in delta["dishes"]] == [(d["dish_ids"][0], False)]
+    assert delta["deleted"]["options"] == [d["option_ids"][5]]
+    assert delta["categories"] == delta["groups"] == delta["options"] == []
+
+    unchanged = client.get(changes_url, params={"since": delta["version"]}).json()
+    assert unchanged["full"] is False and unchanged["dishes"] == []
+
+
+def test_menu_changes_fall_back_to_full_snapshot(client):
+    import asyncio
+    from datetime import datetime, timedelta
+
+    from app.services.menu_changes import prune_menu_changes
+
+    d = seed_dataset(2)
+    changes_url = f"/api/restaurants/{d['restaurant_id']}/menu/changes"
+    client.patch(f"/api/ra/dishes/{d['dish_ids'][1]}", headers=_uid(d["ra_admin_id"]), json={"price": 990})
+    assert client.get(changes_url, params={"since": 0}).json()["full"] is False
+
+    asyncio.run(prune_menu_changes(now=datetime.utcnow() + timedelta(days=365)))
+    full = client.get(changes_url, params={"since": 0}).json()
+
+    assert full["full"] is True
+    assert full["version"] == 1
+    assert {x["id"] for x in full["dishes"]} == set(d["dish_ids"])
+    assert "groups" in full and "options" in full
@@ -0,0 +1,192 @@
+"""
+Бюджет SQL-запросов на эндпоинт.
+
+Каждый эндпоинт вызывается на малом и большом наборе данных (или до и после роста таблиц):
+число запросов должно совпадать и не превышать бюджет. Регресс в N+1 роняет тест.
+"""
+
+import pytest
+
+from conftest import SUPER_ADMIN_ID, query_count, seed_dataset
+
+
+def _uid(user_id: int) -> dict:
+    return {"X-Telegram-User-Id": str(user_id)}
+
+
+def _assert_budget(counts: dict, budget: int) -> None:
+    assert counts["small"] == counts["large"], f"query count grows with data: {counts}"
+    assert counts["large"] <= budget, f"query budget exceeded: {counts} > {budget}"
+
+
+def _per_dataset(datasets: dict, call, warm: bool = False) -> dict:
+    counts = {}
+    for name, data in datasets.items():
+        if warm:
+            # меряем установившийся режим: in-memory кэши уже прогреты
+            call(data)
+        response = call(data)
+        assert response.status_code == 200, response.text
+        counts[name] = query_count(response)
+    return counts
+
+
+def _before_and_after_growth(call) -> dict:
+    before = call()
+    assert before.status_code == 200, before.text
+    seed_dataset(40)
+    after = call()
+    assert after.status_code == 200, after.text
+    return {"small": query_count(before), "large": query_count(after)}
+
+
+def test_restaurant_list(client, datasets):
+    counts = _before_and_after_growth(lambda: client.get("/api/restaurants"))
+    _assert_budget(counts, 1)
+
+
+def test_menu(client, datasets):
+    counts = _per_dataset(datasets, lambda d: client.get(f"/api/restaurants/{d['restaurant_id']}/menu"))
+    _assert_budget(counts, 2)
+
+
+def test_menu_with_options(client, datasets):
+    # категории, блюда, группы и опции — по одному запросу на сущность
+    counts = _per_dataset(datasets, lambda d: client.get(f"/api/restaurants/{d['restaurant_id']}/menu?include=options"))
+    _assert_budget(counts, 4)
+
+
+def test_menu_cached(client, datasets):
+    # прогретый снимок отдаётся без обращения к БД
+    counts = _per_dataset(datasets, lambda d: client.get(f"/api/restaurants/{d['restaurant_id']}/menu"), warm=True)
+    _assert_budget(counts, 0)
+
+
+def test_menu_changes(client, datasets):
+    def changes(d):
+        version = client.get(f"/api/restaurants/{d['restaurant_id']}/menu").json()["version"]
+        client.patch(f"/api/ra/dishes/{d['dish_ids'][1]}", headers=_uid(d["ra_admin_id"]), json={"price": 556})
+        return client.get(f"/api/restaurants/{d['restaurant_id']}/menu/changes", params={"since": version})
+
+    # версия, журнал после неё и по запросу на каждый вид изменённых сущностей (здесь только блюда)
+    counts = _per_dataset(datasets, changes)
+    _assert_budget(counts, 3)
+
+
+def test_search(client, datasets):
+    # индекс в памяти; БД нужна только для сборки, которую прогрев уже сделал
+    counts = _per_dataset(datasets, lambda d: client.get("/api/search", params={"q": "D0"}), warm=True)
+    _assert_budget(counts, 0)
+
+
+def test_cart_get(client, datasets):
+    counts = _per_dataset(datasets, lambda d: client.get("/api/cart", headers=_uid(d["customer_id"])))
+    _assert_budget(counts, 1)
+
+
+def test_cart_priced(client, datasets):
+    # корзина, блюда с ресторанами и опции — по одному запросу
+    counts = _per_dataset(datasets, lambda d: client.get("/api/cart/priced", headers=_uid(d["customer_id"])))
+    _assert_budget(counts, 3)
+
+
+def test_cart_add(client, datasets):
+    def add(d):
+        return client.post("/api/cart/items", headers=_uid(d["customer_id"]), json={
+            "restaurant_id": d["restaurant_id"],
+            "dish_id": d["dish_ids"][0],
+            "qty": 1,
+            "chosen_options": [d["option_ids"][1]],
+        })
+
+    # корзина и правила опций блюда берутся из кэша; остаётся только INSERT
+    counts = _per_dataset(datasets, add, warm=True)
+    _assert_budget(counts, 1)
+
+
+def test_cart_batch(client, datasets):
+    def batch(d):
+        items = client.get("/api/cart", headers=_uid(d["customer_id"])).json()["items"]
+        return client.post("/api/cart/batch", headers=_uid(d["customer_id"]), json={"ops": [
+            {"op": "update", "item_id": items[0]["id"], "qty": 2},
+            {"op": "update", "item_id": items[1]["id"], "qty": 3},
+            {"op": "add", "restaurant_id": d["restaurant_id"], "dish_id": d["dish_ids"][2], "qty": 1, "chosen_options": [d["option_ids"][4]]},
+        ]})
+
+    # корзина с позициями одним запросом, затем UPDATE и INSERT пакетами
+    counts = _per_dataset(datasets, batch, warm=True)
+    _assert_budget(counts, 3)
+
+
+def test_order_create(client, datasets):
+    def create(d):
+        items = [
+            {"dish_id": dish_id, "name": f"D{dish_id}", "price": 100, "qty": 1, "chosen_options": [d["option_ids"][2 * i]]}
+            for i, dish_id in enumerate(d["dish_ids"])
+        ]
+        return client.post("/api/orders", json={
+            "user_id": d["customer_id"],
+            "restaurant_id": d["restaurant_id"],
+            "total_price": 100 * len(items),
+            "delivery_type": "delivery",
+            "address": "ул. Тестовая, 1",
+            "phone": "+70000000000",
+            "payment_method": "cash",
+            "items": items,
+        })
+
+    counts = _per_dataset(datasets, create)
+    _assert_budget(counts, 5)
+
+
+def test_order_get(client, datasets):
+    counts = _per_dataset(datasets, lambda d: client.get(f"/api/orders/{d['order_ids'][-1]}"))
+    _assert_budget(counts, 2)
+
+
+def test_order_list(client, datasets):
+    counts = _per_dataset(datasets, lambda d: client.get("/api/orders", params={"user_id": d["customer_id"]}))
+    _assert_budget(counts, 2)
+
+
+def test_public_collections(client, datasets):
+    counts = _before_and_after_growth(lambda: client.get("/api/public/collections"))
+    _assert_budget(counts, 4)
+
+
+def test_ra_order_list(client, datasets):
+    counts = _per_dataset(datasets, lambda d: client.get("/api/ra/orders", headers=_uid(d["ra_admin_id"])), warm=True)
+    _assert_budget(counts, 2)
+
+
+def test_order_items_query_does_not_bind_every_order_id(client, datasets):
+    from sqlalchemy import event
+
+    from app.db import engine
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "FROM order_items" in statement:
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        for d in datasets.values():
+            response = client.get("/api/ra/orders", headers=_uid(d["ra_admin_id"]))
+            assert response.status_code == 200, response.text
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    # позиции выбираются подзапросом по тому же фильтру: текст запроса не зависит от числа заказов
+    assert len(statements) == 2 and statements[0] == statements[1]
+    assert "SELECT orders.id" in statements[0]
+
+
+@pytest.mark.parametrize("path, budget", [
+    ("/api/admin/stats", 1),
+    ("/api/admin/stats/users", 6),
+    ("/api/admin/stats/restaurants", 1),
+])
+def test_admin_stats(client, datasets, path, budget):
+    counts = _before_and_after_growth(lambda: client.get(path, headers=_uid(SUPER_ADMIN_ID)))
+    _assert_budget(counts, budget)
@@ -0,0 +1,78 @@
+"""Поиск по блюдам и ресторанам: префиксы, опечатки, ранжирование по полю и доступности."""
+
+import time
+
+from conftest import seed_dataset
+
+
+def _uid(user_id: int) -> dict:
+    return {"X-Telegram-User-Id": str(user_id)}
+
+
+def _seed_menu(client) -> dict:
+    d = seed_dataset(1)
+    ra_admin = _uid(d["ra_admin_id"])
+    category = client.post("/api/ra/categories", headers=ra_admin, json={"name": "Пицца", "sort": 0}).json()["id"]
+    dishes = {}
+    for name, description, available in [
+        ("Пицца Маргарита", "Томаты, моцарелла, базилик", True),
+        ("Пицца Маргарита большая", "Томаты и моцарелла", False),
+        ("Кальцоне", "Закрытая пицца с ветчиной", True),
+    ]:
+        dishes[name] = client.post("/api/ra/dishes", headers=ra_admin, json={
+            "category_id": category, "name": name, "description": description, "price": 500, "is_available": available,
+        }).json()["id"]
+    d["dishes"] = dishes
+    return d
+
+
+def _wait_for_rebuild(timeout: float = 10.0) -> None:
+    from app.services.search_index import search_index
+
+    deadline = time.monotonic() + timeout
+    while search_index._rebuild_task is not None and not search_index._rebuild_task.done():
+        assert time.monotonic() < deadline, "search index rebuild did not finish"
+        time.sleep(0.01)
+
+
+def _search(client, q: str, restaurant_id: int, **params) -> list:
+    """Выдача в пределах одного ресторана (в общей БД тестов есть и демо-меню).
+
+    Индекс не пересобирается вручную: первый запрос после правки отвечает по старому индексу и запускает
+    фоновую пересборку (её включает mark_stale в ra_menu/ra), второй — уже по новому.
+    """
+    params = {"q": q, "limit": 50, **params}
+    assert client.get("/api/search", params=params).status_code == 200
+    _wait_for_rebuild()
+    response = client.get("/api/search", params=params)
+    assert response.status_code == 200, response.text
+    return [r for r in response.json()["results"] if r.get("restaurant_id", r["id"]) == restaurant_id]
+
+
+def test_search_prefix_typo_and_ranking(client):
+    d = _seed_menu(client)
+    margherita, large, calzone = d["dishes"]["Пицца Маргарита"], d["dishes"]["Пицца Маргарита большая"], d["dishes"]["Кальцоне"]
+    rid = d["restaurant_id"]
+
+    # автодополнение по началу слова; недоступное блюдо ниже доступного
+    assert [r["id"] for r in _search(client, "маргар", rid, type="dish")][:2] == [margherita, large]
+    # опечатка
+    assert _search(client, "маргарта", rid, type="dish")[0]["id"] == margherita
+    # совпадение в названии важнее совпадения в описании
+    ids = [r["id"] for r in _search(client, "пицца", rid, type="dish")]
+    assert ids.index(margherita) < ids.index(calzone)
+    # все слова запроса должны найтись
+    assert [r["id"] for r in _search(client, "кальцоне ветчина", rid, type="dish")] == [calzone]
+    assert _search(client, "кальцоне ананас", rid) == []
+
+
+def test_search_follows_menu_and_restaurant_edits(client):
+    d = _seed_menu(client)
+    ra_admin = _uid(d["ra_admin_id"])
+    calzone = d["dishes"]["Кальцоне"]
+
+    client.patch(f"/api/ra/dishes/{calzone}", headers=ra_admin, json={"name": "Стромболи"})
+    assert [r["id"] for r in _search(client, "стромболи", d["restaurant_id"])] == [calzone]
+
+    client.post("/api/ra/restaurant/status", headers=ra_admin, params={"enabled": False})
+    assert _search(client, "стромболи", d["restaurant_id"]) == []
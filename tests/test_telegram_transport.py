@@ -0,0 +1,56 @@
+"""Транспорт Bot API: долгий retry_after не теряет сообщение, заказ не ждёт уведомлений."""
+
+import asyncio
+import time
+
+import httpx
+
+from conftest import seed_dataset
+
+
+def test_long_retry_after_is_rescheduled(monkeypatch):
+    from app.services import telegram_transport
+    from app.services.telegram_transport import TelegramTransport
+
+    monkeypatch.setattr(telegram_transport, "TG_MAX_RETRY_AFTER", 0.05)
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            return httpx.Response(429, json={"ok": False, "parameters": {"retry_after": 0.2}})
+        return httpx.Response(200, json={"ok": True, "result": {}})
+
+    async def scenario() -> None:
+        transport = TelegramTransport(token="123:test")
+        transport._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        result = await transport.call("sendMessage", {"chat_id": 42, "text": "hi"})
+        assert result.queued and not result.ok
+        await asyncio.wait_for(asyncio.gather(*transport._delayed), timeout=5)
+        assert transport.stats.ok == 1 and transport.stats.rescheduled == 1
+        await transport.aclose()
+
+    asyncio.run(scenario())
+    assert len(calls) == 2 and calls[1] - calls[0] >= 0.2
+
+
+def test_order_does_not_wait_for_notifications(client, monkeypatch):
+    from app.routers import orders
+
+    sent = []
+
+    async def slow_notify(*args, **kwargs):
+        await asyncio.sleep(2)
+        sent.append(args)
+
+    monkeypatch.setattr(orders, "_notify_order_created", slow_notify)
+    d = seed_dataset(1)
+    started = time.perf_counter()
+    response = client.post("/api/orders", json={
+        "user_id": d["customer_id"], "restaurant_id": d["restaurant_id"], "total_price": 300,
+        "delivery_type": "pickup", "phone": "+70000000000", "payment_method": "cash",
+        "items": [{"dish_id": d["dish_ids"][0], "name": "D0", "price": 100, "qty": 1}],
+    })
+    assert response.status_code == 200, response.text
+    assert time.perf_counter() - started < 1.5
+    assert sent == []
@@ -0,0 +1,42 @@
+"""Обезличивание трасс: идентификаторы пользователей и PII не попадают в запись как есть."""
+
+from app.traffic_capture import hash_value, pseudonym_id, sanitize
+
+
+def test_pii_and_user_ids_are_replaced():
+    body = {
+        "user_id": 123456,
+        "restaurant_id": 7,
+        "phone": "+79991234567",
+        "address": "ул. Ленина, 1",
+        "items": [{"dish_id": 5, "name": "Борщ", "qty": 2, "chosen_options": [1, 2]}],
+    }
+    clean = sanitize(body)
+
+    assert clean["user_id"] == pseudonym_id(123456) != 123456
+    assert clean["restaurant_id"] == 7
+    assert clean["phone"].startswith("h:") and "7999" not in clean["phone"]
+    assert clean["address"].startswith("h:")
+    # названия блюд остаются как есть — иначе записанные тела бесполезны для replay
+    assert clean["items"][0] == {"dish_id": 5, "name": "Борщ", "qty": 2, "chosen_options": [1, 2]}
+
+
+def test_free_text_fields_are_hashed():
+    body = {"client_comment": "позвонить +79991234567, код 42#", "staff_comment": "курьер опоздал", "text": "рассылка"}
+    clean = sanitize(body)
+
+    assert all(v.startswith("h:") for v in clean.values())
+    assert "7999" not in clean["client_comment"]
+    assert sanitize({"reason": ["нет продуктов"]}) == {"reason": [hash_value("нет продуктов")]}
+
+
+def test_name_is_hashed_outside_item_lists():
+    # имя клиента из профиля — PII; название блюда в позициях заказа остаётся
+    assert sanitize({"name": "Иван Петров"}) == {"name": hash_value("Иван Петров")}
+    clean = sanitize({"name": "Иван Петров", "items": [{"name": "Борщ", "qty": 1}]})
+    assert clean == {"name": hash_value("Иван Петров"), "items": [{"name": "Борщ", "qty": 1}]}
+
+
+def test_pseudonyms_are_stable_and_query_lists_sanitized():
+    assert pseudonym_id(42) == pseudonym_id("42")
+    assert sanitize({"uid": ["42"], "restaurant_id": ["3"]}) == {"uid": [pseudonym_id(42)], "restaurant_id": ["3"]}
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк уведомлений и рассылок против локального fake Telegram (tools/fake_telegram.py).
+
+Поднимает fake-сервер в том же процессе, временную SQLite-базу (DATABASE_URL из окружения
+игнорируется, другая база — только через --database-url), привязывает админов
+к ресторану и замеряет:
+  - notify: уведомления о новых заказах админам ресторана (notify_restaurant_admins)
+  - broadcast: последовательная рассылка пользователям, как в /api/admin/broadcast
+
+Пример:
+    python -m tools.bench_notifications --orders 200 --admins 3 --users 500 --latency-ms 40 --rate-429 0.02
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def _report(name: str, latencies: list[float], elapsed: float, messages: int) -> None:
+    print(
+        f"{name:<10} n={len(latencies):<6} elapsed={elapsed:7.2f}s  msg/s={messages / elapsed if elapsed else 0:8.1f}  "
+        f"p50={_percentile(latencies, 50) * 1000:7.1f}ms  p95={_percentile(latencies, 95) * 1000:7.1f}ms  "
+        f"p99={_percentile(latencies, 99) * 1000:7.1f}ms  mean={statistics.fmean(latencies) * 1000 if latencies else 0:7.1f}ms"
+    )
+
+
+async def _run(args: argparse.Namespace) -> None:
+    import uvicorn
+    from tools.fake_telegram import create_app, FakeConfig
+
+    fake_app = create_app(FakeConfig(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        rate_429=args.rate_429,
+        retry_after=args.retry_after,
+        rate_403=args.rate_403,
+    ))
+    server = uvicorn.Server(uvicorn.Config(fake_app, host="127.0.0.1", port=args.port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    # импортируем приложение только после настройки окружения
+    from app.db_init import init_db_and_seed
+    from app.store import bind_restaurant_admin, ensure_user
+    from app.services.telegram import notify_restaurant_admins
+    from app.services.telegram_transport import transport
+
+    init_db_and_seed()
+    admin_ids = [900000 + i for i in range(args.admins)]
+    for uid in admin_ids:
+        bind_restaurant_admin(uid, 1)
+    user_ids = [100000 + i for i in range(args.users)]
+    for uid in user_ids:
+        ensure_user(uid)
+
+    if args.orders:
+        sem = asyncio.Semaphore(args.concurrency)
+        latencies: list[float] = []
+
+        async def one(order_no: int) -> None:
+            async with sem:
+                started = time.perf_counter()
+                await notify_restaurant_admins(1, f"🆕 НОВЫЙ ЗАКАЗ №{order_no}", "📋 Обработать заказ", "https://example.test/ra.html")
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.orders)))
+        _report("notify", latencies, time.perf_counter() - started, args.orders * len(admin_ids))
+
+    if args.users:
+        latencies = []
+        started = time.perf_counter()
+        for uid in user_ids:
+            t0 = time.perf_counter()
+            await transport.call("sendMessage", {"chat_id": uid, "text": "Рассылка"}, queue_on_open=False)
+            latencies.append(time.perf_counter() - t0)
+        _report("broadcast", latencies, time.perf_counter() - started, len(user_ids))
+
+    print("transport:", transport.snapshot())
+    print("fake:", fake_app.state.fake.stats)
+    await transport.aclose()
+    server.should_exit = True
+    await server_task
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Notification/broadcast benchmark against fake Telegram")
+    parser.add_argument("--orders", type=int, default=100)
+    parser.add_argument("--admins", type=int, default=3)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--latency-jitter-ms", type=float, default=20)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--rate-403", type=float, default=0.0)
+    parser.add_argument(
+        "--database-url",
+        help="база для прогона (по умолчанию — временный SQLite); бенчмарк пишет в неё тестовые данные",
+    )
+    args = parser.parse_args()
+
+    # DATABASE_URL из окружения не наследуем: другая база — только явным --database-url
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        tmpdir = tempfile.mkdtemp(prefix="bench-tg-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    os.environ["TELEGRAM_API_BASE"] = f"http://127.0.0.1:{args.port}"
+    os.environ["BOT_TOKEN"] = os.environ.get("BENCH_BOT_TOKEN", "123456:fake-token")
+    os.environ.setdefault("ADMIN_DIGEST_WINDOW_SECONDS", "0")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Локальная замена Telegram Bot API для нагрузочных тестов без обращения к api.telegram.org.
+
+Поддерживает sendMessage, sendPhoto, sendVideo, getChat, getUpdates (и отвечает ok на
+прочие методы), записывает все вызовы и умеет внедрять задержку, 429 и 403.
+
+Запуск:
+    python -m tools.fake_telegram --port 8081 --latency-ms 50 --rate-429 0.05 --user alice=1001
+
+Приложение и бот направляются на него переменной окружения:
+    TELEGRAM_API_BASE=http://127.0.0.1:8081
+
+Управление во время работы:
+    GET  /_calls            — записанные вызовы (?method=sendMessage&limit=100)
+    DELETE /_calls          — очистить журнал
+    GET  /_stats            — счётчики по методам и внедрённым ошибкам
+    POST /_control          — изменить параметры (поля FakeConfig)
+    POST /_updates          — положить update в очередь getUpdates
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+class FakeConfig(BaseModel):
+    latency_ms: float = 0
+    latency_jitter_ms: float = 0
+    rate_429: float = 0.0
+    retry_after: int = 1
+    rate_403: float = 0.0
+    blocked_chat_ids: List[int] = []
+    users: Dict[str, int] = {}
+    max_calls: int = 100000
+
+
+class ControlPatch(BaseModel):
+    latency_ms: Optional[float] = None
+    latency_jitter_ms: Optional[float] = None
+    rate_429: Optional[float] = None
+    retry_after: Optional[int] = None
+    rate_403: Optional[float] = None
+    blocked_chat_ids: Optional[List[int]] = None
+    users: Optional[Dict[str, int]] = None
+
+
+SEND_METHODS = {"sendMessage", "sendPhoto", "sendVideo"}
+
+
+class FakeTelegram:
+    def __init__(self, config: FakeConfig) -> None:
+        self.config = config
+        self.calls: Deque[dict] = deque(maxlen=config.max_calls)
+        self.stats: Dict[str, int] = {}
+        self.updates: List[dict] = []
+        self._update_seq = 1
+        self._message_seq = 1
+        self._updates_event = asyncio.Event()
+
+    def _count(self, key: str) -> None:
+        self.stats[key] = self.stats.get(key, 0) + 1
+
+    def add_update(self, update: dict) -> dict:
+        update = dict(update)
+        update["update_id"] = self._update_seq
+        self._update_seq += 1
+        self.updates.append(update)
+        self._updates_event.set()
+        return update
+
+    async def handle(self, method: str, params: Dict[str, Any]) -> JSONResponse:
+        cfg = self.config
+        self._count(method)
+        self.calls.append({"ts": time.time(), "method": method, "params": params})
+        delay = cfg.latency_ms + (random.uniform(0, cfg.latency_jitter_ms) if cfg.latency_jitter_ms else 0)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000.0)
+        if cfg.rate_429 and random.random() < cfg.rate_429:
+            self._count("injected_429")
+            return JSONResponse(status_code=429, content={
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {cfg.retry_after}",
+                "parameters": {"retry_after": cfg.retry_after},
+            })
+        chat_id = params.get("chat_id")
+        if method in SEND_METHODS:
+            blocked = _as_int(chat_id) in cfg.blocked_chat_ids
+            if blocked or (cfg.rate_403 and random.random() < cfg.rate_403):
+                self._count("injected_403")
+                return JSONResponse(status_code=403, content={
+                    "ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user",
+                })
+            return _ok(self._message(method, chat_id, params))
+        if method == "getChat":
+            return self._get_chat(chat_id)
+        if method == "getUpdates":
+            return _ok(await self._get_updates(params))
+        if method == "getMe":
+            return _ok({"id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"})
+        return _ok(True)
+
+    def _message(self, method: str, chat_id: Any, params: Dict[str, Any]) -> dict:
+        msg = {
+            "message_id": self._message_seq,
+            "date": int(time.time()),
+            "chat": {"id": _as_int(chat_id) if _as_int(chat_id) is not None else chat_id, "type": "private"},
+        }
+        self._message_seq += 1
+        if method == "sendMessage":
+            msg["text"] = params.get("text", "")
+        else:
+            msg["caption"] = params.get("caption", "")
+        return msg
+
+    def _get_chat(self, chat_id: Any) -> JSONResponse:
+        key = str(chat_id or "")
+        if key.startswith("@"):
+            uid = self.config.users.get(key[1:].lower())
+            if uid is None:
+                return JSONResponse(status_code=400, content={
+                    "ok": False, "error_code": 400, "description": "Bad Request: chat not found",
+                })
+            return _ok({"id": uid, "type": "private", "username": key[1:]})
+        uid = _as_int(chat_id)
+        if uid is None:
+            return JSONResponse(status_code=400, content={
+                "ok": False, "error_code": 400, "description": "Bad Request: chat not found",
+            })
+        return _ok({"id": uid, "type": "private"})
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[dict]:
+        offset = _as_int(params.get("offset")) or 0
+        timeout = min(float(params.get("timeout") or 0), 30.0)
+        pending = [u for u in self.updates if u["update_id"] >= offset]
+        if not pending and timeout > 0:
+            self._updates_event.clear()
+            try:
+                await asyncio.wait_for(self._updates_event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            pending = [u for u in self.updates if u["update_id"] >= offset]
+        # подтверждённые offset'ом обновления больше не храним
+        self.updates = [u for u in self.updates if u["update_id"] >= offset]
+        return pending
+
+
+def _ok(result: Any) -> JSONResponse:
+    return JSONResponse(content={"ok": True, "result": result})
+
+
+def _as_int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+async def _read_params(request: Request) -> Dict[str, Any]:
+    params: Dict[str, Any] = dict(request.query_params)
+    ctype = request.headers.get("content-type", "")
+    if "application/json" in ctype:
+        body = await request.body()
+        if body:
+            params.update(json.loads(body))
+    elif "form" in ctype:
+        form = await request.form()
+        for k, v in form.items():
+            # aiogram шлёт вложенные объекты (reply_markup) JSON-строкой
+            if isinstance(v, str) and v[:1] in ("{", "["):
+                try:
+                    v = json.loads(v)
+                except ValueError:
+                    pass
+            params[k] = v
+    return params
+
+
+def create_app(config: FakeConfig | None = None) -> FastAPI:
+    fake = FakeTelegram(config or FakeConfig())
+    api = FastAPI(title="Fake Telegram Bot API")
+    api.state.fake = fake
+
+    @api.api_route("/bot{token}/{method}", methods=["GET", "POST"])
+    async def bot_method(token: str, method: str, request: Request) -> JSONResponse:
+        return await fake.handle(method, await _read_params(request))
+
+    @api.get("/_calls")
+    async def list_calls(method: str | None = None, limit: int = 1000) -> List[dict]:
+        rows = [c for c in fake.calls if method is None or c["method"] == method]
+        return rows[-limit:]
+
+    @api.delete("/_calls")
+    async def reset_calls() -> dict:
+        fake.calls.clear()
+        fake.stats.clear()
+        return {"status": "ok"}
+
+    @api.get("/_stats")
+    async def stats() -> dict:
+        return {"calls": len(fake.calls), "by_key": dict(fake.stats), "config": fake.config.model_dump()}
+
+    @api.post("/_control")
+    async def control(patch: ControlPatch) -> dict:
+        data = patch.model_dump(exclude_none=True)
+        if "users" in data:
+            data["users"] = {k.lstrip("@").lower(): v for k, v in data["users"].items()}
+        fake.config = fake.config.model_copy(update=data)
+        return fake.config.model_dump()
+
+    @api.post("/_updates")
+    async def push_update(update: dict) -> dict:
+        return fake.add_update(update)
+
+    return api
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="доля ответов 429 (0..1)")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--rate-403", type=float, default=0.0, help="доля ответов 403 на send* (0..1)")
+    parser.add_argument("--blocked", type=int, action="append", default=[], help="chat_id, всегда получающий 403")
+    parser.add_argument("--user", action="append", default=[], help="username=id для getChat")
+    args = parser.parse_args()
+    users = {}
+    for item in args.user:
+        name, _, uid = item.partition("=")
+        users[name.lstrip("@").lower()] = int(uid)
+    config = FakeConfig(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        rate_429=args.rate_429,
+        retry_after=args.retry_after,
+        rate_403=args.rate_403,
+        blocked_chat_ids=args.blocked,
+        users=users,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
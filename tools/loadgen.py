@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный генератор: сценарии мини-приложения, повторяющие реальные последовательности запросов.
+
+Сценарии:
+  customer — index (подборки, рестораны, selections) → ресторан (меню с опциями, карточка, корзина)
+             → добавление блюд (с обязательными опциями) → корзина (/cart/priced) → checkout
+             → создание заказа → опрос статуса
+  ra       — /ra/me → список заказов → карточка заказа → принять, иногда modify-items
+  admin    — статистика (общая, пользователи, рестораны) и список ресторанов
+
+Отчёт — пропускная способность и p50/p95/p99 по каждому эндпоинту. --out сохраняет JSON,
+--compare показывает изменение относительно сохранённого прогона.
+
+Полностью офлайн (поднимает fake Telegram, приложение в uvicorn и синтетические данные во временном SQLite;
+DATABASE_URL из окружения игнорируется, другая база — только через --database-url):
+    python -m tools.loadgen --spawn --seed-orders 50000 --vus 50 --duration 60 --out run.json
+Против уже запущенного API (на нём нужен WEBAPP_ALLOW_UNSIGNED=true — пользователи без initData):
+    python -m tools.loadgen --base-url http://127.0.0.1:8000 --admin-id 1 --ra-ids 900001,900002
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+class Recorder:
+    """Латентности и ошибки по имени эндпоинта (шаблон пути, а не конкретный URL)"""
+
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.journeys: Dict[str, int] = defaultdict(int)
+        self.journey_errors: Dict[str, int] = defaultdict(int)
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for name in sorted(self.latencies):
+            lat = self.latencies[name]
+            endpoints[name] = {
+                "count": len(lat),
+                "errors": self.errors.get(name, 0),
+                "rps": round(len(lat) / elapsed, 2) if elapsed else 0.0,
+                "p50_ms": round(_percentile(lat, 50) * 1000, 2),
+                "p95_ms": round(_percentile(lat, 95) * 1000, 2),
+                "p99_ms": round(_percentile(lat, 99) * 1000, 2),
+                "mean_ms": round(statistics.fmean(lat) * 1000, 2) if lat else 0.0,
+            }
+        total = sum(len(v) for v in self.latencies.values())
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "requests": total,
+            "rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "errors": sum(self.errors.values()),
+            "journeys": dict(self.journeys),
+            "journey_errors": dict(self.journey_errors),
+            "endpoints": endpoints,
+        }
+
+
+class Api:
+    def __init__(self, client: httpx.AsyncClient, rec: Recorder, user_id: int | None = None) -> None:
+        self.client = client
+        self.rec = rec
+        self.user_id = user_id
+
+    async def call(self, name: str, method: str, url: str, **kwargs) -> httpx.Response:
+        headers = kwargs.pop("headers", {})
+        if self.user_id is not None:
+            headers["X-Telegram-User-Id"] = str(self.user_id)
+        started = time.perf_counter()
+        try:
+            resp = await self.client.request(method, url, headers=headers, **kwargs)
+        except httpx.HTTPError:
+            self.rec.latencies[name].append(time.perf_counter() - started)
+            self.rec.errors[name] += 1
+            raise
+        self.rec.latencies[name].append(time.perf_counter() - started)
+        if resp.status_code >= 400:
+            self.rec.errors[name] += 1
+        return resp
+
+
+class Journeys:
+    def __init__(self, args: argparse.Namespace, rec: Recorder, rng: random.Random) -> None:
+        self.args = args
+        self.rec = rec
+        self.rng = rng
+        self._next_customer = args.customer_id_base
+
+    async def _think(self) -> None:
+        if self.args.think_ms:
+            await asyncio.sleep(self.rng.uniform(0.5, 1.5) * self.args.think_ms / 1000.0)
+
+    async def customer(self, client: httpx.AsyncClient) -> None:
+        self._next_customer += 1
+        api = Api(client, self.rec, self._next_customer)
+        rng = self.rng
+        # index.html
+        await api.call("POST /api/users/activate", "POST", "/api/users/activate", json={})
+        await api.call("GET /api/public/collections", "GET", "/api/public/collections")
+        restaurants = (await api.call("GET /api/restaurants", "GET", "/api/restaurants")).json()
+        await api.call("GET /api/selections", "GET", "/api/selections")
+        restaurants = [r for r in restaurants if r.get("is_open_now", True)] or restaurants
+        if not restaurants:
+            return
+        await self._think()
+        # restaurant.html
+        r = rng.choice(restaurants[: self.args.hot_restaurants] if rng.random() < 0.8 else restaurants)
+        rid = r["id"]
+        menu = (await api.call(
+            "GET /api/restaurants/{id}/menu?include=options", "GET", f"/api/restaurants/{rid}/menu", params={"include": "options"},
+        )).json()
+        await api.call("GET /api/restaurants/{id}", "GET", f"/api/restaurants/{rid}")
+        await api.call("GET /api/cart", "GET", "/api/cart")
+        dishes = [d for d in menu.get("dishes", []) if d.get("is_available")]
+        if not dishes:
+            return
+        # опции всех блюд уже пришли вместе с меню
+        by_group: Dict[int, List[int]] = defaultdict(list)
+        for o in menu.get("options", []):
+            by_group[o["group_id"]].append(o["id"])
+        groups_by_dish: Dict[int, List[dict]] = defaultdict(list)
+        for g in menu.get("groups", []):
+            groups_by_dish[g["dish_id"]].append(g)
+        # добавление блюд
+        for dish in rng.sample(dishes, min(len(dishes), rng.randint(1, 3))):
+            await self._think()
+            chosen: List[int] = []
+            for g in groups_by_dish.get(dish["id"], []):
+                need = max(1, g["min_select"]) if g["required"] else g["min_select"]
+                chosen += by_group.get(g["id"], [])[:need]
+            await api.call("POST /api/cart/items", "POST", "/api/cart/items", params={"force": "true"}, json={
+                "restaurant_id": rid, "dish_id": dish["id"], "qty": rng.randint(1, 2), "chosen_options": chosen,
+            })
+        await self._think()
+        # cart.html: корзина с ценами одним запросом
+        priced = (await api.call("GET /api/cart/priced", "GET", "/api/cart/priced")).json()
+        group = next((g for g in priced.get("restaurants", []) if g["id"] == rid), None)
+        if not group or not group["items"]:
+            return
+        await self._think()
+        # checkout.html
+        await api.call("GET /api/restaurants/{id}", "GET", f"/api/restaurants/{rid}")
+        await api.call("GET /api/users/me", "GET", "/api/users/me")
+        order_items = [{
+            "dish_id": it["dish_id"], "name": it["name"], "price": it["price"], "qty": it["qty"],
+            "chosen_options": it["chosen_options"],
+        } for it in group["items"]]
+        total = group["total"]
+        # до минимальной суммы доставки не хватает — страница корзины предлагает только самовывоз
+        delivery_type = "pickup" if group["min_sum_shortfall"] else "delivery"
+        resp = await api.call("POST /api/orders", "POST", "/api/orders", json={
+            "user_id": api.user_id, "restaurant_id": rid, "total_price": total,
+            "delivery_type": delivery_type, "address": "ул. Нагрузочная, 1", "phone": "+70000000000",
+            "payment_method": "cash", "items": order_items,
+        })
+        await api.call("POST /api/cart/clear", "POST", "/api/cart/clear", params={"restaurant_id": rid})
+        if resp.status_code != 200:
+            return
+        order_id = resp.json()["id"]
+        # order.html: опрос статуса
+        for _ in range(self.args.polls):
+            await self._think()
+            await api.call("GET /api/orders/{id}", "GET", f"/api/orders/{order_id}")
+
+    async def ra(self, client: httpx.AsyncClient) -> None:
+        if not self.args.ra_ids:
+            return
+        api = Api(client, self.rec, self.rng.choice(self.args.ra_ids))
+        await api.call("GET /api/ra/me", "GET", "/api/ra/me")
+        orders = (await api.call("GET /api/ra/orders", "GET", "/api/ra/orders")).json()
+        fresh = [o for o in orders if o.get("status") == "sent"] if isinstance(orders, list) else []
+        if not fresh:
+            return
+        order = self.rng.choice(fresh[-50:])
+        await self._think()
+        await api.call("GET /api/ra/orders/{id}", "GET", f"/api/ra/orders/{order['id']}")
+        if order.get("items") and self.rng.random() < 0.2:
+            await api.call("POST /api/ra/orders/{id}/modify-items", "POST", f"/api/ra/orders/{order['id']}/modify-items", json={
+                "items": [{"index": 0, "qty": max(1, order["items"][0]["qty"] - 1)}], "comment": "нет в наличии",
+            })
+        await api.call("POST /api/ra/orders/{id}/accept", "POST", f"/api/ra/orders/{order['id']}/accept", params={"eta_minutes": 45})
+
+    async def admin(self, client: httpx.AsyncClient) -> None:
+        if self.args.admin_id is None:
+            return
+        api = Api(client, self.rec, self.args.admin_id)
+        for path in ("/api/admin/stats", "/api/admin/stats/users", "/api/admin/stats/restaurants", "/api/admin/restaurants"):
+            await api.call(f"GET {path}", "GET", path)
+            await self._think()
+
+
+async def _run_load(args: argparse.Namespace) -> dict:
+    rec = Recorder()
+    rng = random.Random(args.seed)
+    journeys = Journeys(args, rec, rng)
+    mix = _parse_mix(args.mix)
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+    runners: Dict[str, Callable[[httpx.AsyncClient], Awaitable[None]]] = {
+        "customer": journeys.customer, "ra": journeys.ra, "admin": journeys.admin,
+    }
+    limits = httpx.Limits(max_connections=args.vus, max_keepalive_connections=args.vus)
+    deadline = time.perf_counter() + args.duration
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        async def vu() -> None:
+            while time.perf_counter() < deadline:
+                kind = rng.choices(kinds, weights=weights)[0]
+                rec.journeys[kind] += 1
+                try:
+                    await runners[kind](client)
+                except (httpx.HTTPError, ValueError, KeyError):
+                    rec.journey_errors[kind] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(vu() for _ in range(args.vus)))
+        return rec.report(time.perf_counter() - started)
+
+
+def _parse_mix(raw: str) -> Dict[str, float]:
+    mix = {}
+    for part in raw.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip():
+            mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def _print_report(report: dict, baseline: Optional[dict]) -> None:
+    print(f"\n{report['requests']} requests in {report['elapsed_s']}s — {report['rps']} req/s, errors: {report['errors']}")
+    print(f"journeys: {report['journeys']}  failed: {report['journey_errors']}")
+    header = f"{'endpoint':<48} {'count':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}"
+    if baseline:
+        header += f" {'Δp95':>8}"
+    print(header)
+    for name, s in report["endpoints"].items():
+        line = f"{name:<48} {s['count']:>7} {s['errors']:>5} {s['rps']:>8.1f} {s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f}"
+        if baseline:
+            prev = baseline.get("endpoints", {}).get(name)
+            if prev and prev["p95_ms"]:
+                line += f" {100.0 * (s['p95_ms'] - prev['p95_ms']) / prev['p95_ms']:>+7.0f}%"
+            else:
+                line += f" {'—':>8}"
+        print(line)
+
+
+async def _wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.perf_counter() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready")
+
+
+async def _spawned(args: argparse.Namespace) -> dict:
+    """Поднимает fake Telegram (в процессе) и API (отдельный процесс uvicorn), сеет данные"""
+    import uvicorn
+    from tools.fake_telegram import FakeConfig, create_app
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    # DATABASE_URL из окружения не наследуем: прогон сеет и пишет заказы, другая база — только явным --database-url
+    if args.database_url:
+        env["DATABASE_URL"] = args.database_url
+    else:
+        tmpdir = tempfile.mkdtemp(prefix="loadgen-")
+        env["DATABASE_URL"] = f"sqlite:///{os.path.join(tmpdir, 'load.db')}"
+    env.update({
+        "BOT_TOKEN": "123456:fake-token",
+        "TELEGRAM_API_BASE": f"http://127.0.0.1:{args.fake_tg_port}",
+        "WEBAPP_URL": f"http://127.0.0.1:{args.port}",
+        "SUPER_ADMIN_IDS": str(args.admin_id),
+        "ADMIN_CHANNEL_ID": "-100",
+        "SMTP_USERNAME": "",
+        # виртуальные пользователи представляются заголовком X-Telegram-User-Id, без initData
+        "WEBAPP_ALLOW_UNSIGNED": "true",
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+    })
+
+    fake = uvicorn.Server(uvicorn.Config(create_app(FakeConfig(latency_ms=args.fake_tg_latency_ms)),
+                                         host="127.0.0.1", port=args.fake_tg_port, log_level="warning"))
+    fake_task = asyncio.create_task(fake.serve())
+    if args.seed_orders:
+        subprocess.run([
+            sys.executable, "-m", "tools.seed", "--orders", str(args.seed_orders), "--users", str(max(100, args.seed_orders // 10)),
+            "--restaurants", str(args.seed_restaurants), "--seed", str(args.seed),
+        ], cwd=root, env=env, check=True)
+    api = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(args.port),
+        "--workers", str(args.workers), "--log-level", "warning",
+    ], cwd=root, env=env)
+    try:
+        await _wait_ready(f"http://127.0.0.1:{args.port}/")
+        args.base_url = f"http://127.0.0.1:{args.port}"
+        if not args.ra_ids:
+            # админы ресторанов привязываются к самым популярным ресторанам
+            async with httpx.AsyncClient(base_url=args.base_url, headers={"X-Telegram-User-Id": str(args.admin_id)}) as client:
+                restaurants = (await client.get("/api/restaurants")).json()
+                args.ra_ids = []
+                for i, r in enumerate(restaurants[: args.hot_restaurants]):
+                    uid = 900_000_000 + i
+                    await client.post("/api/admin/users/bind-admin", params={"user_id": uid, "restaurant_id": r["id"]})
+                    args.ra_ids.append(uid)
+        return await _run_load(args)
+    finally:
+        api.terminate()
+        # fake Telegram в этом же цикле: при остановке API досылает уведомления, их нужно принять
+        await asyncio.to_thread(api.wait, 30)
+        fake.should_exit = True
+        await fake_task
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Mini-app load generator")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--vus", type=int, default=20, help="виртуальных пользователей (параллельных сценариев)")
+    parser.add_argument("--duration", type=float, default=30.0, help="длительность, с")
+    parser.add_argument("--mix", default="customer=80,ra=15,admin=5")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="пауза между шагами сценария")
+    parser.add_argument("--polls", type=int, default=3, help="опросов статуса заказа")
+    parser.add_argument("--hot-restaurants", type=int, default=10)
+    parser.add_argument("--customer-id-base", type=int, default=2_000_000_000)
+    parser.add_argument("--admin-id", type=int, default=1)
+    parser.add_argument("--ra-ids", type=lambda s: [int(x) for x in s.split(",") if x], default=[])
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="сохранить отчёт в JSON")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения p95")
+    parser.add_argument("--spawn", action="store_true", help="поднять fake Telegram и API локально")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--fake-tg-port", type=int, default=8081)
+    parser.add_argument("--fake-tg-latency-ms", type=float, default=30.0)
+    parser.add_argument("--seed-orders", type=int, default=0, help="с --spawn: сгенерировать столько заказов")
+    parser.add_argument("--seed-restaurants", type=int, default=50)
+    parser.add_argument("--database-url", help="с --spawn: база API вместо временного SQLite (в неё запишутся тестовые данные)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    report = asyncio.run(_spawned(args) if args.spawn else _run_load(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+    _print_report(report, baseline)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Воспроизведение записанного трафика (TRAFFIC_CAPTURE_ENABLED=true → logs/traffic.jsonl*) против другой сборки.
+
+Запросы переотправляются с исходными интервалами (--speed 1), ускоренно (--speed 10) или без пауз (--speed 0).
+Пользователи подставляются псевдонимами через X-Telegram-User-Id (нужен WEBAPP_ALLOW_UNSIGNED=true на цели).
+Отчёт — p50/p95/p99 по маршрутам: записанные латентности против воспроизведённых
+(или против прошлого прогона через --compare).
+
+Примеры:
+    python -m tools.replay logs/traffic.jsonl* --base-url http://127.0.0.1:8010 --speed 5 --out replay.json
+    python -m tools.replay logs/traffic.jsonl* --base-url http://127.0.0.1:8011 --speed 5 --compare replay.json
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Iterable, List, Optional
+
+import httpx
+
+from tools.loadgen import Recorder
+
+
+def load_trace(paths: Iterable[str], routes: Optional[List[str]] = None) -> List[dict]:
+    """Записи из всех файлов (включая ротированные), по времени"""
+    entries = []
+    for path in paths:
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("route") == "unmatched":
+                    continue
+                if routes and not any(entry["route"].startswith(r) for r in routes):
+                    continue
+                entries.append(entry)
+    entries.sort(key=lambda e: e["ts"])
+    return entries
+
+
+def _endpoint(entry: dict) -> str:
+    return f"{entry['method']} {entry['route']}"
+
+
+def _build_request(entry: dict) -> dict:
+    headers = {}
+    if entry.get("user") is not None:
+        headers["X-Telegram-User-Id"] = str(entry["user"])
+    kwargs = {
+        "method": entry["method"],
+        "url": entry["route"].format(**(entry.get("path_params") or {})),
+        "params": [(k, v) for k, values in (entry.get("query") or {}).items() for v in values],
+        "headers": headers,
+    }
+    if entry.get("body") is not None:
+        kwargs["json"] = entry["body"]
+    return kwargs
+
+
+def captured_report(entries: List[dict]) -> dict:
+    """Распределение латентностей из самой записи — базовая линия по умолчанию"""
+    rec = Recorder()
+    for e in entries:
+        rec.latencies[_endpoint(e)].append(e["duration_ms"] / 1000.0)
+        if e["status"] >= 400:
+            rec.errors[_endpoint(e)] += 1
+    span = entries[-1]["ts"] - entries[0]["ts"] if entries else 0.0
+    return rec.report(span or 1.0)
+
+
+async def replay(entries: List[dict], args: argparse.Namespace) -> tuple[dict, int]:
+    rec = Recorder()
+    sem = asyncio.Semaphore(args.concurrency)
+    status_mismatches = 0
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        async def fire(entry: dict) -> None:
+            nonlocal status_mismatches
+            name = _endpoint(entry)
+            async with sem:
+                started = time.perf_counter()
+                try:
+                    resp = await client.request(**_build_request(entry))
+                except httpx.HTTPError:
+                    rec.latencies[name].append(time.perf_counter() - started)
+                    rec.errors[name] += 1
+                    return
+                rec.latencies[name].append(time.perf_counter() - started)
+            if resp.status_code >= 400:
+                rec.errors[name] += 1
+            if resp.status_code // 100 != entry["status"] // 100:
+                status_mismatches += 1
+
+        tasks = []
+        origin = entries[0]["ts"] if entries else 0.0
+        started = time.perf_counter()
+        for entry in entries:
+            if args.speed > 0:
+                delay = (entry["ts"] - origin) / args.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(fire(entry)))
+        await asyncio.gather(*tasks)
+        return rec.report(time.perf_counter() - started), status_mismatches
+
+
+def print_diff(report: dict, baseline: dict, baseline_name: str) -> None:
+    print(f"\nreplayed {report['requests']} requests in {report['elapsed_s']}s — {report['rps']} req/s, errors: {report['errors']}")
+    print(f"{'endpoint':<52} {'count':>6}   {'p50':>15}   {'p95':>15}   {'p99':>15}   {'Δp95':>6}")
+    print(f"{'':<52} {'':>6}   {baseline_name + ' → replay':>15}")
+    for name, s in report["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(name)
+        cols = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            cols.append(f"{base[key]:>6.1f} → {s[key]:>6.1f}" if base else f"{'—':>6} → {s[key]:>6.1f}")
+        delta = f"{100.0 * (s['p95_ms'] - base['p95_ms']) / base['p95_ms']:>+5.0f}%" if base and base["p95_ms"] else f"{'—':>6}"
+        print(f"{name:<52} {s['count']:>6}   {cols[0]:>15}   {cols[1]:>15}   {cols[2]:>15}   {delta}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay captured traffic and diff latency per route")
+    parser.add_argument("files", nargs="+", help="файлы записи (logs/traffic.jsonl, logs/traffic.jsonl.1, ...)")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--speed", type=float, default=1.0, help="ускорение относительно записи; 0 — без пауз")
+    parser.add_argument("--concurrency", type=int, default=100, help="максимум запросов в полёте")
+    parser.add_argument("--routes", default="", help="префиксы маршрутов через запятую (/api/cart,/api/orders)")
+    parser.add_argument("--limit", type=int, default=0, help="воспроизвести только первые N запросов")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--out", help="сохранить отчёт воспроизведения в JSON")
+    parser.add_argument("--compare", help="отчёт прошлого воспроизведения вместо записанных латентностей")
+    args = parser.parse_args()
+
+    entries = load_trace(args.files, [r for r in args.routes.split(",") if r])
+    if args.limit:
+        entries = entries[: args.limit]
+    if not entries:
+        print("no entries to replay")
+        return
+    report, mismatches = asyncio.run(replay(entries, args))
+    report["status_class_mismatches"] = mismatches
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            baseline, baseline_name = json.load(fh), "base"
+    else:
+        baseline, baseline_name = captured_report(entries), "captured"
+    print_diff(report, baseline, baseline_name)
+    print(f"status class mismatches vs capture: {mismatches}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Генератор синтетических данных для проверки приложения на реальных объёмах.
+
+Создаёт рестораны с категориями, блюдами и группами опций, пользователей, корзины,
+подборки, заказы с позициями и отзывы. Пишет пачками: executemany по insert() на SQLite,
+COPY на PostgreSQL. При одинаковых --seed, --anchor и исходном состоянии БД данные
+получаются одинаковыми.
+
+Пример:
+    python -m tools.seed --restaurants 200 --users 100000 --orders 1000000 --seed 42
+    DATABASE_URL=postgresql://... python -m tools.seed --orders 1000000 --batch 20000
+"""
+
+import argparse
+import csv
+import io
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Tuple
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, insert, select, text  # noqa: E402
+from sqlalchemy.engine import Connection  # noqa: E402
+
+from app.db import engine  # noqa: E402
+from app.db_init import init_db_and_seed  # noqa: E402
+from app.models import (  # noqa: E402
+    Cart, CartItem, Category, Collection, CollectionItem, Dish, Option, OptionGroup,
+    Order, OrderItem, Restaurant, Review, User,
+)
+from app.services.dish_options import options_key  # noqa: E402
+
+
+CUISINES = ["Пицца", "Бургеры", "Суши", "Шаурма", "Грузинская", "Вок", "Пекарня", "Кофейня", "Здоровое", "Стейки"]
+CATEGORY_NAMES = ["Хиты", "Комбо", "Горячее", "Салаты", "Супы", "Закуски", "Десерты", "Напитки", "Соусы", "Детское"]
+DISH_WORDS = ["Классика", "Острый", "Сырный", "Фирменный", "Домашний", "Большой", "Мини", "Двойной", "Веган", "С курицей"]
+GROUP_TEMPLATES = [
+    ("Размер", 1, 1, True, [("Стандарт", 0), ("Большой", 120), ("XL", 220)]),
+    ("Соус", 1, 1, True, [("Кетчуп", 0), ("BBQ", 0), ("Сырный", 30), ("Чесночный", 20)]),
+    ("Добавки", 0, 3, False, [("Сыр", 40), ("Бекон", 60), ("Халапеньо", 30), ("Яйцо", 25)]),
+    ("Напиток", 0, 1, False, [("Кола", 90), ("Морс", 80), ("Вода", 50)]),
+]
+REVIEW_COMMENTS = ["Вкусно!", "Привезли быстро", "Остыло в дороге", "Всё отлично", "Порция маленькая", ""]
+# Доля заказов по часам суток: пики в обед и вечером
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 1, 2, 4, 6, 7, 8, 12, 16, 14, 10, 8, 9, 12, 16, 18, 15, 10, 5, 2]
+STATUS_FINAL = [("delivered", 0.88), ("cancelled", 0.07), ("modified", 0.05)]
+
+
+class BulkWriter:
+    """Копит строки по таблицам и пишет пачками; COPY на PostgreSQL, executemany на остальных.
+
+    Таблицы сбрасываются в порядке первого добавления, поэтому родительские строки
+    нужно добавлять раньше дочерних — тогда FK не нарушаются.
+    """
+
+    def __init__(self, conn: Connection, batch: int) -> None:
+        self.conn = conn
+        self.batch = batch
+        self.use_copy = conn.dialect.name == "postgresql"
+        self._rows: Dict[Any, List[dict]] = {}
+        self.written: Dict[str, int] = {}
+
+    def add(self, model, row: dict) -> None:
+        rows = self._rows.setdefault(model, [])
+        rows.append(row)
+        if len(rows) >= self.batch:
+            self.flush()
+
+    def flush(self) -> None:
+        for m in list(self._rows):
+            rows = self._rows.get(m)
+            if not rows:
+                continue
+            if self.use_copy:
+                self._copy(m.__table__, rows)
+            else:
+                self.conn.execute(insert(m.__table__), rows)
+            self.written[m.__tablename__] = self.written.get(m.__tablename__, 0) + len(rows)
+            self._rows[m] = []
+
+    def _copy(self, table, rows: List[dict]) -> None:
+        columns = list(rows[0])
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows:
+            writer.writerow([_csv_value(row[c]) for c in columns])
+        buf.seek(0)
+        cursor = self.conn.connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buf,
+            )
+        finally:
+            cursor.close()
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return value
+
+
+def _next_id(conn: Connection, model) -> int:
+    return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _zipf_weights(n: int, s: float = 1.1) -> List[float]:
+    """Популярность ресторанов: немногие получают большую часть заказов"""
+    return [1.0 / math.pow(i + 1, s) for i in range(n)]
+
+
+def _order_time(rng: random.Random, anchor: datetime, days: int) -> datetime:
+    # чем ближе к anchor, тем больше заказов: сервис растёт
+    day = int(days * (1 - math.sqrt(rng.random())))
+    hour = rng.choices(range(24), weights=HOUR_WEIGHTS)[0]
+    return anchor - timedelta(days=day) + timedelta(hours=hour, minutes=rng.randrange(60), seconds=rng.randrange(60)) - timedelta(days=1)
+
+
+def _status_for(rng: random.Random, created_at: datetime, anchor: datetime) -> str:
+    age = anchor - created_at
+    if age < timedelta(minutes=20):
+        return "sent"
+    if age < timedelta(hours=2):
+        return rng.choice(["accepted", "accepted", "delivered"])
+    roll = rng.random()
+    acc = 0.0
+    for status, share in STATUS_FINAL:
+        acc += share
+        if roll < acc:
+            return status
+    return "delivered"
+
+
+def seed(args: argparse.Namespace) -> Dict[str, int]:
+    rng = random.Random(args.seed)
+    anchor = datetime.fromisoformat(args.anchor) if args.anchor else datetime.utcnow().replace(second=0, microsecond=0)
+    init_db_and_seed()
+
+    with engine.begin() as conn:
+        w = BulkWriter(conn, args.batch)
+        rid0, cid0, did0, gid0, oid0 = (_next_id(conn, m) for m in (Restaurant, Category, Dish, OptionGroup, Option))
+        uid0 = max(_next_id(conn, User), 1_000_000_000)
+
+        # рестораны, меню и опции
+        menus: List[List[Tuple[int, str, int, List[Tuple[int, int]]]]] = []
+        next_cat, next_dish, next_group, next_opt = cid0, did0, gid0, oid0
+        for r in range(args.restaurants):
+            rid = rid0 + r
+            cuisine = CUISINES[r % len(CUISINES)]
+            w.add(Restaurant, dict(
+                id=rid, name=f"{cuisine} #{rid}", is_enabled=rng.random() > 0.05, rating_agg=round(rng.uniform(3.5, 5.0), 1),
+                delivery_min_sum=rng.choice([0, 300, 500, 700, 1000]), delivery_fee=rng.choice([0, 99, 149, 199]),
+                delivery_time_minutes=rng.choice([30, 40, 50, 60, 75]), address=f"ул. Синтетическая, {rid}",
+                phone=f"+7 900 {rid:07d}", email="", description=f"{cuisine} с доставкой", image="",
+                work_open_min=rng.choice([0, 480, 600]), work_close_min=rng.choice([1320, 1380, 1440]),
+            ))
+            menu = []
+            for c in range(args.categories):
+                cat_id = next_cat
+                next_cat += 1
+                w.add(Category, dict(id=cat_id, restaurant_id=rid, name=CATEGORY_NAMES[c % len(CATEGORY_NAMES)], sort=c))
+                for _ in range(args.dishes):
+                    dish_id = next_dish
+                    next_dish += 1
+                    price = rng.randrange(9, 90) * 10 - 1
+                    name = f"{rng.choice(DISH_WORDS)} {CATEGORY_NAMES[c % len(CATEGORY_NAMES)].lower()} {dish_id}"
+                    has_options = rng.random() < args.options_share
+                    w.add(Dish, dict(
+                        id=dish_id, restaurant_id=rid, category_id=cat_id, name=name, description="", price=price,
+                        image="", is_available=rng.random() > 0.03, has_options=has_options,
+                    ))
+                    # в заказы и корзины идёт первая опция каждой обязательной группы
+                    options: List[Tuple[int, int]] = []
+                    if has_options:
+                        for tpl in rng.sample(GROUP_TEMPLATES, rng.randint(1, 2)):
+                            gname, min_s, max_s, required, opts = tpl
+                            w.add(OptionGroup, dict(id=next_group, dish_id=dish_id, name=gname, min_select=min_s, max_select=max_s, required=required))
+                            for k, (oname, delta) in enumerate(opts):
+                                w.add(Option, dict(id=next_opt, group_id=next_group, name=oname, price_delta=delta))
+                                if required and k == 0:
+                                    options.append((next_opt, delta))
+                                next_opt += 1
+                            next_group += 1
+                    menu.append((dish_id, name, price, options))
+            menus.append(menu)
+
+        # пользователи и корзины
+        cart0 = _next_id(conn, Cart)
+        next_cart = cart0
+        for u in range(args.users):
+            created = anchor - timedelta(days=rng.randrange(args.days), minutes=rng.randrange(1440))
+            w.add(User, dict(
+                id=uid0 + u, is_blocked=rng.random() < 0.002, created_at=created,
+                last_activity=min(anchor, created + timedelta(days=rng.randrange(max(1, (anchor - created).days + 1)))),
+                username=f"user{uid0 + u}" if rng.random() < 0.6 else None, phone=None, name=None, address=None, birth_date=None,
+            ))
+        for u in range(args.users):
+            if rng.random() >= args.cart_share:
+                continue
+            w.add(Cart, dict(id=next_cart, user_id=uid0 + u, cutlery_count=rng.randrange(3)))
+            r = rng.randrange(len(menus)) if menus else 0
+            menu = menus[r] if menus else []
+            for dish_id, _name, _price, options in rng.sample(menu, min(len(menu), rng.randint(1, 4))):
+                w.add(CartItem, dict(
+                    cart_id=next_cart, restaurant_id=rid0 + r, dish_id=dish_id, qty=rng.randint(1, 3),
+                    chosen_options="[" + ",".join(str(o) for o, _ in options) + "]",
+                    options_key=options_key(o for o, _ in options),
+                ))
+            next_cart += 1
+
+        # подборки
+        coll0 = _next_id(conn, Collection)
+        for c in range(args.collections):
+            w.add(Collection, dict(
+                id=coll0 + c, name=f"Подборка {c + 1}", description="", image="", is_enabled=True,
+                sort_order=c, created_at=anchor,
+            ))
+        for c in range(args.collections):
+            for i in range(args.collection_items):
+                r = rng.randrange(len(menus)) if menus else 0
+                if i % 2 and menus and menus[r]:
+                    item_type, item_id = "dish", rng.choice(menus[r])[0]
+                else:
+                    item_type, item_id = "restaurant", rid0 + rng.randrange(max(1, args.restaurants))
+                w.add(CollectionItem, dict(
+                    collection_id=coll0 + c, item_type=item_type, item_id=item_id, title=f"Элемент {i + 1}",
+                    subtitle="", image="", link_url="", sort_order=i, is_enabled=True,
+                ))
+
+        # заказы, позиции и отзывы
+        order0 = _next_id(conn, Order)
+        weights = _zipf_weights(args.restaurants)
+        started = time.perf_counter()
+        for n in range(args.orders):
+            if not menus or not args.users:
+                break
+            order_id = order0 + n
+            r = rng.choices(range(args.restaurants), weights=weights)[0]
+            user_id = uid0 + rng.randrange(args.users)
+            created_at = _order_time(rng, anchor, args.days)
+            status = _status_for(rng, created_at, anchor)
+            items = []
+            total = 0
+            for dish_id, name, price, options in rng.sample(menus[r], min(len(menus[r]), rng.randint(1, 5))):
+                qty = rng.choices([1, 2, 3], weights=[80, 15, 5])[0]
+                total += (price + sum(d for _, d in options)) * qty
+                items.append(dict(
+                    order_id=order_id, dish_id=dish_id, name=name, price=price, qty=qty,
+                    chosen_options="[" + ",".join(str(o) for o, _ in options) + "]",
+                ))
+            delivery = rng.random() < 0.8
+            accepted = status in ("accepted", "delivered", "modified")
+            w.add(Order, dict(
+                id=order_id, user_id=user_id, restaurant_id=rid0 + r, status=status, total_price=total,
+                delivery_type="delivery" if delivery else "pickup", address=f"ул. Тестовая, {rng.randrange(1, 200)}" if delivery else None,
+                phone=f"+7 9{rng.randrange(10**9):09d}", payment_method=rng.choice(["cash", "card_to_courier", "transfer"]),
+                client_comment=None, staff_comment=None,
+                accepted_at=created_at + timedelta(minutes=rng.randint(1, 10)) if accepted else None,
+                eta_minutes=rng.choice([30, 45, 60, 90]) if accepted else None, created_at=created_at,
+            ))
+            for item in items:
+                w.add(OrderItem, item)
+            if status == "delivered" and rng.random() < args.review_share:
+                w.add(Review, dict(
+                    order_id=order_id, restaurant_id=rid0 + r, user_id=user_id,
+                    rating=rng.choices([1, 2, 3, 4, 5], weights=[3, 4, 10, 30, 53])[0],
+                    comment=rng.choice(REVIEW_COMMENTS), created_at=created_at + timedelta(hours=2), is_deleted=False,
+                ))
+            if args.orders >= 100_000 and (n + 1) % 100_000 == 0:
+                rate = (n + 1) / max(1e-9, time.perf_counter() - started)
+                print(f"  orders: {n + 1}/{args.orders} ({rate:,.0f}/s)", flush=True)
+        w.flush()
+
+        if conn.dialect.name == "postgresql":
+            # явные id не двигают sequence — выравниваем
+            for model in (Restaurant, Category, Dish, OptionGroup, Option, Cart, CartItem, Collection,
+                          CollectionItem, Order, OrderItem, Review):
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{model.__tablename__}', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM {model.__tablename__}), 1))"
+                ))
+    return w.written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate synthetic data for scale testing")
+    parser.add_argument("--restaurants", type=int, default=50)
+    parser.add_argument("--categories", type=int, default=6, help="категорий на ресторан")
+    parser.add_argument("--dishes", type=int, default=8, help="блюд на категорию")
+    parser.add_argument("--options-share", type=float, default=0.4, help="доля блюд с опциями")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--cart-share", type=float, default=0.2, help="доля пользователей с корзиной")
+    parser.add_argument("--collections", type=int, default=5)
+    parser.add_argument("--collection-items", type=int, default=10)
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--review-share", type=float, default=0.15, help="доля доставленных заказов с отзывом")
+    parser.add_argument("--days", type=int, default=180, help="глубина истории заказов")
+    parser.add_argument("--anchor", default=None, help="ISO-дата «сегодня» для воспроизводимости (по умолчанию текущая)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--batch", type=int, default=10000)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    written = seed(args)
+    elapsed = time.perf_counter() - started
+    for table, count in sorted(written.items()):
+        print(f"{table:<20} {count:>10}")
+    print(f"done in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+// Сессия мини-приложения: подписанный initData Telegram один раз меняется на токен (POST /api/auth/webapp),
+// дальше токен уходит в Authorization со всеми запросами страницы к /api — сервер берёт пользователя из него,
+// а не из X-Telegram-User-Id / ?uid=. Подключается после telegram-web-app.js и до скриптов страницы.
+// Вне Telegram (initData пуст) запросы идут как раньше; сервер примет их только при WEBAPP_ALLOW_UNSIGNED=true.
+(function () {
+  const initData = window.Telegram?.WebApp?.initData || '';
+  if (!initData) return;
+  const userId = window.Telegram.WebApp.initDataUnsafe?.user?.id || 0;
+  const STORAGE_KEY = 'webapp_session';
+  const nativeFetch = window.fetch.bind(window);
+  let pending = null;
+
+  function storedToken() {
+    try {
+      const s = JSON.parse(sessionStorage.getItem(STORAGE_KEY) || 'null');
+      // токен другого пользователя или истекающий в ближайшую минуту не используем
+      if (s && s.user_id === userId && s.expires_at - 60 > Date.now() / 1000) return s.token;
+    } catch (e) {}
+    return null;
+  }
+
+  function exchange() {
+    // параллельные запросы страницы ждут один обмен
+    if (!pending) {
+      pending = nativeFetch(location.origin + '/api/auth/webapp', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ init_data: initData }),
+      })
+        .then(r => (r.ok ? r.json() : null))
+        .then(s => {
+          if (!s) return null;
+          sessionStorage.setItem(STORAGE_KEY, JSON.stringify(s));
+          return s.token;
+        })
+        .catch(() => null)
+        .finally(() => { pending = null; });
+    }
+    return pending;
+  }
+
+  function isApi(input) {
+    const url = new URL(input instanceof Request ? input.url : String(input), location.href);
+    return url.origin === location.origin && url.pathname.startsWith('/api/') && !url.pathname.startsWith('/api/auth/');
+  }
+
+  function withToken(input, init, token) {
+    const headers = new Headers(init?.headers || (input instanceof Request ? input.headers : undefined));
+    headers.set('Authorization', 'Bearer ' + token);
+    return nativeFetch(input, { ...init, headers });
+  }
+
+  window.fetch = async function (input, init) {
+    if (!isApi(input)) return nativeFetch(input, init);
+    const token = storedToken() || await exchange();
+    if (!token) return nativeFetch(input, init);
+    const res = await withToken(input, init, token);
+    if (res.status !== 401) return res;
+    // токен истёк или сменился ключ подписи — один раз получаем новый
+    sessionStorage.removeItem(STORAGE_KEY);
+    const fresh = await exchange();
+    return fresh ? withToken(input, init, fresh) : res;
+  };
+})();